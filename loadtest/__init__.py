@@ -0,0 +1,13 @@
+"""
+Offline load-test harness for the GenAI Agent API.
+
+``python -m loadtest`` starts the API in a subprocess with a fake Gemini
+backend (``loadtest.server``), serves download targets from a local origin
+server (``loadtest.origin``) and sends open-loop traffic at fixed arrival
+rates per endpoint (``loadtest.traffic``). Requests are issued on schedule
+whether or not earlier ones have completed, so a slow server shows up as
+growing latency rather than as a lower request rate. The run ends with a
+per-endpoint report of p50/p95/p99 latency, throughput and error rate.
+
+Nothing leaves the machine, so results are reproducible and can gate CI.
+"""
@@ -0,0 +1,178 @@
+"""
+Command-line entry point: ``python -m loadtest``.
+
+Examples::
+
+    # 60 s against a fresh server with a 0.5 s fake Gemini
+    python -m loadtest --duration 60 --rate livez=20 --rate download=5 --rate summarize=2
+
+    # Gate CI on error rate and tail latency, keeping a JSON report
+    python -m loadtest --output loadtest-report.json --max-error-rate 0.01 --max-p99-ms 5000
+
+    # Drive an already running server instead (real Gemini if it is configured so)
+    python -m loadtest --target http://localhost:8000 --rate livez=50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from loadtest.origin import OriginServer
+from loadtest.traffic import build_scenarios, format_report, make_document, run_open_loop
+
+DEFAULT_RATES = {"livez": 10.0, "download": 5.0, "summarize": 2.0}
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_rates(values: List[str]) -> Dict[str, float]:
+    """Parse ``name=requests_per_second`` options over the default rates."""
+    rates = dict(DEFAULT_RATES)
+    for value in values:
+        name, _, rate = value.partition("=")
+        if not rate:
+            raise argparse.ArgumentTypeError(f"Expected name=rate, got {value!r}")
+        rates[name] = float(rate)
+    return rates
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workdir: Path, args: argparse.Namespace) -> subprocess.Popen:
+    """Start the API with the fake Gemini backend, keeping all its state under workdir."""
+    env = {
+        **os.environ,
+        "GEMINI_API_KEY": "loadtest",
+        "DOWNLOAD_DIR": str(workdir / "downloads"),
+        "JOBS_DIR": str(workdir / "jobs"),
+        "JOBS_DB": str(workdir / "jobs" / "jobs.db"),
+        "TEXT_STORE_DB": str(workdir / "text.db"),
+        # All traffic comes from one client; per-client budgets would only measure the limiter
+        "RATE_LIMIT_SUMMARIZE_PER_MINUTE": "0",
+        "RATE_LIMIT_DOWNLOAD_PER_MINUTE": "0",
+    }
+    env.pop("DOWNLOAD_INDEX_DB", None)
+    command = [
+        sys.executable, "-m", "loadtest.server",
+        "--port", str(port),
+        "--gemini-latency", str(args.gemini_latency),
+        "--gemini-jitter", str(args.gemini_jitter),
+    ]
+    return subprocess.Popen(command, cwd=workdir, env={**env, "PYTHONPATH": str(REPO_ROOT)})
+
+
+async def wait_until_live(base_url: str, timeout: float):
+    """Poll /livez until the server answers."""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/livez") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Server at {base_url} did not become live within {timeout:.0f}s")
+            await asyncio.sleep(0.2)
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Run one load test and return its report."""
+    origin = OriginServer(files=args.files, size=args.file_size)
+    origin.start()
+    documents = [make_document(seed, args.pages) for seed in range(args.documents)]
+    server: Optional[subprocess.Popen] = None
+    try:
+        with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+            if args.target:
+                base_url = args.target.rstrip("/")
+            else:
+                port = free_port()
+                base_url = f"http://127.0.0.1:{port}"
+                server = start_server(port, Path(workdir), args)
+            asyncio.run(wait_until_live(base_url, args.startup_timeout))
+
+            scenarios = build_scenarios(base_url, args.rates, origin, documents)
+            started = time.monotonic()
+            results = asyncio.run(run_open_loop(scenarios, args.duration, args.arrival, args.timeout, args.seed))
+            elapsed = time.monotonic() - started
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+    finally:
+        if server is not None and server.poll() is None:
+            server.kill()
+        origin.stop()
+
+    return {
+        "duration": args.duration,
+        "elapsed": elapsed,
+        "arrival": args.arrival,
+        "rates": args.rates,
+        "gemini_latency": None if args.target else args.gemini_latency,
+        "endpoints": {name: stats.summary(args.duration) for name, stats in results.items()},
+    }
+
+
+def check_thresholds(report: dict, max_error_rate: Optional[float], max_p99_ms: Optional[float]) -> List[str]:
+    """List the endpoints breaching the configured thresholds."""
+    failures = []
+    for name, summary in report["endpoints"].items():
+        if max_error_rate is not None and summary["error_rate"] > max_error_rate:
+            failures.append(f"{name}: error rate {summary['error_rate']:.2%} > {max_error_rate:.2%}")
+        if max_p99_ms is not None and summary["p99_ms"] > max_p99_ms:
+            failures.append(f"{name}: p99 {summary['p99_ms']:.0f} ms > {max_p99_ms:.0f} ms")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Offline open-loop load test")
+    parser.add_argument("--target", help="URL of a running server; by default one is started with fake Gemini")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of traffic")
+    parser.add_argument(
+        "--rate", dest="rates", action="append", default=[], metavar="NAME=RPS",
+        help="requests per second for livez, download or summarize (0 disables); repeatable",
+    )
+    parser.add_argument("--arrival", choices=["poisson", "constant"], default="poisson")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds before a request counts as failed")
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="seconds per fake Gemini call")
+    parser.add_argument("--gemini-jitter", type=float, default=0.2, help="extra random seconds per call")
+    parser.add_argument("--documents", type=int, default=20, help="distinct PDFs uploaded to /summarize")
+    parser.add_argument("--pages", type=int, default=5, help="pages per generated PDF")
+    parser.add_argument("--files", type=int, default=100, help="distinct files served to /download")
+    parser.add_argument("--file-size", type=int, default=256 * 1024, help="bytes per served file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--output", type=Path, help="write the report as JSON")
+    parser.add_argument("--max-error-rate", type=float, help="fail if any endpoint's error rate is higher (0-1)")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if any endpoint's p99 latency is higher")
+    args = parser.parse_args(argv)
+    args.rates = parse_rates(args.rates)
+
+    report = run(args)
+    print(format_report(report["endpoints"]))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    failures = check_thresholds(report, args.max_error_rate, args.max_p99_ms)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""
+Local origin server for /download traffic.
+
+Serves ``/files/<n>.bin`` for ``n`` in ``range(files)``: deterministic
+payloads of a fixed size with an ETag, honouring If-None-Match, so repeat
+downloads exercise the API's revalidation path just as a real origin would.
+"""
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class OriginServer:
+    """
+    Threaded HTTP server standing in for the sites files are downloaded from.
+
+    Args:
+        files: Number of distinct files served
+        size: Size of each file in bytes
+    """
+
+    def __init__(self, files: int = 100, size: int = 256 * 1024):
+        self.files = files
+        self.size = size
+        self._bodies = {}
+        self._lock = threading.Lock()
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                body = origin.body(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                etag = f'"{hashlib.sha1(self.path.encode()).hexdigest()}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def body(self, path: str):
+        """Payload served for a path, or None for unknown paths."""
+        name = path.rpartition("/")[2]
+        if not (path.startswith("/files/") and name.endswith(".bin") and name[:-4].isdigit()):
+            return None
+        index = int(name[:-4])
+        if index >= self.files:
+            return None
+        with self._lock:
+            if index not in self._bodies:
+                block = hashlib.sha256(name.encode()).digest() * 1024
+                self._bodies[index] = (block * (self.size // len(block) + 1))[:self.size]
+            return self._bodies[index]
+
+    def url(self, index: int) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/files/{index}.bin"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
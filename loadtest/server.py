@@ -0,0 +1,85 @@
+"""
+Run the API with a fake Gemini backend.
+
+Usage: ``python -m loadtest.server --port 8000 --gemini-latency 0.5``
+
+The Gemini SDK's model class is replaced before the application is imported,
+so every generation call sleeps for the configured latency (plus uniform
+jitter) and returns a canned summary instead of calling Google.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+from types import SimpleNamespace
+
+
+class FakeGenerativeModel:
+    """
+    Stand-in for ``genai.GenerativeModel``.
+
+    Attributes:
+        latency: Seconds each call takes
+        jitter: Extra uniformly distributed seconds added to each call
+    """
+
+    latency = 0.5
+    jitter = 0.0
+
+    def __init__(self, model_name: str, **kwargs):
+        self.model_name = model_name
+
+    def _delay(self) -> float:
+        return self.latency + random.uniform(0, self.jitter)
+
+    @staticmethod
+    def _response(prompt: str, text: str):
+        usage = SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        if stream:
+            return self._stream(prompt)
+        await asyncio.sleep(self._delay())
+        return self._response(prompt, "This is a summary produced by the load-test Gemini stub.")
+
+    async def _stream(self, prompt: str):
+        words = "This is a streamed summary produced by the load-test Gemini stub.".split()
+        for word in words:
+            await asyncio.sleep(self._delay() / len(words))
+            yield self._response(prompt, word + " ")
+
+    async def count_tokens_async(self, text: str):
+        return SimpleNamespace(total_tokens=len(text) // 4)
+
+
+def install_fake_gemini(latency: float, jitter: float = 0.0):
+    """Replace the Gemini SDK entry points used by src.llm."""
+    import google.generativeai as genai
+
+    FakeGenerativeModel.latency = latency
+    FakeGenerativeModel.jitter = jitter
+    genai.GenerativeModel = FakeGenerativeModel
+    genai.configure = lambda **kwargs: None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with a fake Gemini backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--gemini-latency", type=float, default=0.5, help="seconds per fake Gemini call")
+    parser.add_argument("--gemini-jitter", type=float, default=0.2, help="extra random seconds per call")
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEMINI_API_KEY", "loadtest")
+    install_fake_gemini(args.gemini_latency, args.gemini_jitter)
+
+    import uvicorn
+    from src.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Open-loop traffic generation and latency statistics.
+
+Each scenario fires requests at its own arrival rate (Poisson or evenly
+spaced). Latency is measured from the moment a request was scheduled, not
+from when it was actually sent, so client-side queueing cannot hide a slow
+server (no coordinated omission).
+"""
+
+import asyncio
+import math
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Literal, Sequence
+
+import aiohttp
+
+from loadtest.origin import OriginServer
+from tests.conftest import make_pdf
+
+Arrival = Literal["poisson", "constant"]
+Sender = Callable[[aiohttp.ClientSession, random.Random], Awaitable[int]]
+
+WORDS = "revenue margin outlook segment growth forecast capital dividend liquidity guidance".split()
+
+
+@dataclass
+class Scenario:
+    """Requests sent to one endpoint at a fixed average rate."""
+
+    name: str
+    rate: float
+    send: Sender
+
+
+@dataclass
+class EndpointStats:
+    """Outcomes of the requests sent by one scenario."""
+
+    latencies: List[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    errors: int = 0
+
+    def record(self, latency: float, status: str, ok: bool):
+        self.latencies.append(latency)
+        self.statuses[status] += 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, duration: float) -> dict:
+        """Request count, error rate, throughput and latency percentiles in milliseconds."""
+        latencies = sorted(self.latencies)
+        requests = len(latencies)
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": self.errors / requests if requests else 0.0,
+            "throughput": (requests - self.errors) / duration if duration else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+            "statuses": dict(self.statuses),
+        }
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        sorted_values: Values in ascending order
+        q: Percentile between 0 and 100
+
+    Returns:
+        The smallest value with at least q% of the values at or below it; 0 if empty
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def make_document(seed: int, pages: int) -> bytes:
+    """Generated PDF with about 2 KB of distinct text per page."""
+    return make_pdf([
+        f"Report {seed} page {page} " + " ".join(WORDS[(seed * 31 + page * 7 + i) % len(WORDS)] for i in range(300))
+        for page in range(pages)
+    ])
+
+
+def build_scenarios(
+    base_url: str,
+    rates: Dict[str, float],
+    origin: OriginServer,
+    documents: Sequence[bytes],
+) -> List[Scenario]:
+    """
+    Create the scenarios with a non-zero rate.
+
+    Args:
+        base_url: Root URL of the API
+        rates: Requests per second by scenario name: ``livez``, ``download``
+            (a random origin file, so repeats are revalidated) and
+            ``summarize`` (a random generated PDF, so repeats hit the caches)
+        origin: Local origin serving download targets
+        documents: PDFs uploaded by the summarize scenario
+
+    Returns:
+        Scenarios in a stable order
+    """
+    async def livez(session: aiohttp.ClientSession, rng: random.Random) -> int:
+        async with session.get(f"{base_url}/livez") as response:
+            await response.read()
+            return response.status
+
+    async def download(session: aiohttp.ClientSession, rng: random.Random) -> int:
+        url = origin.url(rng.randrange(origin.files))
+        async with session.post(f"{base_url}/download", params={"url": url}) as response:
+            await response.read()
+            return response.status
+
+    async def summarize(session: aiohttp.ClientSession, rng: random.Random) -> int:
+        form = aiohttp.FormData()
+        form.add_field("file", rng.choice(documents), filename="report.pdf", content_type="application/pdf")
+        async with session.post(f"{base_url}/summarize", data=form) as response:
+            await response.read()
+            return response.status
+
+    senders = {"livez": livez, "download": download, "summarize": summarize}
+    unknown = set(rates) - set(senders)
+    if unknown:
+        raise ValueError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return [Scenario(name, rates[name], send) for name, send in senders.items() if rates.get(name, 0) > 0]
+
+
+async def run_open_loop(
+    scenarios: Sequence[Scenario],
+    duration: float,
+    arrival: Arrival = "poisson",
+    timeout: float = 60.0,
+    seed: int = 0,
+) -> Dict[str, EndpointStats]:
+    """
+    Send open-loop traffic for a fixed time.
+
+    Args:
+        scenarios: Scenarios to run concurrently
+        duration: Seconds during which new requests are scheduled
+        arrival: "poisson" draws exponential gaps between requests;
+            "constant" spaces them evenly
+        timeout: Seconds after which a request counts as failed
+        seed: Random seed for arrival times and request choices
+
+    Returns:
+        Statistics by scenario name; requests still running when the
+        schedule ends are awaited and included
+    """
+    loop = asyncio.get_running_loop()
+    results = {scenario.name: EndpointStats() for scenario in scenarios}
+    in_flight = set()
+    started = loop.time()
+
+    async def fire(scenario: Scenario, scheduled: float, rng: random.Random):
+        stats = results[scenario.name]
+        try:
+            status = await asyncio.wait_for(scenario.send(session, rng), timeout)
+            stats.record(loop.time() - scheduled, str(status), status < 400)
+        except asyncio.TimeoutError:
+            stats.record(loop.time() - scheduled, "timeout", False)
+        except aiohttp.ClientError as e:
+            stats.record(loop.time() - scheduled, type(e).__name__, False)
+
+    def send_times(scenario: Scenario, rng: random.Random):
+        if arrival == "constant":
+            # From the index rather than summed gaps, so rounding never adds a request
+            for i in range(int(scenario.rate * duration)):
+                yield started + i / scenario.rate
+            return
+        next_at = started
+        while next_at < started + duration:
+            yield next_at
+            next_at += rng.expovariate(scenario.rate)
+
+    async def schedule(scenario: Scenario, rng: random.Random):
+        for next_at in send_times(scenario, rng):
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            task = asyncio.create_task(fire(scenario, next_at, rng))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+    # No connection limit: an open-loop client must never queue requests itself
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(
+            schedule(scenario, random.Random(f"{seed}:{scenario.name}")) for scenario in scenarios
+        ))
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    return results
+
+
+def format_report(summaries: Dict[str, dict]) -> str:
+    """Render per-endpoint summaries as a fixed-width table."""
+    header = f"{'endpoint':<12}{'requests':>10}{'errors':>8}{'err %':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    lines = [header, "-" * len(header)]
+    for name, summary in summaries.items():
+        lines.append(
+            f"{name:<12}{summary['requests']:>10}{summary['errors']:>8}{summary['error_rate'] * 100:>8.2f}"
+            f"{summary['throughput']:>9.2f}{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}"
+        )
+    return "\n".join(lines)
@@ -34,6 +34,8 @@ usage() {
     echo "Environment Variables:"
     echo "  GENAI_SERVER_URL    Override default server URL"
     echo "  GENAI_TIMEOUT       Request timeout in seconds (default: 60)"
+    echo "  GENAI_ASYNC         Set to 1 to submit a background job and poll for the result"
+    echo "  GENAI_POLL_INTERVAL Seconds between job status polls (default: 2)"
     echo ""
 }
 
@@ -122,6 +124,69 @@ summarize_pdf() {
     esac
 }
 
+# Function to summarize PDF through the background job queue
+summarize_pdf_async() {
+    local pdf_file="$1"
+    local server_url="$2"
+    local timeout="${GENAI_TIMEOUT:-60}"
+    local interval="${GENAI_POLL_INTERVAL:-2}"
+    
+    echo -e "${BLUE}Submitting summarization job: $(basename "$pdf_file")...${NC}" >&2
+    
+    local response
+    local http_code
+    
+    response=$(curl -s -w "\n%{http_code}" \
+        --max-time "$timeout" \
+        -X POST \
+        -F "file=@$pdf_file" \
+        "$server_url/jobs/summarize" 2>/dev/null)
+    
+    http_code=$(echo "$response" | tail -n1)
+    response_body=$(echo "$response" | head -n -1)
+    
+    case "$http_code" in
+        202)
+            ;;
+        429)
+            echo -e "${YELLOW}Job queue is full, try again later - $response_body${NC}" >&2
+            exit 1
+            ;;
+        *)
+            echo -e "${RED}Error: HTTP $http_code - $response_body${NC}" >&2
+            exit 1
+            ;;
+    esac
+    
+    local job_id
+    job_id=$(echo "$response_body" | sed -n 's/.*"job_id":"\([^"]*\)".*/\1/p')
+    echo -e "${BLUE}Job $job_id queued, polling every ${interval}s...${NC}" >&2
+    
+    local status
+    while true; do
+        response_body=$(curl -s --max-time "$timeout" "$server_url/jobs/$job_id")
+        status=$(echo "$response_body" | sed -n 's/.*"status":"\([^"]*\)".*/\1/p')
+        case "$status" in
+            succeeded)
+                echo -e "${GREEN}✓ Summary generated successfully${NC}" >&2
+                echo "$response_body"
+                return 0
+                ;;
+            failed)
+                echo -e "${RED}Error: Job failed - $response_body${NC}" >&2
+                exit 1
+                ;;
+            queued|running)
+                sleep "$interval"
+                ;;
+            *)
+                echo -e "${RED}Error: Unexpected job status - $response_body${NC}" >&2
+                exit 1
+                ;;
+        esac
+    done
+}
+
 # Main function
 main() {
     # Check for help flag
@@ -146,7 +211,11 @@ main() {
     check_server "$server_url"
     
     # Summarize the PDF
-    summarize_pdf "$pdf_file" "$server_url"
+    if [[ "${GENAI_ASYNC:-0}" == "1" ]]; then
+        summarize_pdf_async "$pdf_file" "$server_url"
+    else
+        summarize_pdf "$pdf_file" "$server_url"
+    fi
 }
 
 # Check dependencies
@@ -0,0 +1,52 @@
+"""
+Bounded fan-out for batch endpoints.
+
+Items are processed concurrently up to a fixed limit and their outcomes are
+yielded in completion order, so results can be streamed to the client as
+soon as each item finishes. A failing item yields its exception instead of
+aborting the batch.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence, Tuple
+
+BatchOutcome = Tuple[int, Any, Optional[Exception]]
+
+
+async def run_batch(
+    items: Sequence[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+) -> AsyncIterator[BatchOutcome]:
+    """
+    Run a worker over every item with bounded concurrency.
+
+    Closing the iterator early (e.g. when the client disconnects) cancels the
+    items still running or waiting.
+
+    Args:
+        items: Items to process
+        worker: Coroutine function processing one item
+        concurrency: Maximum number of items processed at once
+
+    Yields:
+        (index, result, error) for each item as it finishes; error is None on
+        success and result is None on failure
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index: int, item: Any) -> BatchOutcome:
+        async with semaphore:
+            try:
+                return index, await worker(item), None
+            except Exception as e:
+                return index, None, e
+
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
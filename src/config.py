@@ -0,0 +1,157 @@
+"""
+Runtime configuration for the GenAI Agent API.
+
+All tunables are read from environment variables (optionally loaded from a
+``.env`` file) so they can be adjusted per deployment without code changes.
+"""
+
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer environment variable, falling back to a default."""
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float environment variable, falling back to a default."""
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_optional_path(name: str, default: str) -> Optional[Path]:
+    """Read a path environment variable; setting it to an empty string disables the feature."""
+    value = os.getenv(name, default)
+    return Path(value) if value else None
+
+
+@dataclass
+class Settings:
+    """Application settings resolved from the environment."""
+
+    download_dir: Path = field(default_factory=lambda: Path(os.getenv("DOWNLOAD_DIR", "downloads")))
+
+    # Download engine
+    download_chunk_size: int = field(default_factory=lambda: _env_int("DOWNLOAD_CHUNK_SIZE", 64 * 1024))
+    download_timeout: float = field(default_factory=lambda: _env_float("DOWNLOAD_TIMEOUT", 300.0))
+    download_segments: int = field(default_factory=lambda: _env_int("DOWNLOAD_SEGMENTS", 4))
+    download_segment_min_bytes: int = field(
+        default_factory=lambda: _env_int("DOWNLOAD_SEGMENT_MIN_BYTES", 8 * 1024 * 1024)
+    )
+    download_retries: int = field(default_factory=lambda: _env_int("DOWNLOAD_RETRIES", 2))
+    download_index_db: Path = field(
+        default_factory=lambda: Path(
+            os.getenv("DOWNLOAD_INDEX_DB") or Path(os.getenv("DOWNLOAD_DIR", "downloads")) / ".index.db"
+        )
+    )
+
+    # Downloads directory lifecycle
+    download_max_bytes: int = field(default_factory=lambda: _env_int("DOWNLOAD_MAX_BYTES", 10 * 1024**3))
+    download_min_free_bytes: int = field(
+        default_factory=lambda: _env_int("DOWNLOAD_MIN_FREE_BYTES", 256 * 1024 * 1024)
+    )
+    download_max_age: float = field(default_factory=lambda: _env_float("DOWNLOAD_MAX_AGE", 0.0))
+    download_orphan_age: float = field(default_factory=lambda: _env_float("DOWNLOAD_ORPHAN_AGE", 3600.0))
+    download_sweep_interval: float = field(default_factory=lambda: _env_float("DOWNLOAD_SWEEP_INTERVAL", 300.0))
+
+    # Shared HTTP connection pool
+    http_pool_limit: int = field(default_factory=lambda: _env_int("HTTP_POOL_LIMIT", 100))
+    http_pool_limit_per_host: int = field(default_factory=lambda: _env_int("HTTP_POOL_LIMIT_PER_HOST", 10))
+    http_dns_cache_ttl: int = field(default_factory=lambda: _env_int("HTTP_DNS_CACHE_TTL", 300))
+    http_keepalive_timeout: float = field(default_factory=lambda: _env_float("HTTP_KEEPALIVE_TIMEOUT", 30.0))
+    http_connect_timeout: float = field(default_factory=lambda: _env_float("HTTP_CONNECT_TIMEOUT", 10.0))
+    http_read_timeout: float = field(default_factory=lambda: _env_float("HTTP_READ_TIMEOUT", 60.0))
+
+    # Upload ingestion
+    max_upload_bytes: int = field(default_factory=lambda: _env_int("MAX_UPLOAD_BYTES", 50 * 1024 * 1024))
+    upload_chunk_size: int = field(default_factory=lambda: _env_int("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+    # PDF text extraction
+    extract_workers: int = field(default_factory=lambda: _env_int("EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+    extract_min_pages_for_pool: int = field(default_factory=lambda: _env_int("EXTRACT_MIN_PAGES_FOR_POOL", 16))
+    extract_timeout: float = field(default_factory=lambda: _env_float("EXTRACT_TIMEOUT", 120.0))
+    pdf_backend: str = field(default_factory=lambda: os.getenv("PDF_BACKEND", "auto"))
+    pdf_backend_fallback: List[str] = field(
+        default_factory=lambda: [name.strip() for name in os.getenv("PDF_BACKEND_FALLBACK", "auto").split(",") if name.strip()]
+    )
+    pdf_benchmark_sample: Optional[Path] = field(default_factory=lambda: _env_optional_path("PDF_BENCHMARK_SAMPLE", ""))
+
+    # Google Gemini
+    gemini_api_key: Optional[str] = field(default_factory=lambda: os.getenv("GEMINI_API_KEY"))
+    gemini_model: str = field(default_factory=lambda: os.getenv("GEMINI_MODEL", "gemini-pro"))
+    gemini_max_concurrency: int = field(default_factory=lambda: _env_int("GEMINI_MAX_CONCURRENCY", 8))
+    gemini_max_queue: int = field(default_factory=lambda: _env_int("GEMINI_MAX_QUEUE", 64))
+    gemini_queue_timeout: float = field(default_factory=lambda: _env_float("GEMINI_QUEUE_TIMEOUT", 30.0))
+
+    # Prompt budgeting
+    summary_prompt_tokens: int = field(default_factory=lambda: _env_int("SUMMARY_PROMPT_TOKENS", 8000))
+    prompt_token_counter: str = field(default_factory=lambda: os.getenv("PROMPT_TOKEN_COUNTER", "estimate"))
+    prompt_token_cache_size: int = field(default_factory=lambda: _env_int("PROMPT_TOKEN_CACHE_SIZE", 4096))
+
+    # Map-reduce summarization
+    summary_chunk_tokens: int = field(default_factory=lambda: _env_int("SUMMARY_CHUNK_TOKENS", 6000))
+    summary_map_concurrency: int = field(default_factory=lambda: _env_int("SUMMARY_MAP_CONCURRENCY", 4))
+
+    # Background summarization jobs
+    jobs_dir: Path = field(default_factory=lambda: Path(os.getenv("JOBS_DIR", "jobs")))
+    jobs_db: Path = field(default_factory=lambda: Path(os.getenv("JOBS_DB", "jobs/jobs.db")))
+    job_workers: int = field(default_factory=lambda: _env_int("JOB_WORKERS", 2))
+    job_queue_max: int = field(default_factory=lambda: _env_int("JOB_QUEUE_MAX", 100))
+    job_max_age: float = field(default_factory=lambda: _env_float("JOB_MAX_AGE", 86400.0))
+    job_max_finished: int = field(default_factory=lambda: _env_int("JOB_MAX_FINISHED", 10000))
+    # Cleared by the prefork server, whose master process recovers interrupted jobs once before forking
+    job_recover_on_start: bool = True
+
+    # Health reporting
+    health_sample_interval: float = field(default_factory=lambda: _env_float("HEALTH_SAMPLE_INTERVAL", 15.0))
+
+    # Batch endpoints
+    batch_concurrency: int = field(default_factory=lambda: _env_int("BATCH_CONCURRENCY", 4))
+    batch_max_items: int = field(default_factory=lambda: _env_int("BATCH_MAX_ITEMS", 100))
+
+    # Summary cache
+    summary_cache_size: int = field(default_factory=lambda: _env_int("SUMMARY_CACHE_SIZE", 256))
+    summary_cache_ttl: float = field(default_factory=lambda: _env_float("SUMMARY_CACHE_TTL", 86400.0))
+    summary_cache_db: Optional[Path] = field(
+        default_factory=lambda: Path(os.environ["SUMMARY_CACHE_DB"]) if os.getenv("SUMMARY_CACHE_DB") else None
+    )
+    summary_cache_max_bytes: int = field(default_factory=lambda: _env_int("SUMMARY_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+    # Extracted text store
+    text_store_db: Optional[Path] = field(default_factory=lambda: _env_optional_path("TEXT_STORE_DB", "cache/text.db"))
+    text_store_max_bytes: int = field(default_factory=lambda: _env_int("TEXT_STORE_MAX_BYTES", 256 * 1024 * 1024))
+
+    # Rate limiting and admission control
+    rate_limit_client_id: str = field(default_factory=lambda: os.getenv("RATE_LIMIT_CLIENT_ID", "ip"))
+    rate_limit_api_keys: List[str] = field(
+        default_factory=lambda: [key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()]
+    )
+    rate_limit_db: Optional[Path] = field(default_factory=lambda: _env_optional_path("RATE_LIMIT_DB", ""))
+    rate_limit_summarize_per_minute: float = field(
+        default_factory=lambda: _env_float("RATE_LIMIT_SUMMARIZE_PER_MINUTE", 60.0)
+    )
+    rate_limit_summarize_burst: int = field(default_factory=lambda: _env_int("RATE_LIMIT_SUMMARIZE_BURST", 20))
+    rate_limit_download_per_minute: float = field(
+        default_factory=lambda: _env_float("RATE_LIMIT_DOWNLOAD_PER_MINUTE", 300.0)
+    )
+    rate_limit_download_burst: int = field(default_factory=lambda: _env_int("RATE_LIMIT_DOWNLOAD_BURST", 60))
+    max_in_flight_summarize: int = field(default_factory=lambda: _env_int("MAX_IN_FLIGHT_SUMMARIZE", 64))
+    max_in_flight_download: int = field(default_factory=lambda: _env_int("MAX_IN_FLIGHT_DOWNLOAD", 256))
+
+    # Production server (python -m src.server)
+    server_host: str = field(default_factory=lambda: os.getenv("SERVER_HOST", "0.0.0.0"))
+    server_port: int = field(default_factory=lambda: _env_int("SERVER_PORT", 8000))
+    server_workers: int = field(default_factory=lambda: _env_int("WEB_CONCURRENCY", 1))
+    shutdown_grace_period: float = field(default_factory=lambda: _env_float("SHUTDOWN_GRACE_PERIOD", 30.0))
+
+
+settings = Settings()
@@ -0,0 +1,171 @@
+"""
+Persistent index of downloaded files.
+
+Each downloaded URL is recorded with its local path, the validators the
+origin sent (ETag and Last-Modified), its size and its SHA-256, so later
+requests for the same URL can be revalidated with a conditional GET instead
+of transferring the body again. Interrupted transfers are recorded too, so
+their ``.part`` file can be resumed with a Range request.
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+
+@dataclass
+class DownloadRecord:
+    """Index entry for one downloaded URL."""
+
+    url: str
+    path: Path
+    etag: Optional[str]
+    last_modified: Optional[str]
+    size: int
+    sha256: str
+    fetched_at: float
+
+    def is_current(self, dest_dir: Path) -> bool:
+        """Whether the indexed file still exists in dest_dir with the recorded size."""
+        try:
+            return self.path.parent == dest_dir and self.path.stat().st_size == self.size
+        except OSError:
+            return False
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Request headers revalidating this entry against the origin."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+@dataclass
+class PartialDownload:
+    """Index entry for an interrupted download that can be resumed."""
+
+    url: str
+    part_path: Path
+    filename: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    total_size: Optional[int]
+
+    @property
+    def validator(self) -> Optional[str]:
+        """If-Range value guarding the resumed bytes against a changed origin."""
+        return self.etag or self.last_modified
+
+
+class DownloadIndex:
+    """
+    SQLite-backed map of URL to downloaded file.
+
+    Args:
+        db_path: SQLite database file
+    """
+
+    def __init__(self, db_path: Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                " url TEXT PRIMARY KEY,"
+                " path TEXT NOT NULL,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " size INTEGER NOT NULL,"
+                " sha256 TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS partials ("
+                " url TEXT PRIMARY KEY,"
+                " part_path TEXT NOT NULL,"
+                " filename TEXT NOT NULL,"
+                " etag TEXT,"
+                " last_modified TEXT,"
+                " total_size INTEGER)"
+            )
+            self._db.commit()
+
+    def get(self, url: str) -> Optional[DownloadRecord]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM downloads WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return DownloadRecord(**{**dict(row), "path": Path(row["path"])})
+
+    def put(self, record: DownloadRecord):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO downloads (url, path, etag, last_modified, size, sha256, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record.url,
+                    str(record.path),
+                    record.etag,
+                    record.last_modified,
+                    record.size,
+                    record.sha256,
+                    record.fetched_at,
+                ),
+            )
+            self._db.commit()
+
+    def touch(self, url: str):
+        """Record that an entry was revalidated now."""
+        with self._lock:
+            self._db.execute("UPDATE downloads SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+    def delete(self, url: str):
+        with self._lock:
+            self._db.execute("DELETE FROM downloads WHERE url = ?", (url,))
+            self._db.commit()
+
+    def delete_path(self, path: Path):
+        """Forget every URL downloaded to a file, e.g. after the file was evicted."""
+        with self._lock:
+            self._db.execute("DELETE FROM downloads WHERE path = ?", (str(path),))
+            self._db.commit()
+
+    def get_partial(self, url: str) -> Optional[PartialDownload]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM partials WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return PartialDownload(**{**dict(row), "part_path": Path(row["part_path"])})
+
+    def put_partial(self, partial: PartialDownload):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO partials (url, part_path, filename, etag, last_modified, total_size)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    partial.url,
+                    str(partial.part_path),
+                    partial.filename,
+                    partial.etag,
+                    partial.last_modified,
+                    partial.total_size,
+                ),
+            )
+            self._db.commit()
+
+    def delete_partial(self, url: str):
+        with self._lock:
+            self._db.execute("DELETE FROM partials WHERE url = ?", (url,))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
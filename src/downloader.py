@@ -0,0 +1,635 @@
+"""
+Asynchronous download engine.
+
+Bodies are streamed with aiohttp and written to disk from a worker thread so a
+slow origin or a slow disk never blocks the event loop. Completed downloads
+are recorded in the download index; repeat requests are revalidated with a
+conditional GET and concurrent requests for the same URL are coalesced.
+
+Bodies are written to a ``.part`` file that is renamed into place once
+complete and verified. Worker processes of the prefork server share the
+downloads directory, so a transfer holds an exclusive ``flock`` on a hidden
+``.lock`` file next to its ``.part`` file; another process fetching the same
+URL waits for it and then revalidates the finished download instead of
+writing into the same ``.part`` file. An interrupted transfer keeps its ``.part`` file and
+resumes from where it stopped with a Range request. Large files from origins
+that advertise ``Accept-Ranges: bytes`` are fetched as several byte ranges
+concurrently into a preallocated file.
+"""
+
+import asyncio
+import base64
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+try:
+    import fcntl
+except ImportError:  # Windows has no prefork server; in-process coalescing is enough
+    fcntl = None
+
+from src.download_index import DownloadIndex, DownloadRecord, PartialDownload
+from src.storage import DownloadStorage, Reservation, is_stored_file
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Seconds between attempts to take a URL's lock held by another process
+LOCK_POLL_INTERVAL = 0.1
+
+# Errors after which a transfer is retried, resuming from its .part file
+RETRYABLE_ERRORS = (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+class DownloadError(Exception):
+    """Raised when a transfer completes but fails verification."""
+
+
+class _Restart(Exception):
+    """The .part file cannot be resumed and the transfer must start over."""
+
+
+def resolve_filename(url: str, headers) -> str:
+    """
+    Work out the local filename for a download.
+
+    Args:
+        url: URL the file was requested from
+        headers: Response headers
+
+    Returns:
+        Filename taken from Content-Disposition, or the last URL path
+        segment, made safe with safe_filename()
+    """
+    filename = url.split('/')[-1]
+    if 'content-disposition' in headers:
+        cd = headers['content-disposition']
+        filename = cd.split('filename=')[-1].strip('"')
+    return safe_filename(filename, url)
+
+
+def safe_filename(name: str, url: str) -> str:
+    """
+    Reduce an origin-supplied filename to a plain name inside the downloads directory.
+
+    Directory components are dropped. Names the service reserves for itself
+    (hidden files such as the index, ``.part`` and ``.tmp`` files) and names
+    that are empty or ``.``/``..`` are replaced by one derived from the URL.
+
+    Args:
+        name: Filename suggested by the origin or the URL
+        url: URL of the download, used for the fallback name
+
+    Returns:
+        A filename without path separators that the storage manager tracks
+    """
+    name = PurePosixPath(name.replace("\\", "/")).name
+    if name in ("", ".", "..") or not is_stored_file(name):
+        return f"download-{hashlib.sha256(url.encode()).hexdigest()[:16]}"
+    return name
+
+
+def part_path_for(url: str, dest_dir: Path) -> Path:
+    """Stable ``.part`` path of a URL's in-progress download, so it can be resumed."""
+    return dest_dir / f".{hashlib.sha256(url.encode()).hexdigest()[:16]}.part"
+
+
+def lock_path_for(url: str, dest_dir: Path) -> Path:
+    """Hidden lock file guarding a URL's ``.part`` file across processes."""
+    return part_path_for(url, dest_dir).with_suffix(".lock")
+
+
+def _try_lock(path: Path) -> Optional[int]:
+    """
+    Take an exclusive flock on a lock file without blocking.
+
+    Returns:
+        The locked file descriptor, or None if another process holds the lock
+    """
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        # The previous holder removes the file on release; a lock on a removed file guards nothing
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def _unlock(path: Path, fd: int):
+    """Remove a lock file, then release the lock by closing it."""
+    path.unlink(missing_ok=True)
+    os.close(fd)
+
+
+def split_ranges(total: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split a byte count into contiguous, inclusive byte ranges.
+
+    Args:
+        total: Number of bytes
+        parts: Number of ranges wanted
+
+    Returns:
+        (first, last) byte offsets covering every byte exactly once
+    """
+    parts = max(1, min(parts, total))
+    size, extra = divmod(total, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end - 1))
+        start = end
+    return ranges
+
+
+def parse_content_range(header: Optional[str]) -> Optional[Tuple[int, int, Optional[int]]]:
+    """
+    Parse a ``Content-Range: bytes first-last/total`` header.
+
+    Returns:
+        (first, last, total) with total None if unknown, or None if the
+        header is missing or malformed
+    """
+    if not header or not header.startswith("bytes "):
+        return None
+    try:
+        span, _, total = header[6:].partition("/")
+        first, _, last = span.partition("-")
+        return int(first), int(last), None if total == "*" else int(total)
+    except ValueError:
+        return None
+
+
+def expected_sha256(headers) -> Optional[str]:
+    """
+    SHA-256 announced by the origin in a ``Digest`` or ``Repr-Digest`` header.
+
+    Returns:
+        Hex digest, or None if the origin did not send one
+    """
+    for name in ("Repr-Digest", "Digest"):
+        for item in headers.get(name, "").split(","):
+            algorithm, _, value = item.strip().partition("=")
+            if algorithm.lower() == "sha-256" and value:
+                try:
+                    return base64.b64decode(value.strip(":")).hex()
+                except ValueError:
+                    return None
+    return None
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def _hash_file(path: Path, digest=None):
+    """Feed a file's contents into a digest (a new SHA-256 by default) and return it."""
+    digest = digest or hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest
+
+
+def _write_chunk(f, digest, chunk: bytes):
+    f.write(chunk)
+    digest.update(chunk)
+
+
+def _preallocate(path: Path, size: int) -> int:
+    """Create a file of the given size and return a writable descriptor."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    except OSError:
+        # Filesystems without fallocate support still accept a sparse file
+        os.ftruncate(fd, size)
+    return fd
+
+
+async def write_stream(
+    response: aiohttp.ClientResponse,
+    file_path: Path,
+    chunk_size: int,
+    digest,
+    append: bool = False,
+) -> int:
+    """
+    Stream a response body to a file without blocking the event loop.
+
+    Args:
+        response: Open aiohttp response
+        file_path: Destination path
+        chunk_size: Size of the chunks read from the socket
+        digest: Hash object updated with every chunk written
+        append: Append to the file instead of truncating it
+
+    Returns:
+        Number of bytes written
+    """
+    loop = asyncio.get_running_loop()
+    f = await loop.run_in_executor(None, open, file_path, 'ab' if append else 'wb')
+    written = 0
+    try:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            await loop.run_in_executor(None, _write_chunk, f, digest, chunk)
+            written += len(chunk)
+    finally:
+        await loop.run_in_executor(None, f.close)
+    return written
+
+
+DOWNLOADED = "downloaded"
+NOT_MODIFIED = "not_modified"
+
+
+@dataclass
+class DownloadResult:
+    """Outcome of a download."""
+
+    path: Path
+    size: int
+    sha256: str
+    status: str = DOWNLOADED
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    coalesced: bool = False
+    resumed_from: int = 0
+    segments: int = 1
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+class Downloader:
+    """
+    Download coordinator backed by the download index.
+
+    URLs already in the index are revalidated with a conditional request and
+    served from disk when unchanged. Concurrent requests for the same URL
+    share one in-flight transfer. Interrupted transfers are retried, resuming
+    from the bytes already on disk.
+
+    Args:
+        index: Persistent URL to file index
+        chunk_size: Size of the chunks read from the socket
+        segments: Maximum number of concurrent byte ranges per file; 1
+            disables segmented downloads
+        segment_min_bytes: Minimum size of one byte range; smaller files are
+            fetched in a single stream
+        retries: Times an interrupted transfer is resumed within one request
+        storage: Optional quota manager; transfers into its directory reserve
+            their size before writing and are recorded once complete
+    """
+
+    def __init__(
+        self,
+        index: DownloadIndex,
+        chunk_size: int,
+        segments: int = 4,
+        segment_min_bytes: int = 8 * 1024 * 1024,
+        retries: int = 2,
+        storage: Optional[DownloadStorage] = None,
+    ):
+        self.index = index
+        self.chunk_size = chunk_size
+        self.segments = segments
+        self.segment_min_bytes = segment_min_bytes
+        self.retries = retries
+        self.storage = storage
+        self._inflight: Dict[Tuple[str, Path], asyncio.Task] = {}
+        self.transfers = 0
+        self.not_modified = 0
+        self.coalesced = 0
+        self.resumed = 0
+        self.segmented = 0
+        self.lock_waits = 0
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str, dest_dir: Path) -> DownloadResult:
+        """
+        Download a URL into a directory, reusing an unchanged earlier download.
+
+        Args:
+            session: aiohttp session used to perform the request
+            url: URL of the file to download
+            dest_dir: Directory the file is saved into
+
+        Returns:
+            The download result; ``coalesced`` is set when the transfer was
+            started by another concurrent request
+        """
+        key = (url, dest_dir)
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+            # Shield so one caller disconnecting does not cancel the others' transfer
+            return replace(await asyncio.shield(task), coalesced=True)
+
+        task = asyncio.ensure_future(self._fetch(session, url, dest_dir))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    async def drain(self, timeout: float) -> int:
+        """
+        Wait for in-flight transfers to finish, e.g. at shutdown.
+
+        Args:
+            timeout: Seconds to wait before cancelling the remaining transfers
+
+        Returns:
+            The number of transfers that were cancelled
+        """
+        loop = asyncio.get_running_loop()
+        tasks = [task for task in self._inflight.values() if task.get_loop() is loop]
+        if not tasks:
+            return 0
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return len(pending)
+
+    def _forget(self, key: Tuple[str, Path], task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved; every waiter re-raises it anyway
+            task.exception()
+
+    @asynccontextmanager
+    async def _locked(self, url: str, dest_dir: Path):
+        """Hold a URL's cross-process lock, polling while another worker process holds it."""
+        if fcntl is None:
+            yield
+            return
+        path = lock_path_for(url, dest_dir)
+        # Not in a thread: the calls never block, and a cancelled thread could leave the lock held
+        fd = _try_lock(path)
+        if fd is None:
+            self.lock_waits += 1
+            while fd is None:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                fd = _try_lock(path)
+        try:
+            yield
+        finally:
+            _unlock(path, fd)
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, dest_dir: Path) -> DownloadResult:
+        async with self._locked(url, dest_dir):
+            return await self._fetch_locked(session, url, dest_dir)
+
+    async def _fetch_locked(self, session: aiohttp.ClientSession, url: str, dest_dir: Path) -> DownloadResult:
+        # Read after taking the lock, so a download another process just finished is revalidated
+        record = await asyncio.to_thread(self.index.get, url)
+        if record is not None and not await asyncio.to_thread(record.is_current, dest_dir):
+            record = None
+
+        attempt = 0
+        while True:
+            try:
+                result = await self._transfer(session, url, dest_dir, record)
+                break
+            except _Restart:
+                await asyncio.to_thread(self._discard_partial, url, part_path_for(url, dest_dir))
+            except RETRYABLE_ERRORS:
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+
+        if result.status == NOT_MODIFIED:
+            self.not_modified += 1
+            await asyncio.to_thread(self.index.touch, url)
+            if self.storage is not None:
+                self.storage.touch(result.path)
+        else:
+            self.transfers += 1
+            self.resumed += result.resumed_from > 0
+            self.segmented += result.segments > 1
+            await asyncio.to_thread(
+                self.index.put,
+                DownloadRecord(
+                    url=url,
+                    path=result.path,
+                    etag=result.etag,
+                    last_modified=result.last_modified,
+                    size=result.size,
+                    sha256=result.sha256,
+                    fetched_at=time.time(),
+                ),
+            )
+        return result
+
+    def _discard_partial(self, url: str, part_path: Path):
+        part_path.unlink(missing_ok=True)
+        self.index.delete_partial(url)
+
+    async def _transfer(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        dest_dir: Path,
+        record: Optional[DownloadRecord],
+    ) -> DownloadResult:
+        """Perform one download attempt, resuming a .part file when possible."""
+        part_path = part_path_for(url, dest_dir)
+        partial = await asyncio.to_thread(self.index.get_partial, url)
+        offset = await asyncio.to_thread(_file_size, part_path) if partial is not None else 0
+        if partial is not None and (offset == 0 or partial.part_path != part_path or not partial.validator):
+            await asyncio.to_thread(self._discard_partial, url, part_path)
+            partial, offset = None, 0
+
+        headers = record.conditional_headers() if record is not None else {}
+        if partial is not None:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = partial.validator
+
+        reservation: Optional[Reservation] = None
+        try:
+            started = time.perf_counter()
+            segmented_total = None
+            async with session.get(url, headers=headers) as response:
+                ttfb = time.perf_counter() - started
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+                if record is not None and response.status == 304:
+                    if partial is not None:
+                        await asyncio.to_thread(self._discard_partial, url, part_path)
+                    return DownloadResult(
+                        path=record.path,
+                        size=record.size,
+                        sha256=record.sha256,
+                        status=NOT_MODIFIED,
+                        etag=etag or record.etag,
+                        last_modified=last_modified or record.last_modified,
+                        timings={"ttfb": ttfb},
+                    )
+                if partial is not None and response.status == 416:
+                    raise _Restart()
+                response.raise_for_status()
+
+                started = time.perf_counter()
+                if partial is not None and response.status == 206:
+                    content_range = parse_content_range(response.headers.get('Content-Range'))
+                    if content_range is None or content_range[0] != offset:
+                        raise _Restart()
+                    filename = partial.filename
+                    total = content_range[2] or partial.total_size
+                    etag = etag or partial.etag
+                    last_modified = last_modified or partial.last_modified
+                    reservation = await self._reserve(dest_dir, total or offset, part_path)
+                    digest = await asyncio.to_thread(_hash_file, part_path)
+                    written = await write_stream(response, part_path, self.chunk_size, digest, append=True)
+                    resumed_from = offset
+                else:
+                    # Full body: either nothing to resume or the origin changed since
+                    filename = resolve_filename(url, response.headers)
+                    total = response.content_length
+                    resumed_from = 0
+                    reservation = await self._reserve(dest_dir, total or 0, part_path)
+                    segments = self._segment_count(response, total)
+                    if segments > 1:
+                        segmented_total = total
+                    else:
+                        await asyncio.to_thread(
+                            self.index.put_partial,
+                            PartialDownload(url, part_path, filename, etag, last_modified, total),
+                        )
+                        digest = hashlib.sha256()
+                        written = await write_stream(response, part_path, self.chunk_size, digest)
+                expected = expected_sha256(response.headers) if resumed_from == 0 else None
+
+            if segmented_total is not None:
+                # The probe response is released unread; each range gets its own request
+                digest = await self._download_segments(
+                    session, url, part_path, segmented_total, segments, etag or last_modified
+                )
+                written = segmented_total
+
+            size = resumed_from + written
+            sha256 = digest.hexdigest()
+            try:
+                if total is not None and size != total:
+                    raise DownloadError(f"Downloaded {size} bytes but the origin announced {total}")
+                if expected is not None and sha256 != expected:
+                    raise DownloadError("Downloaded file does not match the origin's SHA-256 digest")
+            except DownloadError:
+                await asyncio.to_thread(self._discard_partial, url, part_path)
+                raise
+
+            # Names resumed from the index may predate safe_filename()
+            file_path = dest_dir / safe_filename(filename, url)
+            await asyncio.to_thread(os.replace, part_path, file_path)
+            await asyncio.to_thread(self.index.delete_partial, url)
+            if reservation is not None:
+                await reservation.commit(file_path, size)
+            return DownloadResult(
+                path=file_path,
+                size=size,
+                sha256=sha256,
+                etag=etag,
+                last_modified=last_modified,
+                resumed_from=resumed_from,
+                segments=segments if segmented_total is not None else 1,
+                timings={"ttfb": ttfb, "transfer": time.perf_counter() - started},
+            )
+        finally:
+            if reservation is not None:
+                await asyncio.to_thread(reservation.release)
+
+    async def _reserve(self, dest_dir: Path, size: int, part_path: Path) -> Optional[Reservation]:
+        """Reserve the whole of a transfer's ``.part`` file in the managed directory (see DownloadStorage.reserve)."""
+        if self.storage is None or not self.storage.manages(dest_dir / "_"):
+            return None
+        return await asyncio.to_thread(self.storage.reserve, size, part=part_path)
+
+    def _segment_count(self, response: aiohttp.ClientResponse, total: Optional[int]) -> int:
+        """Number of byte ranges to fetch a response's body in, 1 for a single stream."""
+        if self.segments <= 1 or not total or total < 2 * self.segment_min_bytes:
+            return 1
+        if response.headers.get('Accept-Ranges', '').lower() != 'bytes':
+            return 1
+        # Without a validator, ranges could mix bytes from two versions of the file
+        if not (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            return 1
+        return min(self.segments, total // self.segment_min_bytes)
+
+    async def _download_segments(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        part_path: Path,
+        total: int,
+        segments: int,
+        validator: str,
+    ):
+        """
+        Fetch a file as concurrent byte ranges into a preallocated .part file.
+
+        Returns:
+            SHA-256 digest of the assembled file
+
+        Raises:
+            DownloadError: If the origin ignores a range or a range is incomplete
+        """
+        loop = asyncio.get_running_loop()
+        fd = await asyncio.to_thread(_preallocate, part_path, total)
+
+        async def fetch_range(first: int, last: int):
+            headers = {"Range": f"bytes={first}-{last}", "If-Range": validator}
+            async with session.get(url, headers=headers) as response:
+                response.raise_for_status()
+                content_range = parse_content_range(response.headers.get('Content-Range'))
+                if response.status != 206 or content_range is None or content_range[:2] != (first, last):
+                    raise DownloadError(f"Origin did not honour the range {first}-{last}")
+                position = first
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    if position + len(chunk) > last + 1:
+                        raise DownloadError(f"Origin sent too many bytes for the range {first}-{last}")
+                    await loop.run_in_executor(None, os.pwrite, fd, chunk, position)
+                    position += len(chunk)
+                if position != last + 1:
+                    raise DownloadError(f"Range {first}-{last} ended after {position - first} bytes")
+
+        tasks = [asyncio.ensure_future(fetch_range(first, last)) for first, last in split_ranges(total, segments)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.to_thread(os.close, fd)
+            await asyncio.to_thread(self._discard_partial, url, part_path)
+            raise
+        await asyncio.to_thread(os.close, fd)
+        return await asyncio.to_thread(_hash_file, part_path)
+
+    def stats(self) -> dict:
+        """Report transfers, revalidations, coalesced, resumed and segmented downloads, and waits on other processes."""
+        return {
+            "transfers": self.transfers,
+            "not_modified": self.not_modified,
+            "coalesced": self.coalesced,
+            "resumed": self.resumed,
+            "segmented": self.segmented,
+            "lock_waits": self.lock_waits,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,447 @@
+"""
+PDF text extraction stage.
+
+Text extraction is CPU bound, so it never runs on the event loop thread.
+Small documents are extracted in a worker thread; larger ones are split into
+contiguous page ranges that are extracted in parallel by a process pool.
+
+A job that times out frees its request. When it ran in the process pool, the
+pool is also replaced: new jobs go to fresh workers and the old workers are
+terminated once every job they were given has had its own timeout, so a
+pathological PDF cannot keep a worker busy for good. A thread cannot be
+stopped, so a timed out job run in a thread keeps that thread until it
+finishes.
+
+When only a bounded amount of text is needed, pages are read lazily and
+extraction stops as soon as the character budget is filled, either from the
+start of the document ("budget") or from its start, middle and end
+("sampled").
+
+With a text store attached, extracted pages are persisted per document hash
+and page, and later requests read the stored pages instead of parsing the
+PDF again; only pages never extracted before are pulled from the document.
+The store holds text read by the configured backend, so a request for
+another backend extracts its pages afresh and leaves the store alone.
+
+Pages are read through a chain of PDF backends (see src.pdf_backends) chosen
+per document, and the work done by each backend is reported back to the
+pool's BackendSelector, also from worker processes.
+"""
+
+import asyncio
+import io
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Literal, Optional, Sequence, Tuple, Union
+
+from src.pdf_backends import BackendSelector, BackendUsage, PdfDocument
+from src.text_store import TextStore
+
+ExtractionMode = Literal["full", "budget", "sampled"]
+
+PAGE_SEPARATOR = "\n"
+
+
+@dataclass
+class ExtractionResult:
+    """Text extracted from a document; ``pages`` holds the text of each page read, in document order."""
+
+    text: str
+    page_count: int
+    pages_read: int
+    pages_from_store: int = 0
+    pages: List[str] = field(default_factory=list)
+    backend: Optional[str] = None
+
+
+def extract_page_batch(
+    source: Union[bytes, str],
+    page_indices: Sequence[int],
+    chain: Sequence[str] = ("pypdf2",),
+) -> Tuple[List[str], Dict[str, BackendUsage]]:
+    """
+    Extract the text of selected pages, reporting the work done by each backend.
+
+    Runs inside pool workers, so it takes the raw document (bytes or a path)
+    rather than a parsed reader. Paths are memory-mapped, so every worker
+    shares the page cache instead of receiving its own copy of the document.
+
+    Args:
+        source: PDF bytes or path to a PDF file
+        page_indices: Zero-based indices of the pages to extract
+        chain: PDF backends to try, in order
+
+    Returns:
+        Extracted text for each requested page, in order, and the usage of
+        each backend involved
+    """
+    if isinstance(source, bytes):
+        document = PdfDocument(io.BytesIO(source), chain)
+        return [document.page_text(i) for i in page_indices], document.usage
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        document = PdfDocument(mapped, chain)
+        return [document.page_text(i) for i in page_indices], document.usage
+
+
+def extract_pages(
+    source: Union[bytes, str],
+    page_indices: Sequence[int],
+    chain: Sequence[str] = ("pypdf2",),
+) -> List[str]:
+    """Extract the text of selected pages (see extract_page_batch)."""
+    return extract_page_batch(source, page_indices, chain)[0]
+
+
+def split_pages(page_count: int, parts: int) -> List[range]:
+    """
+    Split a page range into contiguous, near-equal slices.
+
+    Args:
+        page_count: Number of pages in the document
+        parts: Number of slices wanted
+
+    Returns:
+        Non-empty page ranges covering every page exactly once
+    """
+    parts = max(1, min(parts, page_count))
+    size, extra = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(range(start, end))
+        start = end
+    return ranges
+
+
+def sampled_order(page_count: int) -> List[int]:
+    """
+    Order pages so the start, middle and end of a document are read evenly.
+
+    Args:
+        page_count: Number of pages in the document
+
+    Returns:
+        Every page index exactly once, interleaving a forward walk from the
+        first page, a forward walk from the middle page and a backward walk
+        from the last page
+    """
+    middle = page_count // 2
+    walks = [iter(range(0, middle)), iter(range(middle, page_count)), iter(range(page_count - 1, -1, -1))]
+    order = []
+    seen = set()
+    while len(order) < page_count:
+        for walk in walks:
+            for index in walk:
+                if index not in seen:
+                    seen.add(index)
+                    order.append(index)
+                    break
+    return order
+
+
+class PageSource:
+    """
+    Page texts of one document, served from a text store when available.
+
+    Pages missing from the store are extracted from the PDF on demand (the
+    PDF is only parsed if at least one page is missing) and remembered so
+    they can be persisted afterwards.
+
+    Args:
+        stream: Seekable binary stream of the PDF
+        document: Already parsed PDF, if any
+        store: Text store to read stored pages from
+        content_hash: SHA-256 of the document, keying the store
+        lookup: Whether to look pages up in the store before extracting
+            them; off for documents the store has never seen
+        chain: PDF backends to parse the document with, in order
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        document: Optional[PdfDocument] = None,
+        store: Optional[TextStore] = None,
+        content_hash: Optional[str] = None,
+        lookup: bool = True,
+        chain: Sequence[str] = ("pypdf2",),
+    ):
+        self.stream = stream
+        self.document = document
+        self.chain = chain
+        self.store = store if content_hash is not None else None
+        self.content_hash = content_hash
+        self.lookup = lookup
+        self.stored: Dict[int, str] = {}
+        self.extracted: Dict[int, str] = {}
+        # Backend work done for this document by pool workers
+        self.worker_usage: List[Dict[str, BackendUsage]] = []
+
+    def __call__(self, index: int) -> str:
+        if index in self.stored:
+            return self.stored[index]
+        if index in self.extracted:
+            return self.extracted[index]
+        if self.store is not None and self.lookup:
+            found = self.store.get_pages(self.content_hash, [index])
+            if index in found:
+                self.stored[index] = found[index]
+                return found[index]
+        if self.document is None:
+            self.document = PdfDocument(self.stream, self.chain)
+        text = self.document.page_text(index)
+        self.extracted[index] = text
+        return text
+
+    def usage(self) -> Dict[str, BackendUsage]:
+        """Work done by each backend on this document, in this process and in pool workers."""
+        total: Dict[str, BackendUsage] = {}
+        for usage in ([self.document.usage] if self.document is not None else []) + self.worker_usage:
+            for name, work in usage.items():
+                total.setdefault(name, BackendUsage()).add(work)
+        return total
+
+    def backend(self) -> Optional[str]:
+        """Backend that extracted most of the pages, None if every page came from the store."""
+        usage = {name: work.pages for name, work in self.usage().items() if work.pages}
+        return max(usage, key=usage.get) if usage else None
+
+    def save(self, page_count: int):
+        """Persist newly extracted pages to the store."""
+        if self.store is not None and self.extracted:
+            self.store.put_pages(self.content_hash, page_count, self.extracted)
+        elif self.store is not None and self.stored:
+            self.store.touch(self.content_hash)
+
+
+def iter_page_texts(page_text: Callable[[int], str], order: Sequence[int]) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily extract pages in the given order.
+
+    Args:
+        page_text: Returns the text of a page by index
+        order: Page indices to visit
+
+    Yields:
+        (page index, page text) pairs, one page at a time
+    """
+    for index in order:
+        yield index, page_text(index)
+
+
+def extract_within_budget(page_text: Callable[[int], str], order: Sequence[int], budget: int) -> Tuple[str, List[str]]:
+    """
+    Extract pages until a character budget is filled.
+
+    Args:
+        page_text: Returns the text of a page by index
+        order: Order in which pages are read
+        budget: Maximum number of characters to return
+
+    Returns:
+        Text of the pages read (in document order, truncated to the budget)
+        and the untruncated text of each page read, in document order
+    """
+    collected = {}
+    used = 0
+    for index, text in iter_page_texts(page_text, order):
+        collected[index] = text
+        used += len(text) + len(PAGE_SEPARATOR)
+        if used >= budget:
+            break
+    pages = [collected[index] for index in sorted(collected)]
+    return PAGE_SEPARATOR.join(pages)[:budget], pages
+
+
+def _terminate(processes: List[multiprocessing.process.BaseProcess]):
+    """Kill the worker processes of a retired pool that are still running."""
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+
+
+class ExtractionPool:
+    """
+    Process-pool backed PDF text extractor.
+
+    Args:
+        workers: Number of worker processes; 0 extracts in a thread only
+        min_pages: Documents with fewer pages (still to extract) are
+            extracted in a thread
+        timeout: Seconds allowed for one extraction job; the process pool
+            is recycled when one of its jobs runs out of time
+        store: Text store persisting extracted pages, if any
+        backends: Chooses the PDF backends of each document and collects
+            their throughput; by default the fastest installed one first,
+            falling back to the others
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        min_pages: int = 16,
+        timeout: float = 120.0,
+        store: Optional[TextStore] = None,
+        backends: Optional[BackendSelector] = None,
+    ):
+        self.workers = workers
+        self.min_pages = min_pages
+        self.timeout = timeout
+        self.store = store
+        self.backends = backends or BackendSelector()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        """Start the worker processes."""
+        if self.workers > 0 and self._executor is None:
+            # spawn keeps workers independent of sockets and threads held by the server
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Replace a pool that ran out of time, terminating its workers once no job can still need them."""
+        if self._executor is not executor:
+            return
+        self._executor = None
+        processes = list(executor._processes.values())
+        # Jobs already given to the old workers keep running until they finish or time out themselves
+        executor.shutdown(wait=False)
+        asyncio.get_running_loop().call_later(self.timeout, _terminate, processes)
+
+    def shutdown(self):
+        """Stop the worker processes, abandoning queued jobs."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def extract_text(
+        self,
+        stream: BinaryIO,
+        mode: ExtractionMode = "full",
+        budget: Optional[int] = None,
+        path: Optional[Path] = None,
+        content_hash: Optional[str] = None,
+        backend: Optional[str] = None,
+    ) -> ExtractionResult:
+        """
+        Extract text from a PDF stream.
+
+        Args:
+            stream: Seekable binary stream positioned at the start of the PDF
+            mode: "full" extracts every page; "budget" reads pages from the
+                start and "sampled" from the start, middle and end, stopping
+                once the budget is filled
+            budget: Character budget for the "budget" and "sampled" modes
+            path: File the stream was opened from, if any; pool workers then
+                map the file themselves instead of receiving a copy of it
+            content_hash: SHA-256 of the PDF; when given and a text store is
+                attached, stored pages are reused and new ones persisted
+            backend: PDF backend to read pages with first ("auto" for the
+                fastest); None uses the configured one. Any other backend
+                than the configured one bypasses the text store
+
+        Returns:
+            Extracted text, the document's page count, the number of pages
+            read, how many of them came from the text store and the backend
+            that read the last extracted page
+
+        Raises:
+            ValueError: If the backend is unknown or not installed
+            asyncio.TimeoutError: If extraction takes longer than the timeout
+        """
+        chain = self.backends.chain(backend)
+        if backend is not None and backend != self.backends.backend:
+            content_hash = None
+        stored = None
+        if self.store is not None and content_hash is not None:
+            stored = await asyncio.to_thread(self.store.document, content_hash)
+        if stored is not None:
+            # Known document: the PDF is only parsed if a needed page is missing
+            document = None
+            page_count = stored["page_count"]
+        else:
+            document = await asyncio.to_thread(PdfDocument, stream, chain)
+            page_count = document.page_count
+        source = PageSource(stream, document, self.store, content_hash, lookup=stored is not None, chain=chain)
+        try:
+            result = await self._extract(source, stream, mode, budget, path, page_count, chain)
+        finally:
+            self.backends.record(source.usage())
+        result.backend = source.backend()
+        return result
+
+    async def _extract(
+        self,
+        source: PageSource,
+        stream: BinaryIO,
+        mode: ExtractionMode,
+        budget: Optional[int],
+        path: Optional[Path],
+        page_count: int,
+        chain: List[str],
+    ) -> ExtractionResult:
+        content_hash = source.content_hash
+
+        if mode != "full" and budget is not None:
+            order = range(page_count) if mode == "budget" else sampled_order(page_count)
+            text, pages = await asyncio.wait_for(
+                asyncio.to_thread(extract_within_budget, source, order, budget),
+                self.timeout,
+            )
+            await asyncio.to_thread(source.save, page_count)
+            return ExtractionResult(
+                text=text,
+                page_count=page_count,
+                pages_read=len(pages),
+                pages_from_store=len(source.stored),
+                pages=pages,
+            )
+
+        if source.lookup:
+            source.stored = await asyncio.to_thread(self.store.get_pages, content_hash, range(page_count))
+            source.lookup = False
+        missing = [index for index in range(page_count) if index not in source.stored]
+
+        if missing and (self.workers <= 0 or len(missing) < self.min_pages):
+            await asyncio.wait_for(
+                asyncio.to_thread(lambda: [source(index) for index in missing]),
+                self.timeout,
+            )
+        elif missing:
+            self.start()
+            if path is not None:
+                document_source = str(path)
+            else:
+                stream.seek(0)
+                document_source = await asyncio.to_thread(stream.read)
+            loop = asyncio.get_running_loop()
+            slices = [missing[part.start:part.stop] for part in split_pages(len(missing), self.workers)]
+            executor = self._executor
+            jobs = [
+                loop.run_in_executor(executor, extract_page_batch, document_source, pages, chain)
+                for pages in slices
+            ]
+            try:
+                chunks = await asyncio.wait_for(asyncio.gather(*jobs), self.timeout)
+            except asyncio.TimeoutError:
+                self._recycle(executor)
+                raise
+            for pages, (texts, usage) in zip(slices, chunks):
+                source.extracted.update(zip(pages, texts))
+                source.worker_usage.append(usage)
+
+        await asyncio.to_thread(source.save, page_count)
+        pages = [source(index) for index in range(page_count)]
+        return ExtractionResult(
+            text=PAGE_SEPARATOR.join(pages),
+            page_count=page_count,
+            pages_read=page_count,
+            pages_from_store=len(source.stored),
+            pages=pages,
+        )
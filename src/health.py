@@ -0,0 +1,137 @@
+"""
+Health reporting helpers.
+
+System metrics (memory and disk usage) are sampled by a background task at a
+fixed interval and served from the latest snapshot, so health probes never
+call into psutil on the request path.
+"""
+
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import psutil
+
+PROCESS_STARTED = time.time()
+
+
+def format_bytes(bytes_value):
+    """Convert bytes to human readable format"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if bytes_value < 1024.0:
+            return f"{bytes_value:.1f} {unit}"
+        bytes_value /= 1024.0
+    return f"{bytes_value:.1f} PB"
+
+
+def format_uptime(uptime_seconds):
+    """Convert uptime seconds to human readable format"""
+    days = int(uptime_seconds // 86400)
+    hours = int((uptime_seconds % 86400) // 3600)
+    minutes = int((uptime_seconds % 3600) // 60)
+    seconds = int(uptime_seconds % 60)
+
+    if days > 0:
+        return f"{days}d {hours}h {minutes}m {seconds}s"
+    elif hours > 0:
+        return f"{hours}h {minutes}m {seconds}s"
+    elif minutes > 0:
+        return f"{minutes}m {seconds}s"
+    else:
+        return f"{seconds}s"
+
+
+def sample_system() -> dict:
+    """
+    Collect memory and disk usage.
+
+    Returns:
+        The "system" section of the /health payload
+    """
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+    return {
+        "python_version": sys.version.split()[0],
+        "memory_usage": {
+            "total": format_bytes(memory.total),
+            "available": format_bytes(memory.available),
+            "used": format_bytes(memory.used),
+            "percent": f"{memory.percent:.1f}%"
+        },
+        "disk_usage": {
+            "total": format_bytes(disk.total),
+            "free": format_bytes(disk.free),
+            "used": format_bytes(disk.used),
+            "percent": f"{(disk.used / disk.total) * 100:.1f}%"
+        }
+    }
+
+
+class SystemMetricsSampler:
+    """
+    Periodically samples system metrics in the background.
+
+    Args:
+        interval: Seconds between samples
+    """
+
+    def __init__(self, interval: float = 15.0):
+        self.interval = interval
+        self.snapshot: Optional[dict] = None
+        self.sampled_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def sample(self):
+        """Take a sample now and store it as the current snapshot."""
+        try:
+            self.snapshot = sample_system()
+            self.sampled_at = time.time()
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+
+    async def _run(self):
+        while True:
+            await asyncio.to_thread(self.sample)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start background sampling on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop background sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def current(self) -> dict:
+        """
+        Return the latest snapshot, sampling synchronously only if none exists yet.
+
+        Returns:
+            The "system" section of the /health payload
+        """
+        if self.snapshot is None:
+            self.sample()
+        if self.snapshot is None:
+            raise RuntimeError(self.error or "System metrics unavailable")
+        return self.snapshot
+
+
+def utc_timestamp() -> str:
+    """Current time formatted for the /health payload."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+
+
+def uptime() -> str:
+    """Process uptime formatted for the /health payload."""
+    return format_uptime(time.time() - PROCESS_STARTED)
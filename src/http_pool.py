@@ -0,0 +1,132 @@
+"""
+Application-wide HTTP connection pool.
+
+A single aiohttp session is shared by every outbound request so that TCP
+connections, TLS sessions and DNS lookups are reused across downloads. The
+pool is created at startup and closed at shutdown by the application
+lifespan.
+"""
+
+import asyncio
+from typing import Optional
+
+import aiohttp
+
+
+class HttpClientPool:
+    """
+    Shared aiohttp session with connection limits and reuse statistics.
+
+    Args:
+        limit: Maximum number of simultaneous connections
+        limit_per_host: Maximum number of simultaneous connections per host
+        dns_cache_ttl: Seconds resolved addresses are cached for
+        keepalive_timeout: Seconds idle connections are kept open
+        connect_timeout: Timeout for establishing a connection
+        read_timeout: Timeout between two reads from the socket
+        total_timeout: Timeout for a whole request
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 60.0,
+        total_timeout: Optional[float] = None,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout,
+            connect=connect_timeout,
+            sock_read=read_timeout,
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {
+            "connections_created": 0,
+            "connections_reused": 0,
+            "connections_queued": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+            "requests": 0,
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Build trace hooks that feed the pool statistics."""
+        trace = aiohttp.TraceConfig()
+
+        def counter(key):
+            async def hook(session, ctx, params):
+                self._stats[key] += 1
+            return hook
+
+        trace.on_connection_create_end.append(counter("connections_created"))
+        trace.on_connection_reuseconn.append(counter("connections_reused"))
+        trace.on_connection_queued_start.append(counter("connections_queued"))
+        trace.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        trace.on_request_start.append(counter("requests"))
+        return trace
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Create the shared session on the running event loop."""
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout,
+            trace_configs=[self._trace_config()],
+        )
+        self._loop = asyncio.get_running_loop()
+        return self._session
+
+    async def session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared session, starting it on first use.
+
+        Sessions are bound to the event loop that created them, so a new one
+        is started if the pool is used from a different loop.
+        """
+        if self._session is None or self._session.closed or self._loop is not asyncio.get_running_loop():
+            return await self.start()
+        return self._session
+
+    async def close(self):
+        """Close the shared session and all pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    def stats(self) -> dict:
+        """
+        Report pool usage.
+
+        Returns:
+            Connection reuse (hits) and creation (misses) counters, DNS cache
+            counters and the configured limits
+        """
+        created = self._stats["connections_created"]
+        reused = self._stats["connections_reused"]
+        total = created + reused
+        return {
+            **self._stats,
+            "pool_hits": reused,
+            "pool_misses": created,
+            "hit_ratio": round(reused / total, 3) if total else 0.0,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "dns_cache_ttl": self.dns_cache_ttl,
+            "active": self._session is not None and not self._session.closed,
+        }
@@ -0,0 +1,141 @@
+"""
+Bounded ingestion of uploaded documents.
+
+Uploads are consumed in fixed-size chunks to hash them and enforce the
+maximum upload size, then handed to the PDF parser as a seekable stream. The
+multipart parser already spools the body (in memory up to a small threshold,
+on disk beyond it), so no additional copy or temporary file is created here.
+Files already on disk (previous downloads) are memory-mapped in place.
+
+Because that spooling happens before an endpoint runs, upload routes also
+have a request body limit enforced by UploadLimitMiddleware: a request whose
+Content-Length is over the limit is rejected before any of its body is read,
+and a body without one is cut off as soon as it exceeds the limit.
+"""
+
+import hashlib
+import mmap
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+# Allowance for the multipart boundaries, part headers and form fields around each file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@dataclass
+class IngestedUpload:
+    """A fully received upload, or a mapped local file, ready to be parsed."""
+
+    stream: BinaryIO
+    size: int
+    sha256: str
+    path: Optional[Path] = None
+
+
+async def ingest_upload(file: UploadFile, max_bytes: int, chunk_size: int) -> IngestedUpload:
+    """
+    Hash and size-check an upload in bounded chunks.
+
+    Args:
+        file: Uploaded file
+        max_bytes: Maximum accepted upload size
+        chunk_size: Bytes read per iteration
+
+    Returns:
+        The upload stream rewound to the start, with its size and SHA-256
+
+    Raises:
+        HTTPException: 413 if the upload exceeds max_bytes
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds maximum size of {max_bytes} bytes")
+
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds maximum size of {max_bytes} bytes")
+        digest.update(chunk)
+
+    await file.seek(0)
+    return IngestedUpload(stream=file.file, size=size, sha256=digest.hexdigest())
+
+
+def ingest_path(path: Path, max_bytes: int) -> IngestedUpload:
+    """
+    Memory-map and hash a local file; blocking, so run it in a worker thread.
+
+    The file is mapped read-only instead of being read into memory, so
+    hashing and PDF parsing work on the page cache without copying it.
+
+    Args:
+        path: File to map
+        max_bytes: Maximum accepted file size
+
+    Returns:
+        The mapping (a seekable binary stream positioned at the start), its
+        size, its SHA-256 and its path; the caller closes the mapping
+
+    Raises:
+        HTTPException: 400 if the file is empty, 413 if it exceeds max_bytes
+    """
+    size = path.stat().st_size
+    if size == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    if size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds maximum size of {max_bytes} bytes")
+
+    with open(path, "rb") as f:
+        # The mapping stays valid after the file object is closed
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return IngestedUpload(stream=mapped, size=size, sha256=hashlib.sha256(mapped).hexdigest(), path=path)
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware limiting the request body size of upload routes.
+
+    Args:
+        app: Wrapped ASGI application
+        limits: Maximum body bytes per request path; other paths are not limited
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds maximum size of {limit} bytes"
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                # Answered before the body is read; the connection is closed rather than drained
+                response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Re-raised by FastAPI's form parsing and turned into the response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
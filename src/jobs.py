@@ -0,0 +1,343 @@
+"""
+Persistent background job queue for long-running summarizations.
+
+Jobs are recorded in SQLite and their uploads kept on disk, so queued work
+survives a restart. A fixed number of asyncio workers claim jobs in FIFO
+order; submissions are rejected once the number of unfinished jobs reaches
+the configured maximum, giving callers backpressure instead of an unbounded
+backlog. Finished jobs are kept for a while so their results can be fetched,
+then purged by age and by count.
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, BinaryIO, Callable, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# Seconds between purges of expired finished jobs
+PURGE_INTERVAL = 60.0
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has reached its maximum number of unfinished jobs."""
+
+
+class JobStore:
+    """
+    SQLite-backed job records.
+
+    Args:
+        db_path: SQLite database file
+    """
+
+    def __init__(self, db_path: Path):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " params TEXT NOT NULL,"
+                " payload_path TEXT,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " finished_at REAL,"
+                " owner_pid INTEGER)"
+            )
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            if "owner_pid" not in columns:
+                # Databases created before running jobs recorded the process running them
+                self._db.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)")
+            self._db.commit()
+
+    def insert(self, job_id: str, params: dict, payload_path: Optional[Path], max_unfinished: Optional[int] = None):
+        """
+        Record a queued job.
+
+        The unfinished jobs are counted in the same write transaction as the
+        insert, so concurrent submissions, from any process, cannot overshoot
+        max_unfinished.
+
+        Raises:
+            QueueFullError: If max_unfinished jobs are already unfinished
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if max_unfinished is not None:
+                    unfinished = self._db.execute(
+                        "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+                    ).fetchone()[0]
+                    if unfinished >= max_unfinished:
+                        raise QueueFullError(f"Job queue is full ({max_unfinished} jobs pending)")
+                self._db.execute(
+                    "INSERT INTO jobs (id, status, params, payload_path, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, json.dumps(params), str(payload_path) if payload_path else None, time.time()),
+                )
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def claim_next(self) -> Optional[dict]:
+        """Mark the oldest queued job as running and return it."""
+        while True:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    return None
+                # Conditional so that worker processes sharing the database never claim the same job
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, owner_pid = ? WHERE id = ? AND status = ?",
+                    (RUNNING, time.time(), os.getpid(), row["id"], QUEUED),
+                )
+                self._db.commit()
+            if cursor.rowcount:
+                return self._to_dict(row) | {"status": RUNNING, "owner_pid": os.getpid()}
+            # Another process claimed it first; try the next one (outside the lock, which is not reentrant)
+
+    def finish(self, job_id: str, result: Optional[dict] = None, error: Optional[str] = None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (
+                    FAILED if error is not None else SUCCEEDED,
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id,
+                ),
+            )
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def count_unfinished(self) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+
+    def purge_finished(self, max_age: float, max_count: int) -> int:
+        """
+        Delete finished jobs older than max_age seconds, and the oldest beyond the newest max_count.
+
+        A limit of 0 disables it.
+
+        Returns:
+            The number of jobs deleted
+        """
+        with self._lock:
+            deleted = 0
+            if max_age:
+                deleted += self._db.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                    (SUCCEEDED, FAILED, time.time() - max_age),
+                ).rowcount
+            if max_count:
+                deleted += self._db.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND id NOT IN ("
+                    " SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY finished_at DESC LIMIT ?)",
+                    (SUCCEEDED, FAILED, SUCCEEDED, FAILED, max_count),
+                ).rowcount
+            self._db.commit()
+            return deleted
+
+    def requeue_running(self) -> int:
+        """Return jobs interrupted by a shutdown to the queue."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner_pid = NULL WHERE status = ?", (QUEUED, RUNNING)
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+    def requeue_owned_by(self, pid: int) -> int:
+        """Return the running jobs of a process that died, e.g. a crashed worker, to the queue."""
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner_pid = NULL WHERE status = ? AND owner_pid = ?",
+                (QUEUED, RUNNING, pid),
+            )
+            self._db.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class JobQueue:
+    """
+    Bounded pool of asyncio workers draining a JobStore.
+
+    Args:
+        store: Persistent job records
+        payload_dir: Directory holding uploaded documents of pending jobs
+        handler: Coroutine processing one job (given its record) and returning its result
+        workers: Number of jobs processed concurrently
+        max_pending: Maximum number of queued plus running jobs
+        recover: Whether start() requeues jobs left running by a previous
+            process; off when several processes share the store
+        max_age: Seconds finished jobs are kept; 0 keeps them regardless of age
+        max_finished: Finished jobs kept, newest first; 0 keeps them all
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        payload_dir: Path,
+        handler: Callable[[dict], Awaitable[dict]],
+        workers: int = 2,
+        max_pending: int = 100,
+        recover: bool = True,
+        max_age: float = 86400.0,
+        max_finished: int = 10000,
+    ):
+        self.store = store
+        self.payload_dir = payload_dir
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.recover = recover
+        self.max_age = max_age
+        self.max_finished = max_finished
+        self._last_purge = 0.0
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    async def start(self):
+        """Recover interrupted jobs and start the workers."""
+        if self.running:
+            return
+        self.payload_dir.mkdir(parents=True, exist_ok=True)
+        if self.recover:
+            await asyncio.to_thread(self.store.requeue_running)
+        await self._purge()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, grace: float = 0.0):
+        """
+        Stop the workers.
+
+        Args:
+            grace: Seconds running jobs are given to finish; workers claim no
+                new jobs meanwhile. Jobs still running afterwards are cancelled
+                and requeued on the next start.
+        """
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._tasks and grace > 0:
+            await asyncio.wait(self._tasks, timeout=grace)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def submit(self, params: dict, payload: Optional[BinaryIO] = None) -> str:
+        """
+        Queue a job.
+
+        Args:
+            params: JSON-serializable job parameters
+            payload: Optional document stream saved alongside the job
+
+        Returns:
+            The new job ID
+
+        Raises:
+            QueueFullError: If max_pending jobs are already unfinished
+        """
+        if not self.running:
+            await self.start()
+        # Cheap early rejection before the payload is copied; the insert checks again atomically
+        if await asyncio.to_thread(self.store.count_unfinished) >= self.max_pending:
+            raise QueueFullError(f"Job queue is full ({self.max_pending} jobs pending)")
+        job_id = uuid.uuid4().hex
+        payload_path = None
+        if payload is not None:
+            payload_path = self.payload_dir / f"{job_id}.pdf"
+            await asyncio.to_thread(self._save_payload, payload, payload_path)
+        try:
+            await asyncio.to_thread(self.store.insert, job_id, params, payload_path, self.max_pending)
+        except BaseException:
+            if payload_path is not None:
+                payload_path.unlink(missing_ok=True)
+            raise
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Return a job record, or None if it does not exist."""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def _purge(self):
+        """Delete finished jobs past their retention."""
+        self._last_purge = time.monotonic()
+        await asyncio.to_thread(self.store.purge_finished, self.max_age, self.max_finished)
+
+    @staticmethod
+    def _save_payload(payload: BinaryIO, path: Path):
+        with open(path, "wb") as f:
+            shutil.copyfileobj(payload, f)
+
+    async def _worker(self):
+        while not self._stopping:
+            # Clear before claiming so a submission racing with an empty claim still wakes us
+            self._wakeup.clear()
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                await self._wakeup.wait()
+                continue
+            try:
+                result = await self.handler(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await asyncio.to_thread(self.store.finish, job["id"], None, str(e) or type(e).__name__)
+            else:
+                await asyncio.to_thread(self.store.finish, job["id"], result)
+            if job["payload_path"]:
+                Path(job["payload_path"]).unlink(missing_ok=True)
+            if time.monotonic() - self._last_purge >= PURGE_INTERVAL:
+                await self._purge()
@@ -0,0 +1,82 @@
+"""
+Deferred imports for heavy third-party SDKs.
+
+Importing ``google.generativeai`` (gRPC, protobuf, the Google API client) and
+``PyPDF2`` takes a large share of the application's import time. Modules
+reference them through a ``LazyModule`` so ``import src.main`` stays cheap,
+and the application lifespan loads them off the event loop while the server
+is already answering liveness probes.
+"""
+
+import importlib
+from types import ModuleType
+from typing import Any
+
+
+class LazyModule:
+    """
+    Proxy importing a module on first attribute access.
+
+    Attributes assigned on the proxy (as ``unittest.mock.patch`` does) are
+    kept on the proxy and shadow those of the real module.
+
+    Args:
+        name: Fully qualified module name
+    """
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self) -> ModuleType:
+        """Import the module now (a no-op once imported) and return it."""
+        if self._module is None:
+            self.__dict__["_module"] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+class LazyCallable:
+    """
+    Callable resolving ``module.attr`` on first call, e.g. a class from a lazy module.
+
+    Args:
+        module: Lazy module holding the callable
+        attr: Name of the callable in the module
+    """
+
+    def __init__(self, module: LazyModule, attr: str):
+        self._module = module
+        self._attr = attr
+
+    def __call__(self, *args, **kwargs):
+        return getattr(self._module, self._attr)(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<lazy {self._module._name}.{self._attr}>"
+
+
+_modules = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return the shared lazy proxy for a module."""
+    if name not in _modules:
+        _modules[name] = LazyModule(name)
+    return _modules[name]
+
+
+def preload(*names: str):
+    """Import every lazily referenced module (or only the named ones)."""
+    for name in names or list(_modules):
+        lazy_import(name).load()
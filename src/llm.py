@@ -0,0 +1,233 @@
+"""
+Shared Google Gemini client.
+
+The SDK is configured and the model constructed once per process instead of
+on every request, and all generation goes through the SDK's async API so
+the event loop is never blocked for an LLM round trip. A process-wide
+limiter caps concurrent calls and queues bursts to stay within provider
+rate limits. The SDK itself is imported lazily, on first use or when the
+application warms up.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from src.lazy import lazy_import
+
+genai = lazy_import("google.generativeai")
+
+
+class LLMBusyError(Exception):
+    """Raised when the LLM request queue is full or a queued call waited too long."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Semaphore with a bounded wait queue.
+
+    Args:
+        max_concurrent: Maximum number of calls in flight
+        max_queue: Maximum number of calls waiting for a slot
+        queue_timeout: Seconds a call may wait for a slot
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_queue: int = 64, queue_timeout: float = 30.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold one concurrency slot for the duration of the block.
+
+        Raises:
+            LLMBusyError: If the queue is full or no slot frees up in time
+        """
+        semaphore = self._get_semaphore()
+        if not semaphore.locked():
+            await semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise LLMBusyError("LLM request queue is full", retry_after=int(self.queue_timeout) or 1)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise LLMBusyError("Timed out waiting for an LLM slot", retry_after=int(self.queue_timeout) or 1)
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a new call would be rejected because the wait queue is full."""
+        return self.waiting >= self.max_queue
+
+    def stats(self) -> dict:
+        """Report limiter occupancy."""
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+
+class GeminiClient:
+    """
+    Process-wide Gemini model wrapper.
+
+    Args:
+        model_name: Gemini model to use
+        api_key: Google API key
+        limiter: Limiter shared by every call made through this client
+    """
+
+    def __init__(self, model_name: str, api_key: Optional[str], limiter: ConcurrencyLimiter):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.limiter = limiter
+        self._model = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def start(self):
+        """Configure the SDK and build the model."""
+        genai.configure(api_key=self.api_key)
+        self._model = genai.GenerativeModel(self.model_name)
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+
+    def reset(self):
+        """Drop the cached model so the next call rebuilds it."""
+        self._model = None
+        self._loop = None
+
+    @property
+    def model(self):
+        """
+        The shared GenerativeModel, built on first use.
+
+        The SDK's async transport is bound to the event loop that first used
+        it, so the model is rebuilt if it is used from a different loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self._model is None or self._loop is not loop:
+            self.start()
+        return self._model
+
+    async def generate(self, prompt: str, **kwargs):
+        """
+        Generate content for a prompt within the concurrency limit.
+
+        Args:
+            prompt: Prompt text
+            **kwargs: Extra arguments for generate_content_async
+
+        Returns:
+            The SDK response
+        """
+        async with self.limiter.slot():
+            response = await self.model.generate_content_async(prompt, **kwargs)
+        self._record_usage(response)
+        return response
+
+    async def generate_text(self, prompt: str) -> str:
+        """Generate content for a prompt and return the response text."""
+        response = await self.generate(prompt)
+        return response.text
+
+    async def count_tokens(self, text: str) -> int:
+        """
+        Count a text's tokens with the model's tokenizer.
+
+        Token counting is a cheap metadata call, so it does not take a
+        generation slot from the limiter.
+
+        Args:
+            text: Text to measure
+
+        Returns:
+            Number of input tokens the text takes
+        """
+        response = await self.model.count_tokens_async(text)
+        return response.total_tokens
+
+    async def stream_text(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream generated text for a prompt as it is produced.
+
+        The concurrency slot is held until the stream is exhausted or closed;
+        closing or cancelling the iterator abandons the upstream call.
+
+        Args:
+            prompt: Prompt text
+
+        Yields:
+            Text fragments in generation order
+        """
+        last = None
+        try:
+            async with self.limiter.slot():
+                response = await self.model.generate_content_async(prompt, stream=True)
+                async for chunk in response:
+                    last = chunk
+                    if chunk.text:
+                        yield chunk.text
+        finally:
+            # Each chunk carries the cumulative usage of the stream so far
+            if last is not None:
+                self._record_usage(last)
+
+    def _record_usage(self, response):
+        """Add a response's token usage to the running totals."""
+        self.calls += 1
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        completion_tokens = getattr(usage, "candidates_token_count", None)
+        if isinstance(prompt_tokens, int):
+            self.prompt_tokens += prompt_tokens
+        if isinstance(completion_tokens, int):
+            self.completion_tokens += completion_tokens
+
+    def stats(self) -> dict:
+        """Report call and token counters together with limiter occupancy."""
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            **self.limiter.stats(),
+        }
@@ -1,24 +1,259 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
-import requests
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import math
 import os
+import time
 from pathlib import Path
-import tempfile
-from typing import Optional
-from PyPDF2 import PdfReader
-import google.generativeai as genai
-from dotenv import load_dotenv
+from typing import List, Literal, Optional
 
-# Load environment variables
-load_dotenv()
+from pydantic import BaseModel
+
+from src.batch import run_batch
+from src.config import settings
+from src.download_index import DownloadIndex
+from src.downloader import NOT_MODIFIED, Downloader
+from src.extraction import ExtractionMode, ExtractionPool
+from src.health import SystemMetricsSampler, uptime, utc_timestamp
+from src.http_pool import HttpClientPool
+from src.ingest import MULTIPART_OVERHEAD_BYTES, UploadLimitMiddleware, ingest_path, ingest_upload
+from src.paths import resolve_stored_file
+from src.pdf_backends import BackendSelector, PdfBackendName
+from src.prompt import PromptBuilder, TokenCounter
+from src.storage import DownloadStorage, StorageFullError
+from src.rate_limit import EndpointLimit, MemoryBuckets, RateLimiter, RateLimitMiddleware, SQLiteBuckets, retry_after
+from src.jobs import JobQueue, JobStore, QueueFullError
+from src.lazy import preload
+from src.llm import ConcurrencyLimiter, GeminiClient, LLMBusyError
+from src.metrics import (
+    CONTENT_TYPE_LATEST,
+    DOWNLOADED_BYTES,
+    IN_PROGRESS,
+    UPLOADED_BYTES,
+    PrometheusMiddleware,
+    observe_stage,
+    register_stats,
+    render,
+    time_stage,
+)
+from src.summarizer import map_reduce_summarize
+from src.text_store import TextStore, parse_page_ranges
+from src.summary_cache import SummaryCache
+
+SummaryStrategy = Literal["single", "map_reduce"]
+
+SUMMARY_PROMPT = "Please provide a comprehensive summary of the following text:\n\n"
+
+http_pool = HttpClientPool(
+    limit=settings.http_pool_limit,
+    limit_per_host=settings.http_pool_limit_per_host,
+    dns_cache_ttl=settings.http_dns_cache_ttl,
+    keepalive_timeout=settings.http_keepalive_timeout,
+    connect_timeout=settings.http_connect_timeout,
+    read_timeout=settings.http_read_timeout,
+    total_timeout=settings.download_timeout,
+)
+
+download_index = DownloadIndex(settings.download_index_db)
+
+download_storage = DownloadStorage(
+    settings.download_dir,
+    max_bytes=settings.download_max_bytes,
+    min_free_bytes=settings.download_min_free_bytes,
+    max_age=settings.download_max_age,
+    orphan_age=settings.download_orphan_age,
+    sweep_interval=settings.download_sweep_interval,
+    # The index records paths as the downloader built them, under DOWNLOAD_DIR
+    on_evict=lambda path: download_index.delete_path(settings.download_dir / path.name),
+)
+
+downloader = Downloader(
+    download_index,
+    chunk_size=settings.download_chunk_size,
+    segments=settings.download_segments,
+    segment_min_bytes=settings.download_segment_min_bytes,
+    retries=settings.download_retries,
+    storage=download_storage,
+)
+
+text_store = (
+    TextStore(settings.text_store_db, max_bytes=settings.text_store_max_bytes)
+    if settings.text_store_db is not None
+    else None
+)
+
+extraction_pool = ExtractionPool(
+    workers=settings.extract_workers,
+    min_pages=settings.extract_min_pages_for_pool,
+    timeout=settings.extract_timeout,
+    store=text_store,
+    backends=BackendSelector(settings.pdf_backend, settings.pdf_backend_fallback),
+)
+
+gemini_client = GeminiClient(
+    model_name=settings.gemini_model,
+    api_key=settings.gemini_api_key,
+    limiter=ConcurrencyLimiter(
+        max_concurrent=settings.gemini_max_concurrency,
+        max_queue=settings.gemini_max_queue,
+        queue_timeout=settings.gemini_queue_timeout,
+    ),
+)
+
+token_counter = TokenCounter(
+    count=gemini_client.count_tokens if settings.prompt_token_counter == "model" else None,
+    cache_size=settings.prompt_token_cache_size,
+)
+prompt_builder = PromptBuilder(token_counter, max_tokens=settings.summary_prompt_tokens)
+
+metrics_sampler = SystemMetricsSampler(interval=settings.health_sample_interval)
+
+summary_cache = SummaryCache(
+    max_entries=settings.summary_cache_size,
+    ttl=settings.summary_cache_ttl,
+    db_path=settings.summary_cache_db,
+    max_db_bytes=settings.summary_cache_max_bytes,
+)
+
+rate_limiter = RateLimiter(
+    SQLiteBuckets(settings.rate_limit_db) if settings.rate_limit_db is not None else MemoryBuckets(),
+    limits={
+        "summarize": EndpointLimit(
+            per_minute=settings.rate_limit_summarize_per_minute,
+            burst=settings.rate_limit_summarize_burst,
+            max_in_flight=settings.max_in_flight_summarize,
+            overloaded=lambda: gemini_client.limiter.saturated,
+        ),
+        "download": EndpointLimit(
+            per_minute=settings.rate_limit_download_per_minute,
+            burst=settings.rate_limit_download_burst,
+            max_in_flight=settings.max_in_flight_download,
+        ),
+    },
+    routes={
+        ("POST", "/summarize"): "summarize",
+        ("POST", "/summarize/stream"): "summarize",
+        ("POST", "/summarize/batch"): "summarize",
+        ("POST", "/jobs/summarize"): "summarize",
+        ("POST", "/download"): "download",
+        ("POST", "/download/batch"): "download",
+    },
+    client_id=settings.rate_limit_client_id,
+    api_keys=settings.rate_limit_api_keys,
+)
+
+register_stats(
+    "genai_http_pool",
+    http_pool.stats,
+    counters=(
+        "connections_created", "connections_reused", "connections_queued",
+        "dns_cache_hits", "dns_cache_misses", "requests", "pool_hits", "pool_misses",
+    ),
+)
+register_stats("genai_llm", gemini_client.stats, counters=("calls", "prompt_tokens", "completion_tokens", "rejected"))
+register_stats(
+    "genai_downloads",
+    downloader.stats,
+    counters=("transfers", "not_modified", "coalesced", "resumed", "segmented"),
+)
+register_stats(
+    "genai_download_storage",
+    download_storage.stats,
+    counters=("evictions", "evicted_bytes", "expired", "orphans_removed", "rejected", "sweeps"),
+)
+register_stats(
+    "genai_pdf_backends",
+    extraction_pool.backends.stats,
+    counters=tuple(
+        f"{name}_{counter}"
+        for name in extraction_pool.backends.available
+        for counter in ("documents", "pages", "seconds", "failures")
+    ),
+)
+register_stats("genai_summary_cache", summary_cache.stats, counters=("hits", "misses"))
+register_stats("genai_token_counter", token_counter.stats, counters=("hits", "misses", "model_calls"))
+register_stats(
+    "genai_rate_limit",
+    rate_limiter.stats,
+    counters=tuple(f"{group}_{name}" for group in rate_limiter.limits for name in ("allowed", "limited", "shed")),
+)
+if text_store is not None:
+    register_stats("genai_text_store", text_store.stats, counters=("page_hits", "page_misses", "evictions"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create shared clients at startup and release them at shutdown.
+    
+    The heavy SDKs are imported by a background warm-up task, so the server
+    answers /livez at once and reports ready on /readyz when warm-up is done.
+    Shutdown runs after the server has stopped accepting connections and
+    finished its in-flight requests; background downloads and running jobs
+    then get up to SHUTDOWN_GRACE_PERIOD seconds to complete.
+    """
+    await http_pool.start()
+    extraction_pool.start()
+    app.state.warm_up = asyncio.create_task(warm_up())
+    await job_queue.start()
+    metrics_sampler.start()
+    download_storage.start()
+    yield
+    await download_storage.stop()
+    await metrics_sampler.stop()
+    app.state.warm_up.cancel()
+    await asyncio.gather(
+        app.state.warm_up,
+        downloader.drain(settings.shutdown_grace_period),
+        job_queue.stop(grace=settings.shutdown_grace_period),
+        return_exceptions=True,
+    )
+    await http_pool.close()
+    extraction_pool.shutdown()
+    summary_cache.close()
+
+async def warm_up():
+    """
+    Import the heavy SDKs in a thread, then build the Gemini model on the event loop.
+    
+    With PDF_BENCHMARK_SAMPLE set, every installed PDF backend is then timed
+    on the sample so that "auto" starts with the fastest one.
+    """
+    with time_stage("startup", "warm_up"):
+        await asyncio.to_thread(preload)
+        await asyncio.to_thread(extraction_pool.backends.load)
+        gemini_client.start()
+    if settings.pdf_benchmark_sample is not None:
+        with time_stage("startup", "pdf_benchmark"):
+            sample = await asyncio.to_thread(settings.pdf_benchmark_sample.read_bytes)
+            await asyncio.to_thread(extraction_pool.backends.benchmark, sample)
+
+def warmed_up() -> bool:
+    """Whether the startup warm-up has completed successfully."""
+    task = getattr(app.state, "warm_up", None)
+    return task is not None and task.done() and not task.cancelled() and task.exception() is None
 
 app = FastAPI(
     title="GenAI Agent API",
     description="FastAPI application for file downloads and PDF summarization using Google Gemini AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+# Outside the rate limiter, so oversized uploads are refused without taking tokens
+upload_body_limit = settings.max_upload_bytes + MULTIPART_OVERHEAD_BYTES
+upload_limits = {
+    "/summarize": upload_body_limit,
+    "/summarize/stream": upload_body_limit,
+    "/jobs/summarize": upload_body_limit,
+    "/summarize/batch": upload_body_limit * settings.batch_max_items,
+}
+app.add_middleware(UploadLimitMiddleware, limits=upload_limits)
+# Added last so it is outermost and also counts rate-limited and shed requests
+app.add_middleware(PrometheusMiddleware)
 
-download_dir = Path("downloads")
+download_dir = settings.download_dir
 download_dir.mkdir(exist_ok=True)
 
 @app.get("/health")
@@ -26,71 +261,26 @@ async def health_check():
     """
     Health check endpoint to verify API status and dependencies.
     
+    System metrics come from the background sampler's latest snapshot, so
+    this endpoint does no blocking work.
+    
     Returns:
         Health status information including API status, dependencies, and system info
     """
-    import time
-    import sys
-    import psutil
-    from datetime import datetime
-    
-    def format_bytes(bytes_value):
-        """Convert bytes to human readable format"""
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if bytes_value < 1024.0:
-                return f"{bytes_value:.1f} {unit}"
-            bytes_value /= 1024.0
-        return f"{bytes_value:.1f} PB"
-    
-    def format_uptime(uptime_seconds):
-        """Convert uptime seconds to human readable format"""
-        days = int(uptime_seconds // 86400)
-        hours = int((uptime_seconds % 86400) // 3600)
-        minutes = int((uptime_seconds % 3600) // 60)
-        seconds = int(uptime_seconds % 60)
-        
-        if days > 0:
-            return f"{days}d {hours}h {minutes}m {seconds}s"
-        elif hours > 0:
-            return f"{hours}h {minutes}m {seconds}s"
-        elif minutes > 0:
-            return f"{minutes}m {seconds}s"
-        else:
-            return f"{seconds}s"
-    
     try:
         # Check if downloads directory is accessible
         downloads_accessible = download_dir.exists() and download_dir.is_dir()
         
         # Check Google Gemini API configuration
-        gemini_configured = bool(os.getenv("GOOGLE_API_KEY"))
-        
-        # Get system information
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        current_time = datetime.utcnow()
-        uptime_seconds = time.time()
+        gemini_configured = bool(gemini_client.api_key)
         
         health_data = {
             "status": "healthy",
-            "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S UTC"),
+            "timestamp": utc_timestamp(),
             "version": "1.0.0",
-            "uptime": format_uptime(uptime_seconds),
-            "system": {
-                "python_version": sys.version.split()[0],
-                "memory_usage": {
-                    "total": format_bytes(memory.total),
-                    "available": format_bytes(memory.available),
-                    "used": format_bytes(memory.used),
-                    "percent": f"{memory.percent:.1f}%"
-                },
-                "disk_usage": {
-                    "total": format_bytes(disk.total),
-                    "free": format_bytes(disk.free),
-                    "used": format_bytes(disk.used),
-                    "percent": f"{(disk.used / disk.total) * 100:.1f}%"
-                }
-            },
+            "uptime": uptime(),
+            "system": metrics_sampler.current(),
+            "system_sampled_at": metrics_sampler.sampled_at,
             "dependencies": {
                 "downloads_directory": downloads_accessible,
                 "google_gemini_api": gemini_configured
@@ -99,6 +289,9 @@ async def health_check():
                 "download": "/download",
                 "summarize": "/summarize",
                 "health": "/health",
+                "livez": "/livez",
+                "readyz": "/readyz",
+                "metrics": "/metrics",
                 "docs": "/docs"
             }
         }
@@ -108,10 +301,51 @@ async def health_check():
     except Exception as e:
         return {
             "status": "unhealthy",
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": utc_timestamp(),
             "error": str(e)
         }
 
+@app.get("/livez")
+async def liveness():
+    """
+    Liveness probe: answers as long as the event loop is serving requests.
+    
+    Returns:
+        Constant OK payload
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readiness(response: Response):
+    """
+    Readiness probe: checks the dependencies needed to serve traffic.
+    
+    Returns:
+        Per-dependency check results; status 503 if any check fails
+    """
+    checks = {
+        "downloads_directory": download_dir.is_dir() and os.access(download_dir, os.W_OK),
+        "google_gemini_api": bool(gemini_client.api_key),
+        "http_pool": http_pool.stats()["active"],
+        "job_workers": job_queue.running,
+        "warmed_up": warmed_up(),
+    }
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "not ready", "checks": checks}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics in the text exposition format.
+    
+    Returns:
+        Request counters and latency histograms per route, per-stage latency
+        histograms, in-progress gauges, byte counters and component counters
+    """
+    return Response(content=render(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/")
 async def root():
     """
@@ -126,86 +360,713 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health - Health check endpoint",
+            "livez": "/livez - Liveness probe",
+            "readyz": "/readyz - Readiness probe",
+            "metrics": "/metrics - Prometheus metrics",
             "download": "/download - Download files from URLs",
             "summarize": "/summarize - Summarize PDF documents",
+            "documents": "/documents/{sha256} - Extracted text of summarized documents",
             "docs": "/docs - API documentation"
         }
     }
 
+async def download_url(url: str) -> dict:
+    """
+    Download a URL into the downloads directory, recording metrics.
+    
+    Args:
+        url: URL of the file to download
+        
+    Returns:
+        Download payload as returned by /download
+    """
+    with IN_PROGRESS.labels("download").track_inprogress():
+        session = await http_pool.session()
+        result = await downloader.fetch(session, url, download_dir)
+    
+    if result.status == NOT_MODIFIED:
+        message = "File unchanged; served from the download index"
+    else:
+        message = "File downloaded successfully"
+    if not result.coalesced:
+        if result.status != NOT_MODIFIED:
+            DOWNLOADED_BYTES.inc(result.size)
+        for stage, seconds in result.timings.items():
+            observe_stage("download", stage, seconds)
+    
+    return {
+        "message": message,
+        "file_path": str(result.path),
+        "size": result.size,
+        "sha256": result.sha256,
+        "cached": result.status == NOT_MODIFIED,
+        "coalesced": result.coalesced,
+        "resumed_from": result.resumed_from,
+        "segments": result.segments,
+    }
+
 @app.post("/download")
 async def download_file(url: str):
     """
     Download a file from the internet and save it locally.
     
+    URLs downloaded before are revalidated with a conditional request and
+    kept as-is when the origin reports them unchanged; concurrent requests
+    for the same URL share one transfer.
+    
     Args:
         url: URL of the file to download
         
     Returns:
-        Path to the downloaded file
+        Path to the downloaded file, its size and SHA-256, and whether it was
+        served from the download index
     """
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        # Get filename from URL or Content-Disposition header
-        filename = url.split('/')[-1]
-        if 'content-disposition' in response.headers:
-            cd = response.headers['content-disposition']
-            filename = cd.split('filename=')[-1].strip('"')
+        return await download_url(url)
+    except StorageFullError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/download/pool")
+async def download_pool_stats():
+    """
+    Report connection pool usage for outbound downloads.
+    
+    Returns:
+        Pool hit/miss counters, DNS cache counters and configured limits
+    """
+    return http_pool.stats()
+
+@app.get("/download/storage")
+async def download_storage_stats():
+    """
+    Report usage of the downloads directory.
+    
+    Served from the storage manager's ledger; the directory is not scanned.
+    
+    Returns:
+        Bytes used by completed, partial and reserved downloads, the quota
+        and eviction and cleanup counters
+    """
+    return download_storage.stats()
+
+@app.get("/extraction/backends")
+async def pdf_backend_stats():
+    """
+    Report the PDF extraction backends.
+    
+    Returns:
+        The configured backend and fallbacks, the chain new documents are
+        read with, and per backend whether it is installed and its
+        documents, pages, time, failures and pages per second
+    """
+    return extraction_pool.backends.report()
+
+class DownloadBatchRequest(BaseModel):
+    """Body of /download/batch."""
+    
+    urls: List[str]
+
+def check_batch_size(count: int):
+    """Reject empty batches and batches above the configured maximum."""
+    if count == 0:
+        raise HTTPException(status_code=422, detail="Batch contains no items")
+    if count > settings.batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch of {count} items exceeds the maximum of {settings.batch_max_items}",
+        )
+
+async def charge_batch(request: Request, group: str, items: int):
+    """
+    Take rate-limit tokens for the items of a batch beyond the first.
+    
+    The rate-limit middleware already took one token for the request itself.
+    
+    Raises:
+        HTTPException: 429 with Retry-After if the client's budget is
+            exhausted, or without it if the batch costs more than the burst
+            size and must be split
+    """
+    wait = await rate_limiter.acquire(group, rate_limiter.client_key(request.scope), cost=items - 1, already_taken=1)
+    if wait == math.inf:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Batch of {items} {group} items exceeds the rate-limit burst of {rate_limiter.limits[group].burst}; split it",
+        )
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded for a batch of {items} {group} items",
+            headers={"Retry-After": retry_after(wait)},
+        )
+
+def batch_error(e: Exception) -> dict:
+    """Describe a failed batch item with the status code its single-item endpoint would return."""
+    if isinstance(e, HTTPException):
+        return {"status_code": e.status_code, "detail": e.detail}
+    if isinstance(e, LLMBusyError):
+        return {"status_code": 503, "detail": str(e), "retry_after": e.retry_after}
+    if isinstance(e, StorageFullError):
+        return {"status_code": 507, "detail": str(e)}
+    if isinstance(e, asyncio.TimeoutError):
+        return {"status_code": 504, "detail": "Timed out"}
+    return {"status_code": 400, "detail": str(e)}
+
+def ndjson_line(data: dict) -> str:
+    """Format one newline-delimited JSON record."""
+    return json.dumps(data) + "\n"
+
+@app.post("/download/batch")
+async def download_batch(batch: DownloadBatchRequest, request: Request):
+    """
+    Download many files in one request.
+    
+    URLs are downloaded concurrently (at most BATCH_CONCURRENCY at a time)
+    and one NDJSON line is streamed per URL as soon as it finishes. A failed
+    URL produces an error line without affecting the others.
+    
+    Args:
+        batch: URLs to download
+        request: Incoming request; each URL counts against the client's download rate limit
         
-        file_path = download_dir / filename
+    Returns:
+        application/x-ndjson stream of per-URL results, in completion order
+    """
+    check_batch_size(len(batch.urls))
+    await charge_batch(request, "download", len(batch.urls))
+    
+    async def results():
+        async for index, result, error in run_batch(batch.urls, download_url, settings.batch_concurrency):
+            line = {"index": index, "url": batch.urls[index], "ok": error is None}
+            line.update(result if error is None else batch_error(error))
+            yield ndjson_line(line)
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+def resolve_download_path(file_path: str) -> Path:
+    """Resolve a client-supplied path to a file inside the downloads directory (see resolve_stored_file)."""
+    path = resolve_stored_file(download_dir, file_path)
+    download_storage.touch(path)
+    return path
+
+def check_pdf_backend(name: Optional[str]):
+    """Reject a requested PDF backend that is not installed."""
+    if name is None:
+        return
+    try:
+        extraction_pool.backends.check(name)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def summary_cache_key(
+    content_hash: str, extraction: ExtractionMode, strategy: str, pdf_backend: Optional[str] = None
+) -> str:
+    """Build the summary cache key for a document and the parameters that shape its summary."""
+    return SummaryCache.make_key(
+        content_hash,
+        model=gemini_client.model_name,
+        prompt=SUMMARY_PROMPT,
+        max_tokens=prompt_builder.max_tokens,
+        token_counter=settings.prompt_token_counter,
+        extraction=extraction,
+        strategy=strategy,
+        chunk_tokens=settings.summary_chunk_tokens if strategy == "map_reduce" else None,
+        pdf_backend=pdf_backend or extraction_pool.backends.backend,
+    )
+
+async def run_summary(
+    stream,
+    content_hash: str,
+    extraction: ExtractionMode,
+    strategy: str,
+    path: Optional[Path] = None,
+    pdf_backend: Optional[str] = None,
+) -> dict:
+    """
+    Summarize a PDF stream, consulting and populating the summary cache.
+    
+    Args:
+        stream: Seekable binary stream of the PDF
+        content_hash: SHA-256 of the PDF bytes
+        extraction: Page extraction mode
+        strategy: "single" or "map_reduce"
+        path: File the stream maps, if it is a local file
+        pdf_backend: PDF backend to extract pages with; None uses PDF_BACKEND
         
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+    Returns:
+        Summary payload as returned by /summarize
+    """
+    cache_key = summary_cache_key(content_hash, extraction, strategy, pdf_backend)
+    with time_stage("summarize", "cache_lookup"):
+        cached = await summary_cache.get(cache_key)
+    if cached is not None:
+        return {"summary": cached, "cache": "hit", "pages_read": 0}
+    
+    # Extract PDF text off the event loop; map-reduce needs every page
+    extract_started = time.perf_counter()
+    try:
+        if strategy == "map_reduce":
+            extracted = await extraction_pool.extract_text(
+                stream, "full", path=path, content_hash=content_hash, backend=pdf_backend
+            )
+        else:
+            extracted = await extraction_pool.extract_text(
+                stream, extraction, prompt_builder.read_budget, path=path, content_hash=content_hash, backend=pdf_backend
+            )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="PDF text extraction timed out")
+    extract_seconds = time.perf_counter() - extract_started
+    observe_stage("summarize", "extract", extract_seconds)
+    
+    result = {
+        "cache": "miss",
+        "pages_read": extracted.pages_read,
+        "page_count": extracted.page_count,
+        "pages_from_store": extracted.pages_from_store,
+        "pdf_backend": extracted.backend,
+    }
+    if strategy == "map_reduce":
+        # Whole documents are cleaned off the event loop; chunks then bound each call
+        pages = await asyncio.to_thread(prompt_builder.clean, extracted.pages)
+        reduced = await map_reduce_summarize(
+            gemini_client,
+            "\n".join(pages),
+            chunk_tokens=settings.summary_chunk_tokens,
+            concurrency=settings.summary_map_concurrency,
+        )
+        summary = reduced.summary
+        for stage, seconds in reduced.timings.items():
+            observe_stage("summarize", stage, seconds)
+        result.update({
+            "chunks": reduced.chunks,
+            "reduce_rounds": reduced.reduce_rounds,
+            "timings": {"extract": extract_seconds, **reduced.timings},
+        })
+    else:
+        # Fill the prompt's token budget with cleaned pages
+        with time_stage("summarize", "prompt"):
+            prompt = await prompt_builder.build(SUMMARY_PROMPT, extracted.pages)
+        result["prompt_tokens"] = prompt.tokens
         
-        return {"message": f"File downloaded successfully", "file_path": str(file_path)}
+        # Generate summary using Gemini
+        with time_stage("summarize", "llm"):
+            summary = await gemini_client.generate_text(prompt.text)
+    
+    with time_stage("summarize", "cache_store"):
+        await summary_cache.set(cache_key, summary)
+    return {"summary": summary, **result}
+
+async def open_local_pdf(path: Path):
+    """Memory-map a PDF inside the downloads directory for summarization."""
+    with time_stage("summarize", "ingest"):
+        return await asyncio.to_thread(ingest_path, path, settings.max_upload_bytes)
+
+@app.post("/summarize")
+async def summarize_pdf(
+    response: Response,
+    file: Optional[UploadFile] = File(None),
+    file_path: Optional[str] = Query(None, description="PDF inside the downloads directory, e.g. as returned by /download"),
+    url: Optional[str] = Query(None, description="URL of a PDF to download and summarize server-side"),
+    extraction: ExtractionMode = Query("budget", description="full, budget or sampled page extraction"),
+    strategy: SummaryStrategy = Query("single", description="single prompt or map-reduce over the whole document"),
+    pdf_backend: Optional[PdfBackendName] = Query(None, description="PDF backend to extract text with; defaults to PDF_BACKEND"),
+):
+    """
+    Summarize a PDF document.
+    
+    The PDF is uploaded, named by its path inside the downloads directory, or
+    given as a URL that is downloaded (through the download index) first, so
+    files already on the server are never transferred twice. Local files are
+    memory-mapped rather than copied. Identical documents summarized with the
+    same parameters are served from the summary cache without parsing the PDF
+    or calling Gemini.
+    
+    Args:
+        file: PDF file to summarize
+        file_path: Path of a previously downloaded PDF
+        url: URL of a PDF to download and summarize
+        extraction: "full" extracts every page; "budget" reads pages from the
+            start and "sampled" from the start, middle and end until the
+            prompt's token budget is filled
+        strategy: "single" summarizes the budgeted text in one call;
+            "map_reduce" summarizes every page in token-bounded chunks
+            concurrently and merges the partial summaries
+        pdf_backend: PDF backend tried first ("auto" for the fastest); pages
+            already in the text store are not extracted again
         
+    Returns:
+        Summary of the PDF content, whether it came from the cache and how
+        many pages were read; map-reduce responses add chunk counts and
+        per-stage timings
+    """
+    if sum(source is not None for source in (file, file_path, url)) != 1:
+        if file is not None:
+            await file.close()
+        raise HTTPException(status_code=422, detail="Provide exactly one of file, file_path or url")
+    
+    upload = None
+    try:
+        check_pdf_backend(pdf_backend)
+        with IN_PROGRESS.labels("summarize").track_inprogress():
+            if file is not None:
+                with time_stage("summarize", "ingest"):
+                    upload = await ingest_upload(file, settings.max_upload_bytes, settings.upload_chunk_size)
+                UPLOADED_BYTES.inc(upload.size)
+            else:
+                if url is not None:
+                    file_path = (await download_url(url))["file_path"]
+                upload = await open_local_pdf(resolve_download_path(file_path))
+            result = await run_summary(
+                upload.stream, upload.sha256, extraction, strategy, path=upload.path, pdf_backend=pdf_backend
+            )
+        result["sha256"] = upload.sha256
+        if upload.path is not None:
+            result["file_path"] = str(upload.path)
+        response.headers["X-Cache"] = result["cache"].upper()
+        return result
+    except HTTPException:
+        raise
+    except LLMBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        with time_stage("summarize", "cleanup"):
+            if file is not None:
+                await file.close()
+            if upload is not None and upload.path is not None:
+                upload.stream.close()
 
-@app.post("/summarize")
-async def summarize_pdf(file: UploadFile = File(...)):
+async def summarize_batch_item(
+    item: tuple,
+    extraction: ExtractionMode,
+    strategy: SummaryStrategy,
+    pdf_backend: Optional[str] = None,
+) -> dict:
     """
-    Summarize a PDF document.
+    Summarize one batch item: an uploaded file or a path inside the downloads directory.
+    
+    Args:
+        item: ("upload", UploadFile) or ("path", file_path)
+        extraction: Page extraction mode
+        strategy: "single" or "map_reduce"
+        pdf_backend: PDF backend to extract pages with
+        
+    Returns:
+        Summary payload as returned by /summarize
+    """
+    kind, source = item
+    if kind == "upload":
+        try:
+            upload = await ingest_upload(source, settings.max_upload_bytes, settings.upload_chunk_size)
+            UPLOADED_BYTES.inc(upload.size)
+            return await run_summary(upload.stream, upload.sha256, extraction, strategy, pdf_backend=pdf_backend)
+        finally:
+            await source.close()
+    
+    upload = await open_local_pdf(resolve_download_path(source))
+    try:
+        return await run_summary(
+            upload.stream, upload.sha256, extraction, strategy, path=upload.path, pdf_backend=pdf_backend
+        )
+    finally:
+        upload.stream.close()
+
+@app.post("/summarize/batch")
+async def summarize_batch(
+    request: Request,
+    files: List[UploadFile] = File(default=[]),
+    file_paths: List[str] = Form(default=[]),
+    extraction: ExtractionMode = Query("budget", description="full, budget or sampled page extraction"),
+    strategy: SummaryStrategy = Query("single", description="single prompt or map-reduce over the whole document"),
+    pdf_backend: Optional[PdfBackendName] = Query(None, description="PDF backend to extract text with; defaults to PDF_BACKEND"),
+):
+    """
+    Summarize many PDFs in one request.
+    
+    Items are uploaded files and/or paths of previously downloaded files.
+    They are summarized concurrently (at most BATCH_CONCURRENCY at a time)
+    and one NDJSON line is streamed per item as soon as it finishes. A failed
+    item produces an error line without affecting the others.
+    
+    Args:
+        request: Incoming request; each item counts against the client's summarize rate limit
+        files: PDF files to summarize
+        file_paths: Paths inside the downloads directory, e.g. as returned by /download
+        extraction: Page extraction mode, as for /summarize
+        strategy: Summarization strategy, as for /summarize
+        pdf_backend: PDF backend, as for /summarize
+        
+    Returns:
+        application/x-ndjson stream of per-item results, in completion order
+    """
+    items = [("upload", file) for file in files] + [("path", path) for path in file_paths]
+    try:
+        check_pdf_backend(pdf_backend)
+        check_batch_size(len(items))
+        await charge_batch(request, "summarize", len(items))
+    except HTTPException:
+        for file in files:
+            await file.close()
+        raise
+    
+    async def summarize(item: tuple) -> dict:
+        return await summarize_batch_item(item, extraction, strategy, pdf_backend)
+    
+    async def results():
+        async for index, result, error in run_batch(items, summarize, settings.batch_concurrency):
+            kind, source = items[index]
+            line = {"index": index, "source": source.filename if kind == "upload" else source, "ok": error is None}
+            line.update(result if error is None else batch_error(error))
+            yield ndjson_line(line)
+    
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+async def process_summary_job(job: dict) -> dict:
+    """Job queue handler running a queued summarization."""
+    params = job["params"]
+    path = Path(job["payload_path"])
+    # Pool workers read the payload from its path; the stream only serves in-process parsing
+    stream = await asyncio.to_thread(open, path, "rb")
+    try:
+        return await run_summary(
+            stream,
+            params["sha256"],
+            params["extraction"],
+            params["strategy"],
+            path=path,
+            pdf_backend=params.get("pdf_backend"),
+        )
+    except HTTPException as e:
+        raise RuntimeError(e.detail)
+    finally:
+        await asyncio.to_thread(stream.close)
+
+job_queue = JobQueue(
+    store=JobStore(settings.jobs_db),
+    payload_dir=settings.jobs_dir,
+    handler=process_summary_job,
+    workers=settings.job_workers,
+    max_pending=settings.job_queue_max,
+    recover=settings.job_recover_on_start,
+    max_age=settings.job_max_age,
+    max_finished=settings.job_max_finished,
+)
+
+@app.post("/jobs/summarize", status_code=202)
+async def submit_summary_job(
+    file: UploadFile = File(...),
+    extraction: ExtractionMode = Query("budget", description="full, budget or sampled page extraction"),
+    strategy: SummaryStrategy = Query("single", description="single prompt or map-reduce over the whole document"),
+    pdf_backend: Optional[PdfBackendName] = Query(None, description="PDF backend to extract text with; defaults to PDF_BACKEND"),
+):
+    """
+    Queue a PDF for summarization and return immediately.
     
     Args:
         file: PDF file to summarize
+        extraction: Page extraction mode, as for /summarize
+        strategy: Summarization strategy, as for /summarize
+        pdf_backend: PDF backend, as for /summarize
         
     Returns:
-        Summary of the PDF content
+        The job ID and the URL to poll for its status
     """
     try:
-        # Save the uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file.flush()
-            
-            # Read PDF content
-            pdf_reader = PdfReader(temp_file.name)
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-            
-            # Configure Google Gemini
-            genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-            model = genai.GenerativeModel('gemini-pro')
-            
-            # Create summarization prompt
-            prompt = f"Please provide a comprehensive summary of the following text:\n\n{text[:8000]}"  # Limit text length for API
-            
-            # Generate summary using Gemini
-            response = model.generate_content(prompt)
-            summary = response.text
-            
-            # Clean up temporary file
-            os.unlink(temp_file.name)
-            
-            return {"summary": summary}
+        check_pdf_backend(pdf_backend)
+        upload = await ingest_upload(file, settings.max_upload_bytes, settings.upload_chunk_size)
+        UPLOADED_BYTES.inc(upload.size)
+        job_id = await job_queue.submit(
+            {
+                "filename": file.filename,
+                "sha256": upload.sha256,
+                "extraction": extraction,
+                "strategy": strategy,
+                "pdf_backend": pdf_backend,
+            },
+            payload=upload.stream,
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    finally:
+        await file.close()
+    return {"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Report the status of a queued summarization.
+    
+    Args:
+        job_id: ID returned by /jobs/summarize
+        
+    Returns:
+        Job status (queued, running, succeeded or failed) with its result or error
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "filename": job["params"].get("filename"),
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": job["result"],
+        "error": job["error"],
+    }
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/summarize/stream")
+async def summarize_pdf_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    extraction: ExtractionMode = Query("budget", description="full, budget or sampled page extraction"),
+    pdf_backend: Optional[PdfBackendName] = Query(None, description="PDF backend to extract text with; defaults to PDF_BACKEND"),
+):
+    """
+    Summarize a PDF document, streaming the summary as Server-Sent Events.
+    
+    Each generated fragment is sent as a `data: {"text": ...}` message as soon
+    as Gemini produces it, followed by a final `done` event carrying the
+    cache status and page counts. If the client disconnects, the upstream
+    Gemini call is cancelled.
+    
+    Args:
+        file: PDF file to summarize
+        extraction: "full", "budget" or "sampled" page extraction
+        pdf_backend: PDF backend, as for /summarize
+        
+    Returns:
+        text/event-stream response
+    """
+    try:
+        check_pdf_backend(pdf_backend)
+        with time_stage("summarize_stream", "ingest"):
+            upload = await ingest_upload(file, settings.max_upload_bytes, settings.upload_chunk_size)
+        UPLOADED_BYTES.inc(upload.size)
+        cache_key = summary_cache_key(upload.sha256, extraction, "single", pdf_backend)
+        cached = await summary_cache.get(cache_key)
+        if cached is not None:
+            async def replay():
+                yield sse_event({"text": cached})
+                yield sse_event({"cache": "hit", "pages_read": 0}, event="done")
+            return StreamingResponse(replay(), media_type="text/event-stream", headers={"X-Cache": "HIT"})
+        
+        try:
+            with time_stage("summarize_stream", "extract"):
+                extracted = await extraction_pool.extract_text(
+                    upload.stream, extraction, prompt_builder.read_budget, content_hash=upload.sha256, backend=pdf_backend
+                )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="PDF text extraction timed out")
+        
+        prompt = await prompt_builder.build(SUMMARY_PROMPT, extracted.pages)
+        upstream = gemini_client.stream_text(prompt.text)
+        # Wait for the first token here so queueing and upstream errors map to status codes
+        try:
+            with time_stage("summarize_stream", "first_token"):
+                first = await upstream.__anext__()
+        except StopAsyncIteration:
+            first = ""
+    except HTTPException:
+        raise
+    except LLMBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+    
+    async def relay():
+        parts = [first]
+        completed = False
+        try:
+            if first:
+                yield sse_event({"text": first})
+            async for fragment in upstream:
+                if await request.is_disconnected():
+                    break
+                parts.append(fragment)
+                yield sse_event({"text": fragment})
+            else:
+                completed = True
+        except Exception as e:
+            yield sse_event({"detail": str(e)}, event="error")
+            return
+        finally:
+            # Closing the generator cancels the upstream call and frees the LLM slot
+            await upstream.aclose()
+        if completed:
+            await summary_cache.set(cache_key, "".join(parts))
+            yield sse_event(
+                {"cache": "miss", "pages_read": extracted.pages_read, "page_count": extracted.page_count},
+                event="done",
+            )
+    
+    return StreamingResponse(relay(), media_type="text/event-stream", headers={"X-Cache": "MISS"})
+
+def stored_document(sha256: str) -> dict:
+    """Look up a document in the text store, raising 404 if it is unknown or the store is disabled."""
+    document = text_store.document(sha256.lower()) if text_store is not None else None
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document
+
+@app.get("/documents/{sha256}")
+async def get_document(sha256: str):
+    """
+    Describe a document whose text has been extracted.
+    
+    Args:
+        sha256: SHA-256 of the PDF, as returned by /summarize
+        
+    Returns:
+        Page count, number of pages stored and the stored (compressed) size
+    """
+    return await asyncio.to_thread(stored_document, sha256)
+
+@app.get("/documents/{sha256}/text")
+async def get_document_text(
+    sha256: str,
+    pages: Optional[str] = Query(None, description="1-based pages and ranges, e.g. 1-3,7; all pages when omitted"),
+):
+    """
+    Fetch the stored text of a document, page by page.
+    
+    Only the requested pages are read from the store. Pages of the selection
+    that have not been extracted yet (e.g. because earlier summaries only
+    needed part of the document) are listed as missing.
+    
+    Args:
+        sha256: SHA-256 of the PDF, as returned by /summarize
+        pages: Page selection; every page when omitted
+        
+    Returns:
+        The text of each stored page in the selection and the missing page numbers
+    """
+    document = await asyncio.to_thread(stored_document, sha256)
+    try:
+        selected = parse_page_ranges(pages, document["page_count"]) if pages else list(range(document["page_count"]))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    found = await asyncio.to_thread(text_store.get_pages, document["sha256"], selected)
+    await asyncio.to_thread(text_store.touch, document["sha256"])
+    return {
+        "sha256": document["sha256"],
+        "page_count": document["page_count"],
+        "pages": [{"page": index + 1, "text": found[index]} for index in selected if index in found],
+        "missing": [index + 1 for index in selected if index not in found],
+    }
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from src.server import main
+    main()
@@ -0,0 +1,201 @@
+"""
+Prometheus instrumentation.
+
+Request counters and latency histograms are recorded by a small ASGI
+middleware; handlers add per-stage latency histograms, in-progress gauges
+and byte counters. Component counters that already exist (connection pool,
+LLM limiter and token usage, summary cache) are not duplicated on the hot
+path: they are read from each component's stats() only when /metrics is
+scraped.
+
+Under the prefork server every worker records into its own process, so the
+master points prometheus_client at a directory shared by the workers
+(``PROMETHEUS_MULTIPROC_DIR``) before importing it. /metrics then merges
+the request metrics of every worker, live and dead, while the component
+counters, which only the answering worker can read, are labelled with its
+pid.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+REQUESTS = Counter(
+    "genai_http_requests_total",
+    "HTTP requests handled",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "genai_http_request_duration_seconds",
+    "HTTP request latency, until the response body is fully sent",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "genai_http_requests_in_flight",
+    "HTTP requests currently being handled",
+    multiprocess_mode="livesum",
+)
+STAGE_LATENCY = Histogram(
+    "genai_stage_duration_seconds",
+    "Latency of the stages of an operation",
+    ["operation", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+IN_PROGRESS = Gauge(
+    "genai_operations_in_progress",
+    "Downloads and summarizations currently running",
+    ["operation"],
+    multiprocess_mode="livesum",
+)
+DOWNLOADED_BYTES = Counter(
+    "genai_downloaded_bytes_total",
+    "Bytes written to disk by /download",
+)
+UPLOADED_BYTES = Counter(
+    "genai_uploaded_bytes_total",
+    "Bytes of documents received by the summarization endpoints",
+)
+
+
+def multiprocess_dir():
+    """Directory the workers of the prefork server share their metrics through, or None."""
+    return os.environ.get(MULTIPROCESS_DIR_ENV) or None
+
+
+def observe_stage(operation: str, stage: str, seconds: float):
+    """Record the duration of one stage of an operation."""
+    STAGE_LATENCY.labels(operation, stage).observe(seconds)
+
+
+@contextmanager
+def time_stage(operation: str, stage: str):
+    """Time the enclosed block as one stage of an operation, including on error."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(operation, stage).observe(time.perf_counter() - started)
+
+
+class StatsCollector:
+    """
+    Expose a component's stats() dictionary as Prometheus metrics at scrape time.
+
+    Numeric values become gauges, or counters for the keys listed in
+    ``counters``; other values are skipped.
+
+    Args:
+        namespace: Metric name prefix, e.g. "genai_llm"
+        stats: Callable returning the component's stats dictionary
+        counters: Keys holding monotonically increasing values
+    """
+
+    def __init__(self, namespace: str, stats: Callable[[], dict], counters: Iterable[str] = ()):
+        self.namespace = namespace
+        self.stats = stats
+        self.counters = set(counters)
+
+    def collect(self):
+        # Other workers' components cannot be read, so each worker's series are told apart by pid
+        pid = [str(os.getpid())] if multiprocess_dir() else None
+        for key, value in self.stats().items():
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"{self.namespace}_{key}"
+            family = CounterMetricFamily if key in self.counters else GaugeMetricFamily
+            if pid is None:
+                yield family(name, f"{self.namespace} {key}", value=value if key in self.counters else float(value))
+            else:
+                metric = family(name, f"{self.namespace} {key}", labels=["pid"])
+                metric.add_metric(pid, value)
+                yield metric
+
+
+_stats_collectors = {}
+
+
+def register_stats(namespace: str, stats: Callable[[], dict], counters: Iterable[str] = ()):
+    """
+    Register a StatsCollector, replacing any earlier one with the same namespace.
+
+    Args:
+        namespace: Metric name prefix
+        stats: Callable returning the component's stats dictionary
+        counters: Keys holding monotonically increasing values
+    """
+    previous = _stats_collectors.pop(namespace, None)
+    if previous is not None:
+        REGISTRY.unregister(previous)
+    collector = StatsCollector(namespace, stats, counters)
+    REGISTRY.register(collector)
+    _stats_collectors[namespace] = collector
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware counting requests and timing them per route.
+
+    Routes are labelled with their path template (e.g. ``/jobs/{job_id}``)
+    so label cardinality stays bounded; unmatched paths share one label.
+
+    Args:
+        app: Wrapped ASGI application
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            REQUESTS.labels(method, route, str(status)).inc()
+
+
+def render(registry: Optional[CollectorRegistry] = None) -> bytes:
+    """Render every registered metric in the Prometheus text format, merged across workers in multiprocess mode."""
+    if registry is None and multiprocess_dir():
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _stats_collectors.values():
+            registry.register(collector)
+    return generate_latest(registry or REGISTRY)
+
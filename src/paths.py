@@ -0,0 +1,54 @@
+"""
+Validation of client-supplied file paths.
+
+Endpoints that accept a path to a previously downloaded file must never read
+outside the downloads directory, whether through ``..`` components, absolute
+paths or symlinks, and must not expose the service's own bookkeeping files
+(the download index and in-progress ``.part`` files, which are hidden).
+"""
+
+from pathlib import Path
+
+from fastapi import HTTPException
+
+MAX_PATH_LENGTH = 4096
+
+
+def resolve_stored_file(root: Path, file_path: str) -> Path:
+    """
+    Resolve a client-supplied path to a regular file inside a directory.
+
+    Args:
+        root: Directory the file must live in
+        file_path: Path relative to root, or the path returned by /download
+            (relative to the working directory or absolute)
+
+    Returns:
+        Fully resolved path of an existing regular file inside root
+
+    Raises:
+        HTTPException: 400 if the path is malformed, escapes root or names a
+            hidden file; 404 if no such file exists
+    """
+    if not file_path or len(file_path) > MAX_PATH_LENGTH or "\0" in file_path:
+        raise HTTPException(status_code=400, detail="Invalid file_path")
+
+    root = root.resolve()
+    requested = Path(file_path)
+    # Accept both "report.pdf" and "downloads/report.pdf" as returned by /download
+    candidates = [requested] if requested.is_absolute() else [root / requested, Path.cwd() / requested]
+    for candidate in candidates:
+        # resolve() follows symlinks, so a link pointing outside root is rejected too
+        resolved = candidate.resolve()
+        if not resolved.is_relative_to(root) or resolved == root:
+            continue
+        if any(part.startswith(".") for part in resolved.relative_to(root).parts):
+            raise HTTPException(status_code=400, detail="file_path must not name a hidden file")
+        if resolved.is_file():
+            return resolved
+        if resolved.exists():
+            raise HTTPException(status_code=400, detail="file_path is not a regular file")
+
+    if not any(candidate.resolve().is_relative_to(root) for candidate in candidates):
+        raise HTTPException(status_code=400, detail="file_path must be inside the downloads directory")
+    raise HTTPException(status_code=404, detail="File not found")
@@ -0,0 +1,382 @@
+"""
+Pluggable PDF text extraction backends.
+
+PyPDF2 is always installed. pypdf, pdfminer.six and pypdfium2 are used when
+they are installed as well; each is imported on first use. A document is
+read through a chain of backends: the primary one parses it, and if it
+fails on a malformed file (when opening it or on a single page) the next
+installed backend takes over.
+
+Every backend's throughput (pages per second, including the time spent
+parsing the document) is measured, both on live documents and on a sample
+document benchmarked at startup. In "auto" mode the fastest measured
+backend is used first; backends not measured yet are ranked after measured
+ones, in the static preference order of BACKENDS.
+"""
+
+import importlib.util
+import io
+import mmap
+import threading
+import time
+from dataclasses import dataclass, fields
+from typing import TYPE_CHECKING, Any, Dict, List, Literal, Optional, Sequence
+
+from src.lazy import LazyCallable, lazy_import
+
+if TYPE_CHECKING:
+    from PyPDF2 import PdfReader
+else:
+    # Imported on first use so that importing the application stays fast
+    PdfReader = LazyCallable(lazy_import("PyPDF2"), "PdfReader")
+
+PdfBackendName = Literal["auto", "pypdf2", "pypdf", "pdfminer", "pdfium"]
+
+AUTO = "auto"
+
+
+class PdfBackend:
+    """
+    One PDF library.
+
+    Subclasses implement open(), page_count() and page_text(). Documents are
+    given as a seekable binary stream (file, BytesIO or mmap) positioned at
+    the start.
+    """
+
+    name: str
+    module: str
+
+    def available(self) -> bool:
+        """Whether the library is installed; checked without importing it."""
+        return importlib.util.find_spec(self.module) is not None
+
+    def load(self):
+        """Import the library now."""
+        lazy_import(self.module).load()
+
+    def open(self, source) -> Any:
+        raise NotImplementedError
+
+    def page_count(self, document) -> int:
+        raise NotImplementedError
+
+    def page_text(self, document, index: int) -> str:
+        raise NotImplementedError
+
+
+class PyPDF2Backend(PdfBackend):
+    """PyPDF2, the original pure-Python extractor and the one always installed."""
+
+    name = "pypdf2"
+    module = "PyPDF2"
+
+    def open(self, source):
+        return PdfReader(source)
+
+    def page_count(self, document) -> int:
+        return len(document.pages)
+
+    def page_text(self, document, index: int) -> str:
+        return document.pages[index].extract_text() or ""
+
+
+class PypdfBackend(PyPDF2Backend):
+    """pypdf, the maintained successor of PyPDF2, with a much faster text extractor."""
+
+    name = "pypdf"
+    module = "pypdf"
+
+    def open(self, source):
+        return lazy_import(self.module).PdfReader(source)
+
+
+class PdfminerBackend(PdfBackend):
+    """pdfminer.six: slower, but tolerant of damaged files and good at reading order."""
+
+    name = "pdfminer"
+    module = "pdfminer"
+    submodules = ("pdfminer.pdfpage", "pdfminer.converter", "pdfminer.layout", "pdfminer.pdfinterp")
+
+    def load(self):
+        for name in self.submodules:
+            lazy_import(name).load()
+
+    def open(self, source):
+        pdfpage = lazy_import("pdfminer.pdfpage")
+        converter = lazy_import("pdfminer.converter")
+        layout = lazy_import("pdfminer.layout")
+        interpreter = lazy_import("pdfminer.pdfinterp")
+        resources = interpreter.PDFResourceManager(caching=True)
+        device = converter.PDFPageAggregator(resources, laparams=layout.LAParams())
+        return {
+            "pages": list(pdfpage.PDFPage.get_pages(source)),
+            "device": device,
+            "interpreter": interpreter.PDFPageInterpreter(resources, device),
+        }
+
+    def page_count(self, document) -> int:
+        return len(document["pages"])
+
+    def page_text(self, document, index: int) -> str:
+        text_container = lazy_import("pdfminer.layout").LTTextContainer
+        document["interpreter"].process_page(document["pages"][index])
+        return "".join(item.get_text() for item in document["device"].get_result() if isinstance(item, text_container))
+
+
+class PdfiumBackend(PdfBackend):
+    """pypdfium2, bindings to the C++ PDFium library: the fastest by far."""
+
+    name = "pdfium"
+    module = "pypdfium2"
+
+    # PDFium is not thread-safe; extraction threads take turns
+    lock = threading.Lock()
+
+    def open(self, source):
+        if isinstance(source, mmap.mmap):
+            # PDFium cannot read from a memory map; it gets a copy of the document
+            source = source[:]
+        with self.lock:
+            return lazy_import(self.module).PdfDocument(source)
+
+    def page_count(self, document) -> int:
+        with self.lock:
+            return len(document)
+
+    def page_text(self, document, index: int) -> str:
+        with self.lock:
+            page = document[index]
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+
+
+# In static preference order, used until throughput has been measured
+BACKENDS: Dict[str, PdfBackend] = {
+    backend.name: backend
+    for backend in (PdfiumBackend(), PypdfBackend(), PyPDF2Backend(), PdfminerBackend())
+}
+
+
+def available_backends() -> List[str]:
+    """Names of the installed backends, in static preference order."""
+    return [name for name, backend in BACKENDS.items() if backend.available()]
+
+
+@dataclass
+class BackendUsage:
+    """Work done by one backend: documents opened, pages extracted, time spent and failures."""
+
+    documents: int = 0
+    pages: int = 0
+    seconds: float = 0.0
+    failures: int = 0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds > 0 else 0.0
+
+    def add(self, other: "BackendUsage"):
+        for f in fields(self):
+            setattr(self, f.name, getattr(self, f.name) + getattr(other, f.name))
+
+
+class PdfDocument:
+    """
+    A PDF read through a chain of backends.
+
+    The first backend that can open the document is used; when it fails on
+    a page, the next one opens the document and extracts that page and the
+    following ones. If every backend fails, the first backend's error is
+    raised.
+
+    Args:
+        source: PDF bytes or seekable binary stream
+        chain: Backend names, in the order they are tried
+    """
+
+    def __init__(self, source, chain: Sequence[str]):
+        self.source = io.BytesIO(source) if isinstance(source, bytes) else source
+        self.chain = list(chain)
+        self.usage: Dict[str, BackendUsage] = {}
+        self.page_count = 0
+        self._position = -1
+        self._document = None
+        self._error: Optional[Exception] = None
+        self._advance()
+
+    @property
+    def backend(self) -> str:
+        """Name of the backend currently reading the document."""
+        return self.chain[self._position]
+
+    def _usage(self, name: str) -> BackendUsage:
+        return self.usage.setdefault(name, BackendUsage())
+
+    def _fail(self, error: Exception):
+        self._usage(self.backend).failures += 1
+        if self._error is None:
+            self._error = error
+
+    def _advance(self):
+        """Open the document with the next backend of the chain that can parse it."""
+        first = self._position < 0
+        while self._position + 1 < len(self.chain):
+            self._position += 1
+            backend = BACKENDS[self.backend]
+            self.source.seek(0)
+            started = time.perf_counter()
+            try:
+                document = backend.open(self.source)
+                page_count = backend.page_count(document)
+            except Exception as e:
+                self._fail(e)
+                continue
+            usage = self._usage(self.backend)
+            usage.documents += 1
+            usage.seconds += time.perf_counter() - started
+            self._document = document
+            if first:
+                self.page_count = page_count
+            return
+        raise self._error
+
+    def page_text(self, index: int) -> str:
+        """Text of one page (zero-based)."""
+        while True:
+            started = time.perf_counter()
+            try:
+                text = BACKENDS[self.backend].page_text(self._document, index)
+            except Exception as e:
+                self._fail(e)
+                self._advance()
+                continue
+            usage = self._usage(self.backend)
+            usage.pages += 1
+            usage.seconds += time.perf_counter() - started
+            return text
+
+
+class BackendSelector:
+    """
+    Chooses the backend chain for each document and keeps throughput per backend.
+
+    Args:
+        backend: Backend used first, or "auto" for the fastest measured one
+        fallback: Backends tried, in order, when the first one fails;
+            "auto" tries every other installed backend, fastest first
+    """
+
+    def __init__(self, backend: str = AUTO, fallback: Sequence[str] = (AUTO,)):
+        self.available = available_backends()
+        self.backend = self.check(backend)
+        self.fallback = [self.check(name) for name in fallback]
+        self.usage = {name: BackendUsage() for name in self.available}
+        self._lock = threading.Lock()
+
+    def check(self, name: str) -> str:
+        """
+        Validate a backend name.
+
+        Raises:
+            ValueError: If the backend is unknown or its library is not installed
+        """
+        if name != AUTO and name not in BACKENDS:
+            raise ValueError(f"Unknown PDF backend {name!r}; choose from {', '.join([AUTO, *BACKENDS])}")
+        if name != AUTO and name not in self.available:
+            raise ValueError(f"PDF backend {name!r} is not installed")
+        return name
+
+    def ranking(self) -> List[str]:
+        """Installed backends, measured ones fastest first, then unmeasured ones in preference order."""
+        with self._lock:
+            speed = {name: usage.pages_per_second for name, usage in self.usage.items()}
+        return sorted(self.available, key=lambda name: (speed[name] == 0, -speed[name]))
+
+    def chain(self, backend: Optional[str] = None) -> List[str]:
+        """
+        Backends to read a document with, in order.
+
+        Args:
+            backend: Backend requested for this document; None uses the configured one
+        """
+        ranking = self.ranking()
+        primary = self.check(backend or self.backend)
+        chain = [ranking[0] if primary == AUTO else primary]
+        for name in self.fallback:
+            for candidate in ranking if name == AUTO else [name]:
+                if candidate not in chain:
+                    chain.append(candidate)
+        return chain
+
+    def load(self, backend: Optional[str] = None):
+        """Import the libraries of a chain (the configured one by default), e.g. during warm-up."""
+        for name in self.chain(backend):
+            BACKENDS[name].load()
+
+    def record(self, usage: Dict[str, BackendUsage]):
+        """Add the work done on one document (possibly in another process) to the totals."""
+        with self._lock:
+            for name, work in usage.items():
+                self.usage[name].add(work)
+
+    def benchmark(self, sample: bytes, max_pages: int = 50) -> Dict[str, float]:
+        """
+        Measure every installed backend on a sample document.
+
+        Runs in the calling thread. A backend that fails on the sample is
+        recorded with a failure and no throughput.
+
+        Args:
+            sample: PDF bytes, ideally typical of the documents summarized
+            max_pages: Pages extracted per backend
+
+        Returns:
+            Pages per second per backend on the sample
+        """
+        results = {}
+        for name in self.available:
+            try:
+                BACKENDS[name].load()
+                document = PdfDocument(sample, [name])
+                for index in range(min(document.page_count, max_pages)):
+                    document.page_text(index)
+            except Exception:
+                self.record({name: BackendUsage(failures=1)})
+                results[name] = 0.0
+                continue
+            self.record(document.usage)
+            results[name] = document.usage[name].pages_per_second
+        return results
+
+    def report(self) -> dict:
+        """Describe the configuration, the current chain and each backend's throughput."""
+        usage = self.stats()
+        return {
+            "backend": self.backend,
+            "fallback": self.fallback,
+            "chain": self.chain(),
+            "backends": {
+                name: {
+                    "installed": name in self.available,
+                    **{key[len(name) + 1:]: value for key, value in usage.items() if key.startswith(name + "_")},
+                }
+                for name in BACKENDS
+            },
+        }
+
+    def stats(self) -> dict:
+        """Report documents, pages, time, failures and pages per second per installed backend."""
+        with self._lock:
+            stats = {}
+            for name, usage in self.usage.items():
+                stats[f"{name}_documents"] = usage.documents
+                stats[f"{name}_pages"] = usage.pages
+                stats[f"{name}_seconds"] = usage.seconds
+                stats[f"{name}_failures"] = usage.failures
+                stats[f"{name}_pages_per_second"] = usage.pages_per_second
+        return stats
@@ -0,0 +1,302 @@
+"""
+Token-budgeted prompt construction.
+
+Extracted PDF text is cleaned before it is sent to the model: whitespace is
+normalized and header or footer lines repeated across pages (running titles,
+page numbers) are dropped. Cleaned pages are then added to the prompt until a
+token budget is filled, rather than cutting the text at a fixed number of
+characters, which wastes most of the context window on dense English and can
+overflow it on other scripts.
+
+Tokens are estimated locally by default; the model's own ``count_tokens`` can
+be used instead. Counts are cached per text, so rebuilding a prompt from the
+same pages does not count them again.
+"""
+
+import asyncio
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+# ASCII words, digit runs, single CJK characters, other-script words, punctuation
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|[0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]|\w+|\S")
+
+# Extracted characters read per budgeted token; generous so the prompt is still
+# full after cleaning removes repeated lines and whitespace
+READ_CHARS_PER_TOKEN = 6
+
+
+def _piece_tokens(piece: str) -> int:
+    """Estimate the tokens of one match of the token pattern."""
+    if piece.isascii():
+        if piece.isalpha():
+            # Common English words are a single token; long ones split every few letters
+            return (len(piece) + 5) // 6
+        if piece.isdigit():
+            return (len(piece) + 2) // 3
+        return max(1, (len(piece) + 3) // 4)
+    # CJK characters match one at a time; other scripts average about two characters per token
+    return (len(piece) + 1) // 2
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate how many tokens a text takes without calling the model.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Approximate token count
+    """
+    return sum(_piece_tokens(match.group()) for match in _TOKEN_PATTERN.finditer(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut a text after roughly max_tokens estimated tokens, on a token boundary.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Estimated token budget
+
+    Returns:
+        The longest prefix of text that fits the budget
+    """
+    used = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > max_tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+
+def normalize_whitespace(text: str) -> str:
+    """
+    Collapse runs of spaces within lines and runs of blank lines.
+
+    Args:
+        text: Extracted page text
+
+    Returns:
+        Text with single spaces, no trailing whitespace and at most one blank
+        line between paragraphs
+    """
+    lines = []
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def _line_key(line: str) -> str:
+    """Key under which header and footer lines are compared; page numbers compare equal."""
+    return re.sub(r"\d+", "#", line.lower())
+
+
+def _edge_indices(lines: List[str], edge_lines: int) -> List[int]:
+    """Indices of the first and last non-blank lines of a page."""
+    content = [index for index, line in enumerate(lines) if line]
+    return sorted(set(content[:edge_lines] + content[-edge_lines:]))
+
+
+def strip_repeated_lines(
+    pages: Sequence[str],
+    edge_lines: int = 2,
+    min_pages: int = 3,
+    threshold: float = 0.5,
+) -> List[str]:
+    """
+    Remove header and footer lines repeated across pages.
+
+    A line near the top or bottom of a page is treated as a header or footer
+    when, ignoring case and digits, it also appears near the top or bottom of
+    at least ``threshold`` of the pages. Pages are never emptied entirely.
+
+    Args:
+        pages: Whitespace-normalized page texts
+        edge_lines: Lines at the top and at the bottom of each page considered
+        min_pages: Fewer pages are returned unchanged
+        threshold: Fraction of pages a line must repeat on
+
+    Returns:
+        Page texts without their repeated header and footer lines
+    """
+    if len(pages) < min_pages:
+        return list(pages)
+    split = [page.split("\n") for page in pages]
+    counts = Counter()
+    for lines in split:
+        counts.update({_line_key(lines[index]) for index in _edge_indices(lines, edge_lines)})
+    repeated = {key for key, count in counts.items() if count >= max(2, threshold * len(pages))}
+    if not repeated:
+        return list(pages)
+
+    cleaned = []
+    for lines in split:
+        drop = {index for index in _edge_indices(lines, edge_lines) if _line_key(lines[index]) in repeated}
+        if len(drop) >= sum(1 for line in lines if line):
+            # Never empty a page: its only lines are content that happens to repeat
+            drop = set()
+        cleaned.append("\n".join(line for index, line in enumerate(lines) if index not in drop).strip())
+    return cleaned
+
+
+class TokenCounter:
+    """
+    Token counter with a per-text LRU cache.
+
+    Args:
+        count: Coroutine function returning the model's token count for a
+            text (e.g. GeminiClient.count_tokens); texts are only estimated
+            locally when None
+        cache_size: Number of counts kept
+    """
+
+    def __init__(self, count: Optional[Callable[[str], Awaitable[int]]] = None, cache_size: int = 4096):
+        self._count = count
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        # Prompts are built in worker threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.model_calls = 0
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from the model rather than the local estimator."""
+        return self._count is not None
+
+    def _lookup(self, key: bytes) -> Optional[int]:
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return tokens
+
+    def _remember(self, key: bytes, tokens: int) -> int:
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    @staticmethod
+    def _key(kind: bytes, text: str) -> bytes:
+        return kind + hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def estimate(self, text: str) -> int:
+        """Estimate a text's tokens locally, using the cache."""
+        key = self._key(b"e", text)
+        tokens = self._lookup(key)
+        if tokens is None:
+            tokens = self._remember(key, estimate_tokens(text))
+        return tokens
+
+    async def count(self, text: str) -> int:
+        """Count a text's tokens with the model if configured, else estimate them; cached."""
+        if self._count is None:
+            return self.estimate(text)
+        key = self._key(b"m", text)
+        tokens = self._lookup(key)
+        if tokens is None:
+            self.model_calls += 1
+            tokens = self._remember(key, await self._count(text))
+        return tokens
+
+    def stats(self) -> dict:
+        """Report cache and model call counters."""
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "model_calls": self.model_calls,
+        }
+
+
+@dataclass
+class Prompt:
+    """A prompt built within a token budget."""
+
+    text: str
+    tokens: int
+    pages_used: int
+    truncated: bool
+
+
+class PromptBuilder:
+    """
+    Builds summarization prompts from extracted pages within a token budget.
+
+    Args:
+        counter: Token counter used to measure pages and prompts
+        max_tokens: Token budget of a prompt, instruction included
+    """
+
+    def __init__(self, counter: TokenCounter, max_tokens: int = 8000):
+        self.counter = counter
+        self.max_tokens = max_tokens
+
+    @property
+    def read_budget(self) -> int:
+        """Characters of extracted text to read so a prompt can be filled."""
+        return self.max_tokens * READ_CHARS_PER_TOKEN
+
+    def clean(self, pages: Sequence[str]) -> List[str]:
+        """Normalize whitespace and drop repeated headers and footers; empty pages are removed."""
+        return [page for page in strip_repeated_lines([normalize_whitespace(page) for page in pages]) if page]
+
+    async def build(self, instruction: str, pages: Sequence[str]) -> Prompt:
+        """
+        Build a prompt from an instruction followed by as many cleaned pages as fit.
+
+        Pages are cleaned and measured with the local estimator in a worker
+        thread, since that takes a while for long documents; when the counter
+        uses the model, the assembled prompt is then counted exactly and
+        shortened if the estimate was too low.
+
+        Args:
+            instruction: Prompt text preceding the document
+            pages: Extracted page texts in document order
+
+        Returns:
+            Prompt text, its token count, how many pages it includes and
+            whether the document had to be cut
+        """
+        body, used, pages_used, truncated = await asyncio.to_thread(self._fill, instruction, pages)
+
+        if self.counter.exact:
+            used = await self.counter.count(instruction + body)
+            for _ in range(3):
+                if used <= self.max_tokens:
+                    break
+                body = body[:int(len(body) * self.max_tokens / used * 0.95)]
+                truncated = True
+                used = await self.counter.count(instruction + body)
+        return Prompt(text=instruction + body, tokens=used, pages_used=pages_used, truncated=truncated)
+
+    def _fill(self, instruction: str, pages: Sequence[str]) -> Tuple[str, int, int, bool]:
+        """Clean pages and join as many as fit the budget; returns body, estimated tokens, pages used, truncated."""
+        used = self.counter.estimate(instruction)
+        parts = []
+        truncated = False
+        for page in self.clean(pages):
+            tokens = self.counter.estimate(page) + 1  # page separator
+            if used + tokens > self.max_tokens:
+                remaining = self.max_tokens - used
+                if remaining > 0:
+                    parts.append(truncate_to_tokens(page, remaining))
+                    used += estimate_tokens(parts[-1])
+                truncated = True
+                break
+            parts.append(page)
+            used += tokens
+        return "\n".join(parts), used, len(parts), truncated
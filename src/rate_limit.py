@@ -0,0 +1,323 @@
+"""
+Per-client rate limiting and admission control.
+
+Expensive endpoints are grouped (e.g. "summarize", "download"). Each group
+has its own token bucket per client, keyed by API key or client IP, that
+refills at a steady rate up to a burst size; a request takes one token (a
+batch one per item) and is rejected with ``429`` and ``Retry-After`` when the
+bucket is empty. Independently of any client's budget, a worker process
+sheds new requests with ``503`` when a group already has its maximum of
+requests in flight or a downstream queue (such as the Gemini limiter) is
+saturated, so overload is refused up front instead of after an upload has
+been read and parsed.
+
+Buckets live in memory by default. Several worker processes on one host
+share budgets by pointing them at the same SQLite file.
+"""
+
+import asyncio
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Literal, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+ClientId = Literal["api_key", "ip"]
+
+API_KEY_HEADER = b"x-api-key"
+
+
+@dataclass
+class EndpointLimit:
+    """
+    Limits of one endpoint group.
+
+    Attributes:
+        per_minute: Tokens added to each client's bucket per minute; 0 disables rate limiting
+        burst: Bucket capacity, i.e. requests a client may send at once
+        max_in_flight: Requests handled at once per worker process; 0 means unlimited
+        overloaded: Optional probe returning True while a downstream queue is full
+    """
+
+    per_minute: float
+    burst: int
+    max_in_flight: int = 0
+    overloaded: Optional[Callable[[], bool]] = None
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60
+
+
+def refill(tokens: float, updated: float, now: float, rate: float, burst: int) -> float:
+    """Tokens in a bucket at ``now``, given its level at ``updated``."""
+    return min(float(burst), tokens + max(0.0, now - updated) * rate)
+
+
+def take_tokens(tokens: float, cost: float, rate: float) -> Tuple[float, float]:
+    """
+    Take ``cost`` tokens if available.
+
+    Returns:
+        (tokens left, seconds until the request could be admitted; 0 when it was)
+    """
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+def hash_api_key(value: bytes) -> str:
+    """Identity of an API key in bucket names."""
+    return hashlib.sha256(value).hexdigest()[:32]
+
+
+class MemoryBuckets:
+    """
+    Token buckets of one process, least recently used first.
+
+    Args:
+        max_keys: Buckets kept; evicting an idle bucket only forgets that it
+            was partly drained
+    """
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, rate: float, burst: int, cost: float) -> float:
+        """Take tokens from a bucket; returns 0 if admitted, else seconds to wait."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (float(burst), now))
+        tokens, wait = take_tokens(refill(tokens, updated, now, rate, burst), cost, rate)
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBuckets:
+    """
+    Token buckets in a SQLite file shared by the worker processes of a host.
+
+    Each take is one short write transaction. Rows of buckets that have
+    refilled completely carry no information and are pruned periodically.
+
+    Args:
+        db_path: SQLite file; created if missing
+        prune_every: Takes between two prunes
+    """
+
+    blocking = True
+
+    def __init__(self, db_path: Path, prune_every: int = 1000):
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.prune_every = prune_every
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._lock = threading.Lock()
+        self._takes = 0
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # Bucket levels are transient: losing the last writes in a crash is harmless
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated REAL NOT NULL,"
+                " full_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)")
+
+    def take(self, key: str, rate: float, burst: int, cost: float) -> float:
+        """Take tokens from a bucket; returns 0 if admitted, else seconds to wait."""
+        with self._lock:
+            now = time.time()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = refill(row[0], row[1], now, rate, burst) if row else float(burst)
+                tokens, wait = take_tokens(tokens, cost, rate)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, now + (burst - tokens) / rate),
+                )
+                self._takes += 1
+                if self._takes % self.prune_every == 0:
+                    self._db.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            return wait
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RateLimiter:
+    """
+    Rate limits and in-flight caps for groups of endpoints.
+
+    Args:
+        buckets: Token bucket backend (MemoryBuckets or SQLiteBuckets)
+        limits: Limits by group name
+        routes: Group name by (method, path) of the limited endpoints
+        client_id: "ip" identifies clients by their address. "api_key" uses
+            their X-API-Key header instead, falling back to the address;
+            only safe when keys are validated, through api_keys or by a
+            gateway that sets the header itself
+        api_keys: Keys accepted as client identities in "api_key" mode;
+            requests with any other key are identified by their address.
+            Empty trusts every key, for use behind such a gateway
+    """
+
+    def __init__(
+        self,
+        buckets,
+        limits: Dict[str, EndpointLimit],
+        routes: Dict[Tuple[str, str], str],
+        client_id: ClientId = "ip",
+        api_keys: Iterable[str] = (),
+    ):
+        self.buckets = buckets
+        self.limits = limits
+        self.routes = routes
+        self.client_id = client_id
+        # Hashed, so the keys themselves are not kept in memory longer than needed
+        self.api_keys = {hash_api_key(key.encode()) for key in api_keys}
+        self.in_flight = {group: 0 for group in limits}
+        self.allowed = {group: 0 for group in limits}
+        self.limited = {group: 0 for group in limits}
+        self.shed = {group: 0 for group in limits}
+
+    def client_key(self, scope) -> str:
+        """Identify the client of a request; API keys are hashed, never stored."""
+        if self.client_id == "api_key":
+            for name, value in scope.get("headers", ()):
+                if name == API_KEY_HEADER and value:
+                    key = hash_api_key(value)
+                    # An unknown key must not buy a fresh bucket
+                    if not self.api_keys or key in self.api_keys:
+                        return "key:" + key
+                    break
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    def admit(self, group: str) -> bool:
+        """Whether the process can take on one more request of a group."""
+        limit = self.limits[group]
+        if limit.max_in_flight and self.in_flight[group] >= limit.max_in_flight:
+            return False
+        return not (limit.overloaded is not None and limit.overloaded())
+
+    async def acquire(self, group: str, client: str, cost: int = 1, already_taken: int = 0) -> float:
+        """
+        Take tokens from a client's bucket for a group.
+
+        Args:
+            group: Endpoint group
+            client: Client key, see client_key()
+            cost: Tokens to take
+            already_taken: Tokens taken earlier for the same request
+
+        Returns:
+            0 if the request is admitted, otherwise the seconds after which
+            it would be; math.inf if it costs more than the burst size and
+            so can never be admitted
+        """
+        limit = self.limits[group]
+        if not limit.per_minute or cost <= 0:
+            return 0.0
+        if cost + already_taken > limit.burst:
+            self.limited[group] += 1
+            return math.inf
+        key = f"{group}:{client}"
+        if self.buckets.blocking:
+            wait = await asyncio.to_thread(self.buckets.take, key, limit.rate, limit.burst, cost)
+        else:
+            wait = self.buckets.take(key, limit.rate, limit.burst, cost)
+        if wait:
+            self.limited[group] += 1
+        return wait
+
+    def stats(self) -> dict:
+        """Report admitted, rate-limited and shed requests and the in-flight count per group."""
+        stats = {"clients": len(self.buckets)}
+        for group in self.limits:
+            stats[f"{group}_allowed"] = self.allowed[group]
+            stats[f"{group}_limited"] = self.limited[group]
+            stats[f"{group}_shed"] = self.shed[group]
+            stats[f"{group}_in_flight"] = self.in_flight[group]
+        return stats
+
+
+def retry_after(seconds: float) -> str:
+    """Retry-After header value: whole seconds, at least 1."""
+    return str(max(1, math.ceil(seconds)))
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying a RateLimiter to the endpoints it lists.
+
+    Requests are shed (503) before they take a token, so a client is not
+    charged for requests the server had no capacity for. The in-flight count
+    covers the whole response, including streamed bodies.
+
+    Args:
+        app: Wrapped ASGI application
+        limiter: Rate limiter holding the limits and the route table
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        group = self.limiter.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter
+        if not limiter.admit(group):
+            limiter.shed[group] += 1
+            response = JSONResponse(
+                {"detail": f"Server is busy with {group} requests"},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        # Counted from here so that concurrent requests cannot all pass admit() while this one waits for a token
+        limiter.in_flight[group] += 1
+        try:
+            wait = await limiter.acquire(group, limiter.client_key(scope))
+            if wait:
+                response = JSONResponse(
+                    {"detail": f"Rate limit exceeded for {group} requests"},
+                    status_code=429,
+                    headers={"Retry-After": retry_after(wait)},
+                )
+                await response(scope, receive, send)
+                return
+            limiter.allowed[group] += 1
+            await self.app(scope, receive, send)
+        finally:
+            limiter.in_flight[group] -= 1
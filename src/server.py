@@ -0,0 +1,260 @@
+"""
+Production entry point: ``python -m src.server``.
+
+Runs the API under uvicorn with ``WEB_CONCURRENCY`` worker processes on one
+listening socket. With several workers, a master process binds the socket,
+imports the heavy modules once and recovers interrupted jobs, then forks the
+workers, so each starts with those modules already in (copy-on-write)
+memory. The application itself (its SQLite connections, pools and event
+loop) is only created in the workers, never carried across a fork.
+
+On SIGTERM or SIGINT the master forwards SIGTERM to every worker. Each worker
+stops accepting connections, lets in-flight requests finish, and drains its
+background downloads and jobs (see the application lifespan), each step
+bounded by ``SHUTDOWN_GRACE_PERIOD``; workers still running after that are
+killed. Workers that exit unexpectedly are restarted, and the jobs they
+were running are returned to the queue.
+
+With several workers, Prometheus metrics are kept in multiprocess mode: the
+master creates the directory the workers write their samples to (unless
+``PROMETHEUS_MULTIPROC_DIR`` names one) before prometheus_client is
+imported, and clears the live gauges of each worker it reaps.
+"""
+
+import importlib
+import logging
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import uvicorn
+
+from src.config import settings
+from src.jobs import JobStore
+from src.lazy import preload
+
+APP = "src.main:app"
+
+# Imported by the master before forking; src.main is deliberately not among
+# them, as it opens database connections that must not be shared by workers
+PRELOAD_MODULES = (
+    "fastapi",
+    "aiohttp",
+    "pydantic",
+    "prometheus_client",
+    "psutil",
+    "src.downloader",
+    "src.extraction",
+    "src.ingest",
+    "src.llm",
+    "src.metrics",
+    "src.prompt",
+    "src.summarizer",
+)
+
+# Exit status of a worker whose application failed to start
+STARTUP_FAILURE = 3
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Create the listening socket shared by all workers."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def uvicorn_config(**overrides) -> uvicorn.Config:
+    """Uvicorn settings for one worker; HTTP requests get the configured grace period at shutdown."""
+    options = {
+        "host": settings.server_host,
+        "port": settings.server_port,
+        "timeout_graceful_shutdown": settings.shutdown_grace_period,
+    }
+    return uvicorn.Config(APP, **{**options, **overrides})
+
+
+def run_worker(config: uvicorn.Config, sock: socket.socket) -> int:
+    """Serve the application on an already bound socket until shut down; returns the exit status."""
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    return 0 if server.started else STARTUP_FAILURE
+
+
+def prepare_metrics_dir() -> bool:
+    """
+    Set up prometheus_client multiprocess mode; must run before it is imported.
+
+    Returns:
+        Whether a temporary directory was created, to be removed at exit
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="genai-metrics-")
+        return True
+    # Samples of a previous run's workers would be merged into this one's
+    Path(path).mkdir(parents=True, exist_ok=True)
+    for stale in Path(path).glob("*.db"):
+        stale.unlink()
+    return False
+
+
+def preload_master_state():
+    """Import the heavy modules and recover interrupted jobs once, before forking."""
+    for name in PRELOAD_MODULES:
+        importlib.import_module(name)
+    preload()
+
+    store = JobStore(settings.jobs_db)
+    try:
+        recovered = store.requeue_running()
+    finally:
+        store.close()
+    if recovered:
+        logger.info("Requeued %d interrupted jobs", recovered)
+    # The workers share the job store, so none of them may requeue another's running jobs;
+    # the supervisor requeues the jobs of each worker it reaps instead
+    settings.job_recover_on_start = False
+
+
+class Supervisor:
+    """
+    Pre-forking process manager.
+
+    Args:
+        config: Uvicorn settings of the workers
+        sock: Listening socket inherited by every worker
+        workers: Number of worker processes
+        grace_period: Seconds each shutdown step of a worker may take
+    """
+
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int, grace_period: float):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.grace_period = grace_period
+        self.children: Dict[int, int] = {}
+        self.stopping = False
+        self.exit_code = 0
+        self._kill_at: Optional[float] = None
+
+    def run(self) -> int:
+        """Start the workers and supervise them until they have all exited."""
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+        for index in range(self.workers):
+            self._spawn(index)
+        while self.children:
+            self._reap()
+            if self._kill_at is not None and time.monotonic() > self._kill_at:
+                for pid in self.children:
+                    logger.warning("Killing worker %d after the shutdown grace period", pid)
+                    self._signal(pid, signal.SIGKILL)
+                self._kill_at = None
+            time.sleep(0.1)
+        return self.exit_code
+
+    def stop(self):
+        """Ask every worker to shut down gracefully."""
+        if self.stopping:
+            return
+        self.stopping = True
+        # Requests, then downloads and jobs, each get one grace period
+        self._kill_at = time.monotonic() + 2 * self.grace_period + 5
+        for pid in self.children:
+            self._signal(pid, signal.SIGTERM)
+
+    def _handle_signal(self, signum, frame):
+        self.stop()
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                code = run_worker(self.config, self.sock)
+            finally:
+                os._exit(code)
+        logger.info("Started worker %d (pid %d)", index, pid)
+        self.children[pid] = index
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            self._worker_exited(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                continue
+            if code == STARTUP_FAILURE:
+                logger.error("Worker %d failed to start; shutting down", pid)
+                self.exit_code = STARTUP_FAILURE
+                self.stop()
+                continue
+            logger.warning("Worker %d exited with status %d; restarting it", pid, code)
+            self._spawn(index)
+
+    @staticmethod
+    def _worker_exited(pid: int):
+        """Clean up after a reaped worker: requeue the jobs it was running; its live gauges no longer count."""
+        store = JobStore(settings.jobs_db)
+        try:
+            requeued = store.requeue_owned_by(pid)
+        finally:
+            store.close()
+        if requeued:
+            logger.info("Requeued %d jobs of worker %d", requeued, pid)
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+
+            multiprocess.mark_process_dead(pid)
+
+    @staticmethod
+    def _signal(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def main() -> int:
+    """Run the API with the configured number of workers."""
+    # Creating the config sets up uvicorn's logging, used by the master as well
+    config = uvicorn_config()
+    sock = bind_socket(settings.server_host, settings.server_port)
+    if settings.server_workers <= 1:
+        return run_worker(config, sock)
+    temporary_metrics_dir = prepare_metrics_dir()
+    try:
+        preload_master_state()
+        logger.info(
+            "Serving on %s:%d with %d workers", settings.server_host, settings.server_port, settings.server_workers
+        )
+        return Supervisor(config, sock, settings.server_workers, settings.shutdown_grace_period).run()
+    finally:
+        if temporary_metrics_dir:
+            shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
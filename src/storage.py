@@ -0,0 +1,432 @@
+"""
+Lifecycle management of the downloads directory.
+
+The manager keeps a ledger of the files in the directory (size and last
+access) and of the space reserved by transfers in progress, so no request
+has to list the directory. The ledger is a SQLite file inside the directory,
+shared by the worker processes of the prefork server, and every change to it
+is one write transaction, so the quota holds across workers rather than per
+worker. Before a transfer writes anything it reserves its expected size
+(from Content-Length): least recently used files are evicted until the
+download fits within the byte quota and leaves the minimum free disk space,
+or the download is refused with StorageFullError. A transfer that names its
+``.part`` file in the reservation reserves the whole file, bytes already on
+disk included, and that file is not counted again as a partial download.
+
+A background sweep re-scans the directory periodically to pick up changes
+made outside the ledger, deletes ``.part`` and temporary files left behind
+by transfers that never finished, expires files not used for the maximum
+age and enforces the quota again. Reservations of a worker that died are
+dropped once its sweeps stop refreshing them.
+"""
+
+import asyncio
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Sweep intervals after which a reservation no sweep has refreshed is dropped
+RESERVATION_EXPIRY_SWEEPS = 3
+
+
+class StorageFullError(Exception):
+    """Raised when a download cannot fit in the downloads directory, even after eviction."""
+
+
+def is_partial_file(name: str) -> bool:
+    """Whether a directory entry is an in-progress download or a temporary file."""
+    return name.endswith(".part") or name.endswith(".tmp")
+
+
+def is_stored_file(name: str) -> bool:
+    """Whether a directory entry is a completed download (hidden files, such as the index, are not)."""
+    return not name.startswith(".") and not is_partial_file(name)
+
+
+class Reservation:
+    """
+    Disk space set aside for one transfer.
+
+    Returned by DownloadStorage.reserve(); commit() records the finished file
+    and release() (idempotent) gives the space back if the transfer failed.
+    """
+
+    def __init__(self, storage: "DownloadStorage", reservation_id: str, size: int, part: Optional[str] = None):
+        self.storage = storage
+        self.id = reservation_id
+        self.part = part
+        # None once committed or released
+        self.size: Optional[int] = size
+
+    async def commit(self, path: Path, size: int):
+        """Record the completed file in place of the reserved space."""
+        await asyncio.to_thread(self.storage._commit, self, path, size)
+
+    def release(self):
+        self.storage._release(self)
+
+
+class DownloadStorage:
+    """
+    Quota, eviction and cleanup for one downloads directory.
+
+    Args:
+        root: Directory managed
+        max_bytes: Quota for completed and partial downloads; 0 means unlimited
+        min_free_bytes: Free disk space every reservation must leave
+        max_age: Seconds since last use after which a file is deleted; 0 keeps files
+        orphan_age: Seconds after its last write that a ``.part`` or
+            temporary file is considered abandoned and deleted
+        sweep_interval: Seconds between background sweeps
+        on_evict: Called (from a worker thread) with the path of each file
+            deleted by eviction or expiry
+        db_path: SQLite ledger shared by the processes managing the
+            directory; a hidden file inside it by default
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = 0,
+        min_free_bytes: int = 0,
+        max_age: float = 0,
+        orphan_age: float = 3600,
+        sweep_interval: float = 300,
+        on_evict: Optional[Callable[[Path], None]] = None,
+        db_path: Optional[Path] = None,
+    ):
+        self.root = root.resolve()
+        self.max_bytes = max_bytes
+        self.min_free_bytes = min_free_bytes
+        self.max_age = max_age
+        self.orphan_age = orphan_age
+        self.sweep_interval = sweep_interval
+        self.on_evict = on_evict
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(
+            str(db_path or self.root / ".storage.db"), check_same_thread=False, isolation_level=None, timeout=5.0
+        )
+        self._lock = threading.Lock()
+        # Accesses are recorded in memory and written with the next transaction, keeping touch() off the disk
+        self._touched: Dict[str, float] = {}
+        self._touched_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._owner = ""
+        self._owner_pid = 0
+        self.scanned = False
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.expired = 0
+        self.orphans_removed = 0
+        self.rejected = 0
+        self.sweeps = 0
+        self.last_sweep_at: Optional[float] = None
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " name TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS files_accessed_at ON files (accessed_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS reservations ("
+                " id TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " seen_at REAL NOT NULL,"
+                " part TEXT)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(reservations)")}
+            if "part" not in columns:
+                # Ledgers created before reservations named the .part file they cover
+                self._db.execute("ALTER TABLE reservations ADD COLUMN part TEXT")
+            # Partial files seen by the last sweep
+            self._db.execute("CREATE TABLE IF NOT EXISTS partials (name TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+
+    @property
+    def owner(self) -> str:
+        """Identity of this process's reservations; a forked worker gets its own."""
+        if self._owner_pid != os.getpid():
+            self._owner_pid = os.getpid()
+            self._owner = f"{self._owner_pid}-{uuid.uuid4().hex}"
+        return self._owner
+
+    def start(self):
+        """Start the background sweep on the running event loop; the first sweep builds the ledger."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background sweep."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.to_thread(self.sweep)
+            await asyncio.sleep(self.sweep_interval)
+
+    @contextmanager
+    def _transaction(self):
+        """One write transaction on the ledger, serialized with the other processes'."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._flush_touches()
+                yield
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _flush_touches(self):
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        self._db.executemany(
+            "UPDATE files SET accessed_at = MAX(accessed_at, ?) WHERE name = ?",
+            [(accessed_at, name) for name, accessed_at in touched.items()],
+        )
+
+    def sweep(self):
+        """Re-scan the directory, delete abandoned partial files, expire old files and enforce the quota."""
+        now = time.time()
+        files = {}
+        partials = {}
+        orphans = []
+        self.root.mkdir(parents=True, exist_ok=True)
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_partial_file(entry.name):
+                    if now - stat.st_mtime > self.orphan_age:
+                        orphans.append((Path(entry.path), stat.st_size))
+                    else:
+                        partials[entry.name] = stat.st_size
+                elif is_stored_file(entry.name):
+                    files[entry.name] = (stat.st_size, stat.st_mtime)
+
+        for path, size in orphans:
+            try:
+                path.unlink()
+                self.orphans_removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError:
+                partials[path.name] = size
+
+        with self._transaction():
+            # Rows of files committed by another process since the scan are kept as long as the file exists
+            gone = [
+                (name,)
+                for (name,) in self._db.execute("SELECT name FROM files").fetchall()
+                if name not in files and not (self.root / name).exists()
+            ]
+            self._db.executemany("DELETE FROM files WHERE name = ?", gone)
+            # Keep the access times recorded since the last scan; new files enter by modification time
+            self._db.executemany(
+                "INSERT INTO files (name, size, accessed_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET size = excluded.size,"
+                " accessed_at = MAX(accessed_at, excluded.accessed_at)",
+                [(name, size, mtime) for name, (size, mtime) in files.items()],
+            )
+            self._db.execute("DELETE FROM partials")
+            self._db.executemany("INSERT INTO partials (name, size) VALUES (?, ?)", partials.items())
+            # Reservations are refreshed by their process's sweeps; those of dead workers expire
+            self._db.execute("UPDATE reservations SET seen_at = ? WHERE owner = ?", (now, self.owner))
+            self._db.execute(
+                "DELETE FROM reservations WHERE seen_at < ?",
+                (now - RESERVATION_EXPIRY_SWEEPS * self.sweep_interval,),
+            )
+            victims = []
+            if self.max_age:
+                victims = self._db.execute(
+                    "SELECT name, size FROM files WHERE accessed_at < ? ORDER BY accessed_at", (now - self.max_age,)
+                ).fetchall()
+                self._forget(victims)
+                self.expired += len(victims)
+            evicted = self._evict_for(0, free=None)[0]
+            self.scanned = True
+            self.sweeps += 1
+            self.last_sweep_at = now
+        self._count_evictions(evicted)
+        self._delete(victims + evicted)
+
+    def reserve(self, size: int, exclude: Optional[Path] = None, part: Optional[Path] = None) -> Reservation:
+        """
+        Set aside space for a download, evicting least recently used files as needed.
+
+        Args:
+            size: Expected size in bytes; 0 when the origin did not announce it
+            exclude: File that must not be evicted, e.g. the one being replaced
+            part: The transfer's ``.part`` file; ``size`` then covers the whole
+                file and its bytes on disk no longer count as partial
+
+        Returns:
+            The reservation, to be committed or released
+
+        Raises:
+            StorageFullError: If the download cannot fit even after evicting every other file
+        """
+        if not self.scanned:
+            self.sweep()
+        free = shutil.disk_usage(self.root).free if self.min_free_bytes else None
+        reservation_id = uuid.uuid4().hex
+        part_name = part.name if part is not None else None
+        try:
+            with self._transaction():
+                victims, fits = self._evict_for(size, free, exclude, part=part_name)
+                if not fits:
+                    # Rolls the tentative eviction back
+                    used, reserved, partial = self._totals()
+                    raise StorageFullError(
+                        f"Not enough space for a {size}-byte download in {self.root}"
+                        f" (quota {self.max_bytes or 'unlimited'}, {used + partial} bytes used)"
+                    )
+                self._db.execute(
+                    "INSERT INTO reservations (id, owner, size, seen_at, part) VALUES (?, ?, ?, ?, ?)",
+                    (reservation_id, self.owner, size, time.time(), part_name),
+                )
+        except StorageFullError:
+            self.rejected += 1
+            raise
+        self._count_evictions(victims)
+        self._delete(victims)
+        return Reservation(self, reservation_id, size, part_name)
+
+    def manages(self, path: Path) -> bool:
+        """Whether a path is a file directly inside the managed directory."""
+        return path.resolve().parent == self.root
+
+    def touch(self, path: Path):
+        """Mark a file as just used, making it the last candidate for eviction."""
+        if not self.manages(path):
+            return
+        with self._touched_lock:
+            self._touched[path.name] = time.time()
+
+    def _commit(self, reservation: Reservation, path: Path, size: int):
+        with self._transaction():
+            if reservation.size is not None:
+                self._db.execute("DELETE FROM reservations WHERE id = ?", (reservation.id,))
+            if reservation.part is not None:
+                # Renamed into the committed file
+                self._db.execute("DELETE FROM partials WHERE name = ?", (reservation.part,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (name, size, accessed_at) VALUES (?, ?, ?)",
+                (path.name, size, time.time()),
+            )
+            # Downloads of unannounced size were not reserved; make room after the fact
+            victims = self._evict_for(0, free=None, exclude=path)[0]
+        reservation.size = None
+        self._count_evictions(victims)
+        self._delete(victims)
+
+    def _release(self, reservation: Reservation):
+        if reservation.size is None:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM reservations WHERE id = ?", (reservation.id,))
+        reservation.size = None
+
+    def _totals(self, part: Optional[str] = None) -> Tuple[int, int, int]:
+        """
+        Bytes used by completed files, reserved by transfers and held by partial files. Caller holds the lock.
+
+        Partial files covered by a reservation, or named by ``part`` (about to
+        be), are left out: the reservation already accounts for them.
+        """
+        used = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        reserved = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM reservations").fetchone()[0]
+        partial = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM partials WHERE name IS NOT ?"
+            " AND name NOT IN (SELECT part FROM reservations WHERE part IS NOT NULL)",
+            (part,),
+        ).fetchone()[0]
+        return used, reserved, partial
+
+    def _evict_for(
+        self, size: int, free: Optional[int], exclude: Optional[Path] = None, part: Optional[str] = None
+    ) -> Tuple[List[Tuple[str, int]], bool]:
+        """
+        Remove ledger rows, least recently used first, until ``size`` more bytes fit.
+
+        Runs inside a transaction. Returns the evicted files and whether the
+        download fits; ``free`` is the free disk space, None to ignore it, and
+        ``part`` the partial file the new reservation will cover.
+        """
+        used, reserved, partial = self._totals(part)
+        freed = 0
+
+        def fits() -> bool:
+            if self.max_bytes and used - freed + partial + reserved + size > self.max_bytes:
+                return False
+            # Reserved bytes are not written yet but will be; evicted files give their space back
+            return free is None or free - reserved + freed - size >= self.min_free_bytes
+
+        victims = []
+        for name, file_size in self._db.execute("SELECT name, size FROM files ORDER BY accessed_at"):
+            if fits():
+                break
+            if exclude is not None and name == exclude.name:
+                continue
+            victims.append((name, file_size))
+            freed += file_size
+        self._forget(victims)
+        return victims, fits()
+
+    def _forget(self, victims: List[Tuple[str, int]]):
+        self._db.executemany("DELETE FROM files WHERE name = ?", [(name,) for name, _ in victims])
+
+    def _count_evictions(self, victims: List[Tuple[str, int]]):
+        self.evictions += len(victims)
+        self.evicted_bytes += sum(size for _, size in victims)
+
+    def _delete(self, victims: List[Tuple[str, int]]):
+        for name, _ in victims:
+            path = self.root / name
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            if self.on_evict is not None:
+                self.on_evict(path)
+
+    def stats(self) -> dict:
+        """Report usage and limits, shared by all processes, and this process's eviction and cleanup counters."""
+        with self._lock:
+            files = self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            used, reserved, partial = self._totals()
+        return {
+            "files": files,
+            "used_bytes": used,
+            "partial_bytes": partial,
+            "reserved_bytes": reserved,
+            "max_bytes": self.max_bytes,
+            "min_free_bytes": self.min_free_bytes,
+            "max_age": self.max_age,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "expired": self.expired,
+            "orphans_removed": self.orphans_removed,
+            "rejected": self.rejected,
+            "sweeps": self.sweeps,
+            "last_sweep_at": self.last_sweep_at,
+        }
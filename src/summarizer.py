@@ -0,0 +1,153 @@
+"""
+Map-reduce summarization for documents longer than one prompt.
+
+The text is split into token-bounded chunks, each chunk is summarized
+concurrently (bounded per document by a semaphore, and process-wide by the
+Gemini client's limiter) and the partial summaries are merged by one or more
+reduce calls.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from src.prompt import estimate_tokens
+
+MAP_PROMPT = "Summarize the following section of a longer document. Keep key facts, figures and conclusions:\n\n"
+REDUCE_PROMPT = "Combine the following section summaries into one comprehensive summary of the whole document:\n\n"
+
+
+def _cut_word(word: str, max_tokens: int) -> str:
+    """Prefix of an over-budget word that fits the budget; at least one character."""
+    size = len(word)
+    tokens = estimate_tokens(word)
+    while size > 1 and tokens > max_tokens:
+        size = max(1, min(size - 1, size * max_tokens // tokens))
+        tokens = estimate_tokens(word[:size])
+    return word[:size]
+
+
+def _split_paragraph(paragraph: str, max_tokens: int) -> List[str]:
+    """Split an over-long paragraph on whitespace, cutting only oversized words."""
+    pieces = []
+    piece = ""
+    used = 0
+    for word in paragraph.split(" "):
+        tokens = estimate_tokens(word)
+        while tokens > max_tokens:
+            if piece:
+                pieces.append(piece)
+                piece, used = "", 0
+            head = _cut_word(word, max_tokens)
+            pieces.append(head)
+            word = word[len(head):]
+            tokens = estimate_tokens(word)
+        if piece and used + tokens > max_tokens:
+            pieces.append(piece)
+            piece, used = word, tokens
+        else:
+            piece = f"{piece} {word}" if piece else word
+            used += tokens
+    if piece:
+        pieces.append(piece)
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into chunks that fit a token budget.
+
+    Chunks are measured with the same token estimator as prompts, so dense
+    scripts (CJK, for instance) get proportionally shorter chunks. They
+    break on line boundaries when possible, then on whitespace, and only
+    split words that are longer than a whole chunk.
+
+    Args:
+        text: Text to split
+        max_tokens: Maximum estimated tokens per chunk
+
+    Returns:
+        Non-empty chunks in document order
+    """
+    chunks = []
+    current = ""
+    used = 0
+    for paragraph in text.split("\n"):
+        tokens = estimate_tokens(paragraph)
+        pieces = _split_paragraph(paragraph, max_tokens) if tokens > max_tokens else [paragraph]
+        for piece in pieces:
+            tokens = estimate_tokens(piece) if len(pieces) > 1 else tokens
+            if current and used + tokens > max_tokens:
+                chunks.append(current)
+                current, used = piece, tokens
+            else:
+                current = f"{current}\n{piece}" if current else piece
+                used += tokens
+    chunks.append(current)
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+@dataclass
+class MapReduceResult:
+    """Outcome of a map-reduce summarization."""
+
+    summary: str
+    chunks: int
+    reduce_rounds: int
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+async def map_reduce_summarize(
+    llm,
+    text: str,
+    chunk_tokens: int,
+    concurrency: int,
+) -> MapReduceResult:
+    """
+    Summarize a long text with concurrent map calls and a reduce step.
+
+    Args:
+        llm: GeminiClient (or any object with an async generate_text) used for every call
+        text: Full document text
+        chunk_tokens: Token budget per chunk and per reduce prompt
+        concurrency: Maximum number of LLM calls in flight
+
+    Returns:
+        Final summary, the number of chunks, the number of reduce rounds and
+        per-stage timings in seconds
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(prompt: str) -> str:
+        async with semaphore:
+            return await llm.generate_text(prompt)
+
+    timings = {}
+    started = time.perf_counter()
+    # Token estimation takes a while on long documents; keep it off the event loop
+    chunks = await asyncio.to_thread(chunk_text, text, chunk_tokens)
+    timings["chunk"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    summaries = await asyncio.gather(*(generate(f"{MAP_PROMPT}{chunk}") for chunk in chunks))
+    timings["map"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rounds = 0
+    while len(summaries) > 1:
+        # Merge as many partial summaries per reduce call as fit the budget
+        groups = await asyncio.to_thread(chunk_text, "\n\n".join(summaries), chunk_tokens)
+        if len(groups) >= len(summaries):
+            # Summaries no longer shrink; merge everything in one final call
+            groups = ["\n\n".join(summaries)]
+        summaries = await asyncio.gather(*(generate(f"{REDUCE_PROMPT}{group}") for group in groups))
+        rounds += 1
+    timings["reduce"] = time.perf_counter() - started
+
+    return MapReduceResult(
+        summary=summaries[0] if summaries else "",
+        chunks=len(chunks),
+        reduce_rounds=rounds,
+        timings=timings,
+    )
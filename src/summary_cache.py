@@ -0,0 +1,193 @@
+"""
+Content-addressed cache for PDF summaries.
+
+Entries are keyed on the SHA-256 of the uploaded document together with every
+parameter that influences the generated summary (model, prompt, limits), so a
+re-upload of the same bytes is answered without parsing the PDF or calling
+the LLM. Lookups hit an in-memory LRU first and fall back to an optional
+SQLite tier that survives restarts.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+
+class SummaryCache:
+    """
+    Two-tier (memory + SQLite) summary cache with TTL and size-based eviction.
+
+    Args:
+        max_entries: Maximum number of summaries kept in memory
+        ttl: Seconds an entry stays valid; 0 disables expiry
+        db_path: SQLite file for the on-disk tier; None keeps the cache in memory only
+        max_db_bytes: Maximum total size of summaries stored on disk
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 86400,
+        db_path: Optional[Path] = None,
+        max_db_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_db_bytes = max_db_bytes
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if db_path is not None:
+            self._open_db()
+
+    @staticmethod
+    def make_key(content_hash: str, **params) -> str:
+        """
+        Build a cache key from a document hash and the summary parameters.
+
+        Args:
+            content_hash: Hex digest of the document bytes
+            **params: Model name, prompt and any other generation parameters
+
+        Returns:
+            Hex digest identifying the (document, parameters) pair
+        """
+        material = json.dumps({"doc": content_hash, **params}, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _open_db(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " key TEXT PRIMARY KEY,"
+            " summary TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_summaries_accessed ON summaries (accessed_at)")
+        self._db.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def _remember(self, key: str, summary: str, created_at: float):
+        self._memory[key] = (summary, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT summary, created_at FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1], now):
+                self._db.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return row[0], row[1]
+
+    def _db_set(self, key: str, summary: str, now: float):
+        size = len(summary.encode("utf-8"))
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, summary, size, now, now),
+            )
+            if self.ttl:
+                self._db.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl,))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+            if total > self.max_db_bytes:
+                # Evict least recently used entries until back under the cap
+                for old_key, old_size in self._db.execute(
+                    "SELECT key, size FROM summaries ORDER BY accessed_at ASC"
+                ).fetchall():
+                    if total <= self.max_db_bytes:
+                        break
+                    self._db.execute("DELETE FROM summaries WHERE key = ?", (old_key,))
+                    total -= old_size
+            self._db.commit()
+
+    async def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached summary.
+
+        Args:
+            key: Key built with make_key
+
+        Returns:
+            The cached summary, or None on a miss
+        """
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            del self._memory[key]
+        if self._db is not None:
+            entry = await asyncio.to_thread(self._db_get, key, now)
+            if entry is not None:
+                self._remember(key, *entry)
+                self.hits += 1
+                return entry[0]
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, summary: str):
+        """
+        Store a summary in every configured tier.
+
+        Args:
+            key: Key built with make_key
+            summary: Generated summary text
+        """
+        now = time.time()
+        self._remember(key, summary, now)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, summary, now)
+
+    def clear(self):
+        """Drop every cached summary from all tiers."""
+        self._memory.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM summaries")
+                self._db.commit()
+
+    def close(self):
+        """Close the on-disk tier."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        """
+        Report cache usage.
+
+        Returns:
+            Hit/miss counters and the number of entries held in memory
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "disk_enabled": self._db is not None,
+        }
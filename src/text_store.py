@@ -0,0 +1,197 @@
+"""
+Persistent store of extracted PDF text.
+
+Text is stored per document (keyed by the SHA-256 of its bytes) and per
+page, zlib-compressed, in SQLite. Pages are added as they are extracted, so
+a document read partially (budget or sampled extraction) is indexed
+incrementally and later requests only extract the pages still missing. The
+store is capped in size and evicts whole documents, least recently used
+first.
+"""
+
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+
+def parse_page_ranges(spec: str, page_count: int) -> List[int]:
+    """
+    Parse a page selection such as ``"1-3,7"`` (1-based, inclusive).
+
+    Args:
+        spec: Comma-separated page numbers and ranges; open ranges such as
+            ``"5-"`` run to the last page
+        page_count: Number of pages in the document
+
+    Returns:
+        Sorted zero-based page indices
+
+    Raises:
+        ValueError: If the selection is malformed or out of range
+    """
+    indices = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        start = int(first)
+        end = (int(last) if last else page_count) if dash else start
+        if start < 1 or end > page_count or start > end:
+            raise ValueError(f"Page range {part!r} is outside 1-{page_count}")
+        indices.update(range(start - 1, end))
+    return sorted(indices)
+
+
+class TextStore:
+    """
+    SQLite-backed per-page text store with LRU eviction.
+
+    Args:
+        db_path: SQLite database file
+        max_bytes: Maximum total size of the stored (compressed) text
+    """
+
+    def __init__(self, db_path: Path, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self.page_hits = 0
+        self.page_misses = 0
+        self.evictions = 0
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " sha256 TEXT PRIMARY KEY,"
+                " page_count INTEGER NOT NULL,"
+                " size INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " sha256 TEXT NOT NULL,"
+                " page INTEGER NOT NULL,"
+                " text BLOB NOT NULL,"
+                " PRIMARY KEY (sha256, page)) WITHOUT ROWID"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_documents_accessed ON documents (accessed_at)")
+            self._db.commit()
+
+    def document(self, sha256: str) -> Optional[dict]:
+        """
+        Describe a stored document.
+
+        Returns:
+            Page count, number of pages stored and stored size, or None if
+            the document is unknown
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT page_count, size, created_at, accessed_at FROM documents WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if row is None:
+                return None
+            stored = self._db.execute("SELECT COUNT(*) FROM pages WHERE sha256 = ?", (sha256,)).fetchone()[0]
+        return {
+            "sha256": sha256,
+            "page_count": row[0],
+            "pages_stored": stored,
+            "size": row[1],
+            "created_at": row[2],
+            "accessed_at": row[3],
+        }
+
+    def get_pages(self, sha256: str, pages: Optional[Sequence[int]] = None) -> Dict[int, str]:
+        """
+        Read stored page texts.
+
+        Args:
+            sha256: Document hash
+            pages: Zero-based page indices to read; None reads every stored page
+
+        Returns:
+            Text of the requested pages that are stored, by page index
+        """
+        with self._lock:
+            if pages is None:
+                rows = self._db.execute("SELECT page, text FROM pages WHERE sha256 = ?", (sha256,)).fetchall()
+            else:
+                rows = []
+                for start in range(0, len(pages), 500):
+                    batch = list(pages[start:start + 500])
+                    rows += self._db.execute(
+                        f"SELECT page, text FROM pages WHERE sha256 = ? AND page IN ({','.join('?' * len(batch))})",
+                        (sha256, *batch),
+                    ).fetchall()
+        found = {page: zlib.decompress(text).decode("utf-8") for page, text in rows}
+        if pages is not None:
+            self.page_hits += len(found)
+            self.page_misses += len(pages) - len(found)
+        return found
+
+    def put_pages(self, sha256: str, page_count: int, pages: Dict[int, str]):
+        """
+        Add extracted pages of a document, evicting old documents if over the size cap.
+
+        Args:
+            sha256: Document hash
+            page_count: Number of pages in the document
+            pages: Page texts by zero-based index
+        """
+        now = time.time()
+        rows = [(sha256, page, zlib.compress(text.encode("utf-8"), 1)) for page, text in pages.items()]
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO documents (sha256, page_count, size, created_at, accessed_at) VALUES (?, ?, 0, ?, ?)"
+                " ON CONFLICT (sha256) DO UPDATE SET accessed_at = excluded.accessed_at",
+                (sha256, page_count, now, now),
+            )
+            added = 0
+            for row in rows:
+                cursor = self._db.execute("INSERT OR IGNORE INTO pages (sha256, page, text) VALUES (?, ?, ?)", row)
+                added += len(row[2]) if cursor.rowcount else 0
+            self._db.execute("UPDATE documents SET size = size + ? WHERE sha256 = ?", (added, sha256))
+            self._evict(keep=sha256)
+            self._db.commit()
+
+    def _evict(self, keep: str):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for old_hash, old_size in self._db.execute(
+            "SELECT sha256, size FROM documents WHERE sha256 != ? ORDER BY accessed_at ASC", (keep,)
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM pages WHERE sha256 = ?", (old_hash,))
+            self._db.execute("DELETE FROM documents WHERE sha256 = ?", (old_hash,))
+            total -= old_size
+            self.evictions += 1
+
+    def touch(self, sha256: str):
+        """Mark a document as recently used."""
+        with self._lock:
+            self._db.execute("UPDATE documents SET accessed_at = ? WHERE sha256 = ?", (time.time(), sha256))
+            self._db.commit()
+
+    def stats(self) -> dict:
+        """Report store size and page hit/miss counters."""
+        with self._lock:
+            documents, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents").fetchone()
+        return {
+            "documents": documents,
+            "size": size,
+            "max_bytes": self.max_bytes,
+            "page_hits": self.page_hits,
+            "page_misses": self.page_misses,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
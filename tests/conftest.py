@@ -0,0 +1,155 @@
+"""Shared fixtures for the GenAI Agent test suite."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def pytest_configure(config):
+    # pytest.ini registers these too, but its [tool:pytest] header is only read from setup.cfg
+    config.addinivalue_line("markers", "slow: marks tests as slow (deselect with '-m \"not slow\"')")
+
+
+class LocalFileServer:
+    """
+    Minimal in-process HTTP server serving canned responses by path.
+
+    Honours If-None-Match for routes with an ETag and Range/If-Range for
+    routes sent with ``Accept-Ranges: bytes``. ``drop_after`` makes the next
+    response for a path close the connection after that many body bytes.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.faults = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.command, self.path, dict(self.headers)))
+                status, headers, body = server.routes.get(self.path, (404, {}, b"not found"))
+                headers = dict(headers)
+                etag = headers.get("ETag")
+                if etag is not None and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                requested = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                if (
+                    status == 200
+                    and requested
+                    and headers.get("Accept-Ranges") == "bytes"
+                    and if_range in (None, etag, headers.get("Last-Modified"))
+                ):
+                    first, _, last = requested[len("bytes="):].partition("-")
+                    first = int(first)
+                    last = min(int(last), len(body) - 1) if last else len(body) - 1
+                    if first >= len(body):
+                        status, headers, body = 416, {"Content-Range": f"bytes */{len(body)}"}, b""
+                    else:
+                        headers["Content-Range"] = f"bytes {first}-{last}/{len(body)}"
+                        status, body = 206, body[first:last + 1]
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                drop_after = server.faults.pop(self.path, None)
+                if drop_after is not None:
+                    self.wfile.write(body[:drop_after])
+                    self.wfile.flush()
+                    # Give the client time to consume the bytes before the connection drops
+                    time.sleep(0.2)
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def add(self, path: str, body: bytes, status: int = 200, headers=None, drop_after=None):
+        self.routes[path] = (status, headers or {}, body)
+        if drop_after is not None:
+            self.faults[path] = drop_after
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def make_pdf(pages) -> bytes:
+    """
+    Build a minimal text PDF.
+
+    Args:
+        pages: Text for each page (one line per page)
+
+    Returns:
+        PDF document bytes
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for text in pages:
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        content = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+@pytest.fixture
+def file_server():
+    """Local HTTP server for download tests."""
+    server = LocalFileServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def pdf_factory():
+    """Factory building text PDFs from a list of page strings."""
+    return make_pdf
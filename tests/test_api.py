@@ -1,111 +1,192 @@
 import pytest
+import json
 import os
+import time
 import tempfile
 from pathlib import Path
-from unittest.mock import patch, MagicMock, mock_open
+from unittest.mock import patch, AsyncMock, MagicMock, mock_open
 from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
 import io
 
 # Import the app
-from src.main import app
+from src.main import app, upload_limits
 
 # Create test client
 client = TestClient(app)
 
+
+@pytest.fixture(autouse=True, scope="module")
+def app_lifespan():
+    """Run the application lifespan so shared clients are started once"""
+    with client:
+        yield
+
+
+@pytest.fixture(autouse=True)
+def empty_text_store(tmp_path_factory, monkeypatch):
+    """Give every test its own extracted-text store"""
+    from src.main import extraction_pool
+    from src.text_store import TextStore
+    store = TextStore(tmp_path_factory.mktemp("text_store") / "text.db")
+    monkeypatch.setattr('src.main.text_store', store)
+    monkeypatch.setattr(extraction_pool, 'store', store)
+    yield store
+    store.close()
+
+@pytest.fixture(autouse=True)
+def unlimited_rates(monkeypatch):
+    """Lift per-client rate limits and in-flight caps; rate-limit tests set their own"""
+    from src.main import rate_limiter
+    from src.rate_limit import EndpointLimit, MemoryBuckets
+    monkeypatch.setattr(rate_limiter, 'buckets', MemoryBuckets())
+    for group in rate_limiter.limits:
+        monkeypatch.setitem(rate_limiter.limits, group, EndpointLimit(per_minute=0, burst=0))
+    return rate_limiter
+
+@pytest.fixture(autouse=True)
+def pypdf2_backend(monkeypatch):
+    """Read PDFs with PyPDF2 alone, whichever backends are installed, so tests can mock its reader"""
+    from src.main import extraction_pool
+    from src.pdf_backends import BackendSelector
+    monkeypatch.setattr(extraction_pool, 'backends', BackendSelector("pypdf2", fallback=()))
+    return extraction_pool.backends
+
 class TestDownloadEndpoint:
     """Test cases for the /download endpoint"""
     
-    @patch('src.main.requests.get')
-    def test_download_file_success(self, mock_get):
+    @pytest.fixture(autouse=True)
+    def tmp_download_dir(self, tmp_path, monkeypatch):
+        """Write downloads into a temporary directory"""
+        monkeypatch.setattr('src.main.download_dir', tmp_path)
+        return tmp_path
+    
+    def test_download_file_success(self, file_server, tmp_download_dir):
         """Test successful file download"""
-        # Mock response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.headers = {}
-        mock_response.iter_content.return_value = [b'test content']
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+        file_server.add('/test.txt', b'test content')
         
-        # Test URL
-        test_url = "https://example.com/test.txt"
-        
-        with patch('builtins.open', mock_open()) as mock_file:
-            response = client.post("/download", params={"url": test_url})
+        response = client.post("/download", params={"url": file_server.url('/test.txt')})
         
         assert response.status_code == 200
         data = response.json()
         assert "message" in data
         assert "file_path" in data
         assert "test.txt" in data["file_path"]
-        
-        # Verify requests.get was called with correct URL
-        mock_get.assert_called_once_with(test_url, stream=True)
+        assert (tmp_download_dir / "test.txt").read_bytes() == b'test content'
     
-    @patch('src.main.requests.get')
-    def test_download_file_with_content_disposition(self, mock_get):
+    def test_download_file_with_content_disposition(self, file_server):
         """Test file download with Content-Disposition header"""
-        # Mock response with Content-Disposition header
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.headers = {'content-disposition': 'attachment; filename="custom_name.pdf"'}
-        mock_response.iter_content.return_value = [b'pdf content']
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
-        
-        test_url = "https://example.com/document"
+        file_server.add(
+            '/document',
+            b'pdf content',
+            headers={'Content-Disposition': 'attachment; filename="custom_name.pdf"'},
+        )
         
-        with patch('builtins.open', mock_open()) as mock_file:
-            response = client.post("/download", params={"url": test_url})
+        response = client.post("/download", params={"url": file_server.url('/document')})
         
         assert response.status_code == 200
         data = response.json()
         assert "custom_name.pdf" in data["file_path"]
     
-    @patch('src.main.requests.get')
-    def test_download_file_request_error(self, mock_get):
-        """Test download failure due to request error"""
-        # Mock request exception
-        mock_get.side_effect = Exception("Network error")
+    def test_download_file_large_body_is_chunked(self, file_server, tmp_download_dir, monkeypatch):
+        """Test that bodies larger than the chunk size are written completely"""
+        monkeypatch.setattr('src.main.settings.download_chunk_size', 1024)
+        body = bytes(range(256)) * 1000
+        file_server.add('/large.bin', body)
+        
+        response = client.post("/download", params={"url": file_server.url('/large.bin')})
+        
+        assert response.status_code == 200
+        assert (tmp_download_dir / "large.bin").read_bytes() == body
+    
+    def test_download_reuses_pooled_connections(self, file_server):
+        """Test that repeated downloads from one host reuse a pooled connection"""
+        from src.main import http_pool
+        file_server.add('/a.txt', b'a')
+        file_server.add('/b.txt', b'b')
+        before = http_pool.stats()
+        
+        assert client.post("/download", params={"url": file_server.url('/a.txt')}).status_code == 200
+        assert client.post("/download", params={"url": file_server.url('/b.txt')}).status_code == 200
+        
+        stats = client.get("/download/pool").json()
+        assert stats["pool_hits"] > before["pool_hits"]
+        assert stats["limit_per_host"] == http_pool.limit_per_host
+    
+    def test_download_unchanged_file_served_from_index(self, file_server, tmp_download_dir):
+        """Test that a repeat download of an unchanged URL does not transfer the body"""
+        file_server.add('/index.pdf', b'indexed body', headers={'ETag': '"abc"'})
+        
+        first = client.post("/download", params={"url": file_server.url('/index.pdf')})
+        second = client.post("/download", params={"url": file_server.url('/index.pdf')})
         
-        test_url = "https://invalid-url.com/file.txt"
+        assert first.json()["cached"] is False
+        assert second.status_code == 200
+        data = second.json()
+        assert data["cached"] is True
+        assert data["file_path"] == first.json()["file_path"]
+        assert data["sha256"] == first.json()["sha256"]
+        assert file_server.requests[-1][2].get('If-None-Match') == '"abc"'
+    
+    def test_download_file_request_error(self):
+        """Test download failure due to request error"""
+        test_url = "http://127.0.0.1:1/file.txt"
         
         response = client.post("/download", params={"url": test_url})
         
         assert response.status_code == 400
-        assert "Network error" in response.json()["detail"]
+        assert "detail" in response.json()
     
-    @patch('src.main.requests.get')
-    def test_download_file_http_error(self, mock_get):
+    def test_download_file_http_error(self, file_server):
         """Test download failure due to HTTP error"""
-        # Mock HTTP error
-        mock_response = MagicMock()
-        mock_response.raise_for_status.side_effect = Exception("404 Not Found")
-        mock_get.return_value = mock_response
-        
-        test_url = "https://example.com/nonexistent.txt"
+        test_url = file_server.url('/nonexistent.txt')
         
         response = client.post("/download", params={"url": test_url})
         
         assert response.status_code == 400
-        assert "404 Not Found" in response.json()["detail"]
+        assert "404" in response.json()["detail"]
+
+    def test_download_over_quota_reports_storage(self, file_server, tmp_download_dir, monkeypatch):
+        """Test that a download that cannot fit is refused with 507 and counted in /download/storage"""
+        from src.main import downloader
+        from src.storage import DownloadStorage
+        storage = DownloadStorage(tmp_download_dir, max_bytes=10)
+        monkeypatch.setattr('src.main.download_storage', storage)
+        monkeypatch.setattr(downloader, 'storage', storage)
+        file_server.add('/huge.bin', b'x' * 100)
+
+        response = client.post("/download", params={"url": file_server.url('/huge.bin')})
+
+        assert response.status_code == 507
+        stats = client.get("/download/storage").json()
+        assert stats["rejected"] == 1
+        assert stats["max_bytes"] == 10
+        assert stats["used_bytes"] == 0
 
 
 class TestSummarizeEndpoint:
     """Test cases for the /summarize endpoint"""
     
+    @pytest.fixture(autouse=True)
+    def empty_summary_cache(self):
+        """Start every test with an empty summary cache and a fresh Gemini client"""
+        from src.main import gemini_client, summary_cache
+        summary_cache.clear()
+        gemini_client.reset()
+        yield
+        summary_cache.clear()
+        gemini_client.reset()
+    
     def create_test_pdf_content(self):
         """Create mock PDF content for testing"""
         return b"%PDF-1.4\n1 0 obj\n<<\n/Type /Catalog\n/Pages 2 0 R\n>>\nendobj\n"
     
-    @patch('src.main.genai.GenerativeModel')
-    @patch('src.main.genai.configure')
-    @patch('src.main.PdfReader')
-    @patch('src.main.os.getenv')
-    def test_summarize_pdf_success(self, mock_getenv, mock_pdf_reader, mock_configure, mock_model_class):
-        """Test successful PDF summarization"""
-        # Mock environment variable
-        mock_getenv.return_value = "fake_api_key"
-        
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.pdf_backends.PdfReader')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_pdf_success(self, mock_pdf_reader, mock_configure, mock_model_class):
+        """Test successful PDF summarization"""        
         # Mock PDF reader
         mock_page = MagicMock()
         mock_page.extract_text.return_value = "This is test PDF content."
@@ -117,40 +198,62 @@ class TestSummarizeEndpoint:
         mock_response = MagicMock()
         mock_response.text = "This is a summary of the PDF content."
         mock_model = MagicMock()
-        mock_model.generate_content.return_value = mock_response
+        mock_model.generate_content_async = AsyncMock(return_value=mock_response)
         mock_model_class.return_value = mock_model
         
         # Create test file
         pdf_content = self.create_test_pdf_content()
         
-        with patch('tempfile.NamedTemporaryFile') as mock_temp:
-            mock_temp_file = MagicMock()
-            mock_temp_file.name = "/tmp/test.pdf"
-            mock_temp_file.__enter__.return_value = mock_temp_file
-            mock_temp.return_value = mock_temp_file
-            
-            with patch('src.main.os.unlink'):
-                response = client.post(
-                    "/summarize",
-                    files={"file": ("test.pdf", pdf_content, "application/pdf")}
-                )
+        response = client.post(
+            "/summarize",
+            files={"file": ("test.pdf", pdf_content, "application/pdf")}
+        )
         
         assert response.status_code == 200
         data = response.json()
         assert "summary" in data
         assert data["summary"] == "This is a summary of the PDF content."
+        assert data["cache"] == "miss"
+        assert response.headers["X-Cache"] == "MISS"
         
         # Verify Gemini was configured and called
         mock_configure.assert_called_once_with(api_key="fake_api_key")
         mock_model_class.assert_called_once_with('gemini-pro')
-        mock_model.generate_content.assert_called_once()
+        mock_model.generate_content_async.assert_awaited_once()
     
-    @patch('src.main.os.getenv')
-    def test_summarize_pdf_missing_api_key(self, mock_getenv):
-        """Test PDF summarization with missing API key"""
-        # Mock missing API key
-        mock_getenv.return_value = None
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.pdf_backends.PdfReader')
+    def test_summarize_pdf_cache_hit(self, mock_pdf_reader, mock_configure, mock_model_class):
+        """Test that re-uploading the same document is served from the cache"""
+        mock_page = MagicMock()
+        mock_page.extract_text.return_value = "Cached content."
+        mock_pdf_reader.return_value.pages = [mock_page]
+        mock_model = MagicMock()
+        mock_model.generate_content_async = AsyncMock(return_value=MagicMock(text="Cached summary."))
+        mock_model_class.return_value = mock_model
+        
+        pdf_content = self.create_test_pdf_content()
+        files = {"file": ("test.pdf", pdf_content, "application/pdf")}
+        
+        first = client.post("/summarize", files=files)
+        second = client.post("/summarize", files=files)
         
+        assert first.json()["cache"] == "miss"
+        assert second.status_code == 200
+        assert second.json() == {
+            "summary": "Cached summary.",
+            "cache": "hit",
+            "pages_read": 0,
+            "sha256": first.json()["sha256"],
+        }
+        assert second.headers["X-Cache"] == "HIT"
+        mock_model.generate_content_async.assert_awaited_once()
+        mock_pdf_reader.assert_called_once()
+    
+    @patch('src.main.gemini_client.api_key', None)
+    def test_summarize_pdf_missing_api_key(self):
+        """Test PDF summarization with missing API key"""        
         pdf_content = self.create_test_pdf_content()
         
         response = client.post(
@@ -160,41 +263,29 @@ class TestSummarizeEndpoint:
         
         assert response.status_code == 400
     
-    @patch('src.main.PdfReader')
-    @patch('src.main.os.getenv')
-    def test_summarize_pdf_reader_error(self, mock_getenv, mock_pdf_reader):
-        """Test PDF summarization with PDF reading error"""
-        # Mock environment variable
-        mock_getenv.return_value = "fake_api_key"
-        
+    @patch('src.pdf_backends.PdfReader')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_pdf_reader_error(self, mock_pdf_reader):
+        """Test PDF summarization with PDF reading error"""        
         # Mock PDF reader error
         mock_pdf_reader.side_effect = Exception("Invalid PDF format")
         
         pdf_content = self.create_test_pdf_content()
         
-        with patch('tempfile.NamedTemporaryFile') as mock_temp:
-            mock_temp_file = MagicMock()
-            mock_temp_file.name = "/tmp/test.pdf"
-            mock_temp_file.__enter__.return_value = mock_temp_file
-            mock_temp.return_value = mock_temp_file
-            
-            response = client.post(
-                "/summarize",
-                files={"file": ("test.pdf", pdf_content, "application/pdf")}
-            )
+        response = client.post(
+            "/summarize",
+            files={"file": ("test.pdf", pdf_content, "application/pdf")}
+        )
         
         assert response.status_code == 400
         assert "Invalid PDF format" in response.json()["detail"]
     
-    @patch('src.main.genai.GenerativeModel')
-    @patch('src.main.genai.configure')
-    @patch('src.main.PdfReader')
-    @patch('src.main.os.getenv')
-    def test_summarize_pdf_gemini_error(self, mock_getenv, mock_pdf_reader, mock_configure, mock_model_class):
-        """Test PDF summarization with Gemini API error"""
-        # Mock environment variable
-        mock_getenv.return_value = "fake_api_key"
-        
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.pdf_backends.PdfReader')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_pdf_gemini_error(self, mock_pdf_reader, mock_configure, mock_model_class):
+        """Test PDF summarization with Gemini API error"""        
         # Mock PDF reader
         mock_page = MagicMock()
         mock_page.extract_text.return_value = "Test content"
@@ -204,26 +295,292 @@ class TestSummarizeEndpoint:
         
         # Mock Gemini error
         mock_model = MagicMock()
-        mock_model.generate_content.side_effect = Exception("Gemini API error")
+        mock_model.generate_content_async = AsyncMock(side_effect=Exception("Gemini API error"))
         mock_model_class.return_value = mock_model
         
         pdf_content = self.create_test_pdf_content()
         
-        with patch('tempfile.NamedTemporaryFile') as mock_temp:
-            mock_temp_file = MagicMock()
-            mock_temp_file.name = "/tmp/test.pdf"
-            mock_temp_file.__enter__.return_value = mock_temp_file
-            mock_temp.return_value = mock_temp_file
-            
-            with patch('src.main.os.unlink'):
-                response = client.post(
-                    "/summarize",
-                    files={"file": ("test.pdf", pdf_content, "application/pdf")}
-                )
+        response = client.post(
+            "/summarize",
+            files={"file": ("test.pdf", pdf_content, "application/pdf")}
+        )
         
         assert response.status_code == 400
         assert "Gemini API error" in response.json()["detail"]
     
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    def test_summarize_pdf_reports_pages_read(self, mock_configure, mock_model_class, pdf_factory, monkeypatch):
+        """Test that budgeted extraction stops early and reports the pages read"""
+        monkeypatch.setattr('src.main.prompt_builder.max_tokens', 42)
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Summary."))
+        pdf_content = pdf_factory(["x" * 100 for _ in range(10)])
+        files = {"file": ("long.pdf", pdf_content, "application/pdf")}
+        
+        budget = client.post("/summarize", files=files).json()
+        full = client.post("/summarize", params={"extraction": "full"}, files=files).json()
+        
+        assert budget["page_count"] == 10
+        assert budget["pages_read"] == 3
+        assert full["pages_read"] == 10
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    def test_summarize_prompt_is_cleaned_and_budgeted(self, mock_configure, mock_model_class, pdf_factory, monkeypatch):
+        """Test that the prompt fits the token budget and leaves out whitespace runs"""
+        monkeypatch.setattr('src.main.prompt_builder.max_tokens', 40)
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Summary."))
+        pdf_content = pdf_factory([f"Finding   number {i}   of   the   study" for i in range(20)])
+        
+        data = client.post("/summarize", files={"file": ("study.pdf", pdf_content, "application/pdf")}).json()
+        
+        prompt = mock_model_class.return_value.generate_content_async.await_args.args[0]
+        assert 0 < data["prompt_tokens"] <= 40
+        assert "Finding number 0 of the study" in prompt
+        assert "   " not in prompt
+        assert "number 19" not in prompt
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    def test_summarize_pdf_map_reduce(self, mock_configure, mock_model_class, pdf_factory, monkeypatch):
+        """Test that map-reduce summarizes every page and reports stage timings"""
+        monkeypatch.setattr('src.main.settings.summary_chunk_tokens', 30)
+        mock_model = mock_model_class.return_value
+        mock_model.generate_content_async = AsyncMock(return_value=MagicMock(text="Partial."))
+        pdf_content = pdf_factory(["z" * 100 for _ in range(4)])
+        
+        response = client.post(
+            "/summarize",
+            params={"strategy": "map_reduce"},
+            files={"file": ("long.pdf", pdf_content, "application/pdf")}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["pages_read"] == 4
+        assert data["chunks"] == 4
+        assert set(data["timings"]) == {"extract", "chunk", "map", "reduce"}
+        assert mock_model.generate_content_async.await_count == 5
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    def test_summarize_reuses_gemini_client(self, mock_configure, mock_model_class, pdf_factory):
+        """Test that the SDK is configured and the model built once across requests"""
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Summary."))
+        
+        for i in range(3):
+            response = client.post(
+                "/summarize",
+                files={"file": (f"doc{i}.pdf", pdf_factory([f"document {i}"]), "application/pdf")}
+            )
+            assert response.status_code == 200
+        
+        mock_configure.assert_called_once()
+        mock_model_class.assert_called_once()
+    
+    def test_summarize_llm_queue_full(self, pdf_factory, monkeypatch):
+        """Test that a full LLM queue sheds load with 503 and Retry-After"""
+        from src.llm import LLMBusyError
+        
+        async def busy(prompt):
+            raise LLMBusyError("LLM request queue is full", retry_after=5)
+        
+        monkeypatch.setattr('src.main.gemini_client.generate_text', busy)
+        
+        response = client.post(
+            "/summarize",
+            files={"file": ("busy.pdf", pdf_factory(["busy"]), "application/pdf")}
+        )
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+    
+    def test_summarize_invalid_extraction_mode(self):
+        """Test that unknown extraction modes are rejected"""
+        response = client.post(
+            "/summarize",
+            params={"extraction": "everything"},
+            files={"file": ("test.pdf", self.create_test_pdf_content(), "application/pdf")}
+        )
+        
+        assert response.status_code == 422
+
+    def test_summarize_rejects_missing_pdf_backend(self, pypdf2_backend, monkeypatch):
+        """Test that a backend whose library is not installed is rejected before the upload is read"""
+        monkeypatch.setattr(pypdf2_backend, 'available', ["pypdf2"])
+
+        response = client.post(
+            "/summarize",
+            params={"pdf_backend": "pdfium"},
+            files={"file": ("test.pdf", self.create_test_pdf_content(), "application/pdf")}
+        )
+
+        assert response.status_code == 422
+        assert "not installed" in response.json()["detail"]
+
+    def test_summary_cache_key_includes_pdf_backend(self, pypdf2_backend):
+        """Test that a summary is cached per backend, the configured one standing in for no choice"""
+        from src.main import summary_cache_key
+        
+        default = summary_cache_key("0" * 64, "budget", "single")
+        
+        assert summary_cache_key("0" * 64, "budget", "single", "pypdf2") == default
+        assert summary_cache_key("0" * 64, "budget", "single", "pdfium") != default
+
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_reports_pdf_backend_throughput(self, mock_configure, mock_model_class, pdf_factory):
+        """Test that the backend used is reported with the summary and its throughput at /extraction/backends"""
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Summary."))
+        files = {"file": ("doc.pdf", pdf_factory(["one", "two"]), "application/pdf")}
+
+        response = client.post("/summarize", params={"extraction": "full", "pdf_backend": "pypdf2"}, files=files)
+
+        assert response.status_code == 200
+        assert response.json()["pdf_backend"] == "pypdf2"
+        report = client.get("/extraction/backends").json()
+        assert report["chain"] == ["pypdf2"]
+        assert report["backends"]["pypdf2"]["installed"] is True
+        assert report["backends"]["pypdf2"]["pages"] == 2
+        assert report["backends"]["pypdf2"]["pages_per_second"] > 0
+
+    @patch('src.pdf_backends.PdfReader')
+    def test_summarize_pdf_parses_upload_stream(self, mock_pdf_reader):
+        """Test that the PDF is parsed from the upload stream without a temp file"""
+        mock_pdf_reader.side_effect = Exception("stop after parse")
+        pdf_content = self.create_test_pdf_content()
+        
+        with patch('tempfile.NamedTemporaryFile') as mock_temp:
+            client.post("/summarize", files={"file": ("test.pdf", pdf_content, "application/pdf")})
+        
+        mock_temp.assert_not_called()
+        stream = mock_pdf_reader.call_args[0][0]
+        assert hasattr(stream, "read")
+    
+    def test_summarize_upload_too_large(self, monkeypatch):
+        """Test that uploads over the configured maximum are rejected"""
+        monkeypatch.setattr('src.main.settings.max_upload_bytes', 16)
+        
+        response = client.post(
+            "/summarize",
+            files={"file": ("big.pdf", b"%PDF-1.4" + b"0" * 64, "application/pdf")}
+        )
+        
+        assert response.status_code == 413
+    
+    @patch('src.main.ingest_upload', new_callable=AsyncMock)
+    def test_oversized_upload_is_rejected_before_parsing(self, mock_ingest, monkeypatch):
+        """Test that a body over the limit is refused from its Content-Length, or as soon as it passes the limit"""
+        monkeypatch.setitem(upload_limits, "/summarize", 1000)
+        
+        declared = client.post("/summarize", files={"file": ("big.pdf", b"%PDF-1.4" + b"0" * 2000, "application/pdf")})
+        chunked = client.post(
+            "/summarize",
+            content=iter([b"0" * 600, b"0" * 600]),
+            headers={"Content-Type": "multipart/form-data; boundary=x"},
+        )
+        
+        assert declared.status_code == 413
+        assert chunked.status_code == 413
+        assert "1000 bytes" in chunked.json()["detail"]
+        mock_ingest.assert_not_called()
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_by_file_path(self, mock_configure, mock_model_class, pdf_factory, tmp_path, monkeypatch):
+        """Test summarizing a previously downloaded file without uploading it"""
+        monkeypatch.setattr('src.main.download_dir', tmp_path)
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Local summary."))
+        (tmp_path / "stored.pdf").write_bytes(pdf_factory(["Stored on the server."]))
+        
+        response = client.post("/summarize", params={"file_path": "stored.pdf"})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["summary"] == "Local summary."
+        assert data["file_path"] == str((tmp_path / "stored.pdf").resolve())
+        prompt = mock_model_class.return_value.generate_content_async.await_args.args[0]
+        assert "Stored on the server." in prompt
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_stores_page_text(self, mock_configure, mock_model_class, pdf_factory, empty_text_store):
+        """Test that extracted pages are stored and can be fetched by document hash"""
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Summary."))
+        pdf = pdf_factory(["Intro page.", "Methods page.", "Results page."])
+        
+        first = client.post("/summarize", files={"file": ("doc.pdf", pdf, "application/pdf")}, params={"extraction": "full"})
+        sha256 = first.json()["sha256"]
+        # A different strategy misses the summary cache but reuses the stored pages
+        second = client.post("/summarize", files={"file": ("doc.pdf", pdf, "application/pdf")}, params={"extraction": "budget"})
+        document = client.get(f"/documents/{sha256}")
+        text = client.get(f"/documents/{sha256}/text", params={"pages": "2-3"})
+        
+        assert first.json()["pages_from_store"] == 0
+        assert second.json()["pages_from_store"] == 3
+        assert document.json()["page_count"] == 3
+        assert document.json()["pages_stored"] == 3
+        assert text.json()["pages"] == [
+            {"page": 2, "text": "Methods page."},
+            {"page": 3, "text": "Results page."},
+        ]
+        assert text.json()["missing"] == []
+    
+    def test_document_text_lists_missing_pages(self, empty_text_store):
+        """Test that pages never extracted are reported as missing"""
+        empty_text_store.put_pages("ab" * 32, 4, {0: "first"})
+        
+        response = client.get(f"/documents/{'ab' * 32}/text")
+        
+        assert response.status_code == 200
+        assert response.json()["pages"] == [{"page": 1, "text": "first"}]
+        assert response.json()["missing"] == [2, 3, 4]
+    
+    def test_document_endpoints_errors(self, empty_text_store):
+        """Test unknown documents and invalid page selections"""
+        empty_text_store.put_pages("cd" * 32, 2, {0: "first"})
+        
+        assert client.get(f"/documents/{'ef' * 32}").status_code == 404
+        assert client.get(f"/documents/{'cd' * 32}/text", params={"pages": "3"}).status_code == 422
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_by_url(self, mock_configure, mock_model_class, pdf_factory, file_server, tmp_path, monkeypatch):
+        """Test that a URL is downloaded and summarized server-side"""
+        monkeypatch.setattr('src.main.download_dir', tmp_path)
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Remote summary."))
+        file_server.add('/remote.pdf', pdf_factory(["Fetched by the server."]))
+        
+        response = client.post("/summarize", params={"url": file_server.url('/remote.pdf')})
+        
+        assert response.status_code == 200
+        assert response.json()["summary"] == "Remote summary."
+        assert (tmp_path / "remote.pdf").exists()
+    
+    def test_summarize_rejects_path_outside_downloads(self, tmp_path, monkeypatch):
+        """Test that file_path cannot escape the downloads directory"""
+        monkeypatch.setattr('src.main.download_dir', tmp_path / "downloads")
+        (tmp_path / "downloads").mkdir()
+        (tmp_path / "secret.pdf").write_bytes(b"%PDF")
+        
+        response = client.post("/summarize", params={"file_path": "../secret.pdf"})
+        
+        assert response.status_code == 400
+    
+    def test_summarize_requires_exactly_one_source(self, tmp_path):
+        """Test that combining an upload with a file_path is rejected"""
+        response = client.post(
+            "/summarize",
+            params={"file_path": "doc.pdf"},
+            files={"file": ("doc.pdf", b"%PDF", "application/pdf")},
+        )
+        
+        assert response.status_code == 422
+    
     def test_summarize_no_file(self):
         """Test summarization endpoint without file"""
         response = client.post("/summarize")
@@ -240,6 +597,418 @@ class TestSummarizeEndpoint:
         assert response.status_code == 400
 
 
+class FakeStream:
+    """Async iterable standing in for a streaming Gemini response"""
+    
+    def __init__(self, fragments):
+        self.fragments = fragments
+    
+    def __aiter__(self):
+        return self._iterate()
+    
+    async def _iterate(self):
+        for fragment in self.fragments:
+            yield MagicMock(text=fragment)
+
+
+class TestSummarizeStreamEndpoint:
+    """Test cases for the /summarize/stream endpoint"""
+    
+    @pytest.fixture(autouse=True)
+    def fresh_state(self):
+        """Start every test with an empty summary cache and a fresh Gemini client"""
+        from src.main import gemini_client, summary_cache
+        summary_cache.clear()
+        gemini_client.reset()
+        yield
+        summary_cache.clear()
+        gemini_client.reset()
+    
+    @staticmethod
+    def read_events(response):
+        """Parse an SSE body into (event, data) pairs"""
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            event = "message"
+            data = None
+            for line in block.split("\n"):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+            events.append((event, data))
+        return events
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    def test_stream_forwards_fragments(self, mock_configure, mock_model_class, pdf_factory):
+        """Test that generated fragments are relayed as SSE messages"""
+        mock_model = mock_model_class.return_value
+        mock_model.generate_content_async = AsyncMock(return_value=FakeStream(["Hello ", "streaming ", "world."]))
+        files = {"file": ("doc.pdf", pdf_factory(["Some content"]), "application/pdf")}
+        
+        response = client.post("/summarize/stream", files=files)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = self.read_events(response)
+        assert [data["text"] for event, data in events if event == "message"] == ["Hello ", "streaming ", "world."]
+        assert events[-1] == ("done", {"cache": "miss", "pages_read": 1, "page_count": 1})
+        assert mock_model.generate_content_async.await_args.kwargs == {"stream": True}
+        
+        # The assembled summary is cached for the non-streaming endpoint's key
+        replay = client.post("/summarize/stream", files=files)
+        assert self.read_events(replay)[0] == ("message", {"text": "Hello streaming world."})
+        assert replay.headers["X-Cache"] == "HIT"
+    
+    def test_stream_busy_before_first_token(self, pdf_factory, monkeypatch):
+        """Test that a full LLM queue is reported as 503 before streaming starts"""
+        from src.llm import LLMBusyError
+        
+        async def busy(prompt):
+            raise LLMBusyError("LLM request queue is full", retry_after=2)
+            yield
+        
+        monkeypatch.setattr('src.main.gemini_client.stream_text', busy)
+        
+        response = client.post(
+            "/summarize/stream",
+            files={"file": ("doc.pdf", pdf_factory(["Some content"]), "application/pdf")}
+        )
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "2"
+
+
+class TestBatchEndpoints:
+    """Test cases for /download/batch and /summarize/batch"""
+    
+    @pytest.fixture(autouse=True)
+    def fresh_state(self, tmp_path, monkeypatch):
+        """Use a temporary downloads directory, an empty summary cache and a fresh Gemini client"""
+        from src.main import gemini_client, summary_cache
+        monkeypatch.setattr('src.main.download_dir', tmp_path)
+        summary_cache.clear()
+        gemini_client.reset()
+        yield tmp_path
+        summary_cache.clear()
+        gemini_client.reset()
+    
+    @staticmethod
+    def read_lines(response):
+        return [json.loads(line) for line in response.text.splitlines() if line]
+    
+    def test_download_batch_isolates_failures(self, file_server, fresh_state):
+        """Test that every URL gets its own result line and one failure does not abort the batch"""
+        file_server.add('/a.txt', b'first')
+        file_server.add('/b.txt', b'second')
+        urls = [file_server.url('/a.txt'), file_server.url('/missing.txt'), file_server.url('/b.txt')]
+        
+        response = client.post("/download/batch", json={"urls": urls})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = sorted(self.read_lines(response), key=lambda line: line["index"])
+        assert [line["ok"] for line in lines] == [True, False, True]
+        assert [line["url"] for line in lines] == urls
+        assert lines[1]["status_code"] == 400
+        assert (fresh_state / "a.txt").read_bytes() == b'first'
+        assert (fresh_state / "b.txt").read_bytes() == b'second'
+    
+    def test_download_batch_limits(self, monkeypatch):
+        """Test that empty and oversized batches are rejected up front"""
+        monkeypatch.setattr('src.main.settings.batch_max_items', 2)
+        
+        assert client.post("/download/batch", json={"urls": []}).status_code == 422
+        assert client.post("/download/batch", json={"urls": ["a", "b", "c"]}).status_code == 413
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_batch_uploads_and_paths(self, mock_configure, mock_model_class, pdf_factory, fresh_state):
+        """Test that uploads and downloaded files are summarized with per-item errors"""
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Summary."))
+        (fresh_state / "stored.pdf").write_bytes(pdf_factory(["Stored document."]))
+        
+        response = client.post(
+            "/summarize/batch",
+            files=[
+                ("files", ("one.pdf", pdf_factory(["First upload."]), "application/pdf")),
+                ("files", ("broken.pdf", b"not a pdf", "application/pdf")),
+            ],
+            data={"file_paths": ["stored.pdf", "../outside.pdf"]},
+        )
+        
+        assert response.status_code == 200
+        lines = {line["source"]: line for line in self.read_lines(response)}
+        assert lines["one.pdf"]["ok"] is True
+        assert lines["one.pdf"]["summary"] == "Summary."
+        assert lines["stored.pdf"]["ok"] is True
+        assert lines["broken.pdf"]["ok"] is False
+        assert lines["broken.pdf"]["status_code"] == 400
+        assert lines["../outside.pdf"]["ok"] is False
+        assert lines["../outside.pdf"]["status_code"] == 400
+    
+    def test_summarize_batch_requires_items(self):
+        """Test that a batch without files or paths is rejected"""
+        response = client.post("/summarize/batch", data={"file_paths": []})
+        
+        assert response.status_code == 422
+
+
+class TestJobsEndpoint:
+    """Test cases for the /jobs endpoints"""
+    
+    @pytest.fixture(autouse=True)
+    def fresh_state(self):
+        """Start every test with an empty summary cache and a fresh Gemini client"""
+        from src.main import gemini_client, summary_cache
+        summary_cache.clear()
+        gemini_client.reset()
+        yield
+        summary_cache.clear()
+        gemini_client.reset()
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    def test_submit_and_poll_job(self, mock_configure, mock_model_class, pdf_factory):
+        """Test that a queued job is processed in the background and its result exposed"""
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Job summary."))
+        
+        response = client.post(
+            "/jobs/summarize",
+            files={"file": ("job.pdf", pdf_factory(["Queued content"]), "application/pdf")}
+        )
+        
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.json()["status_url"] == f"/jobs/{job_id}"
+        
+        for _ in range(200):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.01)
+        
+        assert job["status"] == "succeeded"
+        assert job["filename"] == "job.pdf"
+        assert job["result"]["summary"] == "Job summary."
+    
+    @pytest.mark.asyncio
+    async def test_job_payload_is_extracted_from_its_path(self, tmp_path, pdf_factory):
+        """Test that a queued job hands the payload's path to extraction instead of its bytes"""
+        from src.main import process_summary_job
+        payload = tmp_path / "payload.pdf"
+        payload.write_bytes(pdf_factory(["Queued content"]))
+        job = {
+            "payload_path": str(payload),
+            "params": {"sha256": "0" * 64, "extraction": "full", "strategy": "single"},
+        }
+        
+        with patch('src.main.run_summary', AsyncMock(return_value={"summary": "Job summary."})) as mock_run:
+            result = await process_summary_job(job)
+        
+        assert result == {"summary": "Job summary."}
+        stream = mock_run.call_args.args[0]
+        assert mock_run.call_args.kwargs["path"] == payload
+        assert stream.closed
+    
+    def test_unknown_job(self):
+        """Test that unknown job IDs return 404"""
+        assert client.get("/jobs/does-not-exist").status_code == 404
+    
+    def test_queue_full_returns_429(self, pdf_factory, monkeypatch):
+        """Test that submissions are rejected with 429 when the queue is full"""
+        from src.main import job_queue
+        monkeypatch.setattr(job_queue, 'max_pending', 0)
+        
+        response = client.post(
+            "/jobs/summarize",
+            files={"file": ("job.pdf", pdf_factory(["content"]), "application/pdf")}
+        )
+        
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+
+
+class TestHealthEndpoints:
+    """Test the health, liveness and readiness probes"""
+    
+    def test_health_serves_cached_system_metrics(self):
+        """Test /health keeps its payload and reads metrics from the sampler snapshot"""
+        with patch('src.health.psutil.virtual_memory') as mock_memory:
+            response = client.get("/health")
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "healthy"
+        assert {"timestamp", "version", "uptime", "system", "dependencies", "endpoints"} <= data.keys()
+        assert "memory_usage" in data["system"]
+        assert data["endpoints"]["livez"] == "/livez"
+        mock_memory.assert_not_called()
+    
+    def test_livez(self):
+        """Test the liveness probe"""
+        response = client.get("/livez")
+        
+        assert response.status_code == 200
+        assert response.json() == {"status": "ok"}
+    
+    def test_readyz_ready(self, tmp_path, monkeypatch):
+        """Test the readiness probe when every dependency is available"""
+        monkeypatch.setattr('src.main.download_dir', tmp_path)
+        monkeypatch.setattr('src.main.gemini_client.api_key', 'test_key')
+        
+        response = client.get("/readyz")
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ready"
+        assert all(data["checks"].values())
+    
+    def test_readyz_not_ready_while_warming_up(self, tmp_path, monkeypatch):
+        """Test the readiness probe fails until the startup warm-up has finished"""
+        monkeypatch.setattr('src.main.download_dir', tmp_path)
+        monkeypatch.setattr('src.main.gemini_client.api_key', 'test_key')
+        monkeypatch.setattr(app.state, 'warm_up', MagicMock(**{'done.return_value': False}), raising=False)
+        
+        response = client.get("/readyz")
+        
+        assert response.status_code == 503
+        assert response.json()["checks"]["warmed_up"] is False
+    
+    def test_readyz_not_ready_without_api_key(self, tmp_path, monkeypatch):
+        """Test the readiness probe fails when Gemini is not configured"""
+        monkeypatch.setattr('src.main.download_dir', tmp_path)
+        monkeypatch.setattr('src.main.gemini_client.api_key', None)
+        
+        response = client.get("/readyz")
+        
+        assert response.status_code == 503
+        data = response.json()
+        assert data["status"] == "not ready"
+        assert data["checks"]["google_gemini_api"] is False
+
+
+class TestMetricsEndpoint:
+    """Test the Prometheus /metrics endpoint"""
+    
+    def test_metrics_exposition_format(self):
+        """Test that request counters are labelled with route templates"""
+        client.get("/jobs/does-not-exist")
+        
+        response = client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'genai_http_requests_total{method="GET",route="/jobs/{job_id}",status="404"}' in body
+        assert "genai_http_request_duration_seconds_bucket" in body
+        assert "genai_http_requests_in_flight" in body
+        assert "genai_llm_prompt_tokens_total" in body
+        assert "genai_http_pool_pool_hits_total" in body
+    
+    def test_download_records_bytes_and_stages(self, file_server, tmp_path, monkeypatch):
+        """Test that downloads record bytes and per-stage latency"""
+        monkeypatch.setattr('src.main.download_dir', tmp_path)
+        file_server.add('/metrics.bin', b'x' * 1000)
+        before = REGISTRY.get_sample_value("genai_downloaded_bytes_total") or 0
+        
+        client.post("/download", params={"url": file_server.url('/metrics.bin')})
+        
+        assert REGISTRY.get_sample_value("genai_downloaded_bytes_total") == before + 1000
+        for stage in ("ttfb", "transfer"):
+            assert REGISTRY.get_sample_value(
+                "genai_stage_duration_seconds_count", {"operation": "download", "stage": stage}
+            ) >= 1
+    
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    @patch('src.main.gemini_client.api_key', "fake_api_key")
+    def test_summarize_records_stages(self, mock_configure, mock_model_class, pdf_factory):
+        """Test that summarization records each stage and the uploaded bytes"""
+        from src.main import summary_cache
+        summary_cache.clear()
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="Summary."))
+        pdf = pdf_factory(["Metrics page."])
+        before = REGISTRY.get_sample_value("genai_uploaded_bytes_total") or 0
+        
+        response = client.post("/summarize", files={"file": ("doc.pdf", pdf, "application/pdf")})
+        
+        assert response.status_code == 200
+        assert REGISTRY.get_sample_value("genai_uploaded_bytes_total") == before + len(pdf)
+        for stage in ("ingest", "cache_lookup", "extract", "llm", "cache_store", "cleanup"):
+            assert REGISTRY.get_sample_value(
+                "genai_stage_duration_seconds_count", {"operation": "summarize", "stage": stage}
+            ) >= 1
+        summary_cache.clear()
+
+
+class TestRateLimiting:
+    """Test cases for per-client rate limits and load shedding"""
+    
+    @pytest.fixture
+    def limited(self, unlimited_rates, monkeypatch):
+        """Download budget of two requests per client"""
+        from src.rate_limit import EndpointLimit
+        monkeypatch.setitem(unlimited_rates.limits, "download", EndpointLimit(per_minute=6, burst=2))
+        return unlimited_rates
+    
+    @patch('src.main.download_url', new_callable=AsyncMock)
+    def test_rate_limit_per_client(self, mock_download, limited, monkeypatch):
+        """Test that a client over its budget gets 429 with Retry-After while other clients are unaffected"""
+        mock_download.return_value = {"file_path": "downloads/x"}
+        monkeypatch.setattr(limited, "client_id", "api_key")
+        
+        statuses = [client.post("/download?url=http://example.com/x").status_code for _ in range(2)]
+        limited_response = client.post("/download?url=http://example.com/x")
+        other_client = client.post("/download?url=http://example.com/x", headers={"X-API-Key": "tenant-b"})
+        
+        assert statuses == [200, 200]
+        assert limited_response.status_code == 429
+        assert limited_response.headers["Retry-After"] == "10"
+        assert other_client.status_code == 200
+        assert mock_download.await_count == 3
+    
+    @patch('src.main.download_url', new_callable=AsyncMock)
+    def test_batch_items_count_against_budget(self, mock_download, limited):
+        """Test that every URL of a batch takes a token"""
+        mock_download.return_value = {"file_path": "downloads/x"}
+        
+        first = client.post("/download/batch", json={"urls": ["http://example.com/a", "http://example.com/b"]})
+        second = client.post("/download/batch", json={"urls": ["http://example.com/c"]})
+        
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert "Retry-After" in second.headers
+    
+    @patch('src.main.download_url', new_callable=AsyncMock)
+    def test_batch_larger_than_burst_is_rejected(self, mock_download, limited):
+        """Test that a batch costing more than the burst gets 429 instead of being charged only the burst"""
+        mock_download.return_value = {"file_path": "downloads/x"}
+        
+        response = client.post("/download/batch", json={"urls": [f"http://example.com/{i}" for i in range(3)]})
+        single = client.post("/download?url=http://example.com/x")
+        
+        assert response.status_code == 429
+        assert "split" in response.json()["detail"]
+        assert "Retry-After" not in response.headers
+        assert single.status_code == 200
+        mock_download.assert_awaited_once()
+    
+    def test_shed_when_llm_queue_is_saturated(self, unlimited_rates, monkeypatch):
+        """Test that summarize requests get 503 up front while the Gemini queue is full"""
+        from src.rate_limit import EndpointLimit
+        monkeypatch.setitem(
+            unlimited_rates.limits, "summarize", EndpointLimit(per_minute=0, burst=0, overloaded=lambda: True)
+        )
+        
+        response = client.post("/summarize", files={"file": ("a.pdf", b"%PDF-1.4", "application/pdf")})
+        
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert unlimited_rates.stats()["summarize_shed"] >= 1
+
 class TestAppConfiguration:
     """Test app configuration and setup"""
     
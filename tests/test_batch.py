@@ -0,0 +1,64 @@
+"""Tests for the batch fan-out helper."""
+
+import asyncio
+
+import pytest
+
+from src.batch import run_batch
+
+
+class TestRunBatch:
+    """Test cases for run_batch"""
+
+    @pytest.mark.asyncio
+    async def test_bounded_concurrency_and_completion_order(self):
+        """Test that items run at most `concurrency` at a time and are yielded as they finish"""
+        running = 0
+        peak = 0
+
+        async def worker(delay):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(delay)
+            running -= 1
+            return delay
+
+        outcomes = [outcome async for outcome in run_batch([0.05, 0.01, 0.03, 0.02], worker, concurrency=2)]
+
+        assert peak == 2
+        assert [index for index, _, _ in outcomes] == [1, 2, 0, 3]
+        assert all(error is None for _, _, error in outcomes)
+
+    @pytest.mark.asyncio
+    async def test_failures_are_isolated(self):
+        """Test that a failing item is reported without stopping the others"""
+        async def worker(item):
+            if item == "bad":
+                raise ValueError("bad item")
+            return item.upper()
+
+        outcomes = {index: (result, error) async for index, result, error in run_batch(["a", "bad", "c"], worker, 2)}
+
+        assert outcomes[0] == ("A", None)
+        assert isinstance(outcomes[1][1], ValueError)
+        assert outcomes[2] == ("C", None)
+
+    @pytest.mark.asyncio
+    async def test_closing_cancels_pending_items(self):
+        """Test that closing the iterator cancels items that have not finished"""
+        cancelled = []
+
+        async def worker(item):
+            try:
+                await asyncio.sleep(item)
+            except asyncio.CancelledError:
+                cancelled.append(item)
+                raise
+            return item
+
+        batch = run_batch([0, 10, 10], worker, concurrency=3)
+        assert (await batch.__anext__())[1] == 0
+        await batch.aclose()
+
+        assert sorted(cancelled) == [10, 10]
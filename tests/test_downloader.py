@@ -0,0 +1,273 @@
+"""Tests for the download engine and its download index."""
+
+import asyncio
+import base64
+import hashlib
+
+import aiohttp
+import pytest
+
+from src.download_index import DownloadIndex
+from src.downloader import DOWNLOADED, NOT_MODIFIED, DownloadError, Downloader, safe_filename, split_ranges
+
+RANGED = {'ETag': '"r1"', 'Accept-Ranges': 'bytes'}
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    """Downloader with a fresh index"""
+    return Downloader(DownloadIndex(tmp_path / "index.db"), chunk_size=1024)
+
+
+def make_downloader(tmp_path, **kwargs):
+    return Downloader(DownloadIndex(tmp_path / "index.db"), chunk_size=1024, **kwargs)
+
+
+class TestDownloader:
+    """Test cases for Downloader"""
+
+    @pytest.mark.asyncio
+    async def test_unchanged_file_is_revalidated(self, downloader, file_server, tmp_path):
+        """Test that a repeat download sends If-None-Match and keeps the file on 304"""
+        file_server.add('/report.pdf', b'report body', headers={'ETag': '"v1"'})
+
+        async with aiohttp.ClientSession() as session:
+            first = await downloader.fetch(session, file_server.url('/report.pdf'), tmp_path)
+            second = await downloader.fetch(session, file_server.url('/report.pdf'), tmp_path)
+
+        assert first.status == DOWNLOADED
+        assert second.status == NOT_MODIFIED
+        assert second.path == first.path
+        assert second.sha256 == first.sha256
+        assert file_server.requests[-1][2].get('If-None-Match') == '"v1"'
+        assert first.path.read_bytes() == b'report body'
+        assert not list(tmp_path.glob('*.part'))
+
+    @pytest.mark.asyncio
+    async def test_changed_file_is_downloaded_again(self, downloader, file_server, tmp_path):
+        """Test that a new ETag replaces the indexed file"""
+        file_server.add('/data.csv', b'old', headers={'ETag': '"v1"'})
+
+        async with aiohttp.ClientSession() as session:
+            await downloader.fetch(session, file_server.url('/data.csv'), tmp_path)
+            file_server.add('/data.csv', b'new contents', headers={'ETag': '"v2"'})
+            result = await downloader.fetch(session, file_server.url('/data.csv'), tmp_path)
+
+        assert result.status == DOWNLOADED
+        assert result.size == len(b'new contents')
+        assert (tmp_path / 'data.csv').read_bytes() == b'new contents'
+        assert downloader.index.get(file_server.url('/data.csv')).etag == '"v2"'
+
+    @pytest.mark.asyncio
+    async def test_missing_file_is_fetched_unconditionally(self, downloader, file_server, tmp_path):
+        """Test that an index entry whose file was deleted is not revalidated"""
+        file_server.add('/gone.txt', b'content', headers={'ETag': '"v1"'})
+
+        async with aiohttp.ClientSession() as session:
+            first = await downloader.fetch(session, file_server.url('/gone.txt'), tmp_path)
+            first.path.unlink()
+            second = await downloader.fetch(session, file_server.url('/gone.txt'), tmp_path)
+
+        assert second.status == DOWNLOADED
+        assert 'If-None-Match' not in file_server.requests[-1][2]
+        assert second.path.read_bytes() == b'content'
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_coalesced(self, downloader, file_server, tmp_path):
+        """Test that concurrent requests for one URL share a single transfer"""
+        file_server.add('/big.bin', b'x' * 100_000)
+
+        async with aiohttp.ClientSession() as session:
+            results = await asyncio.gather(
+                *(downloader.fetch(session, file_server.url('/big.bin'), tmp_path) for _ in range(5))
+            )
+
+        assert len(file_server.requests) == 1
+        assert sum(result.coalesced for result in results) == 4
+        assert {result.sha256 for result in results} == {results[0].sha256}
+        assert downloader.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_workers_sharing_a_directory_take_turns(self, file_server, tmp_path):
+        """Test that two worker processes' downloaders never write the same .part file at once"""
+        file_server.add('/big.bin', b'x' * 100_000, headers={'ETag': '"v1"'})
+        first, second = make_downloader(tmp_path), make_downloader(tmp_path)
+
+        async with aiohttp.ClientSession() as session:
+            results = await asyncio.gather(
+                first.fetch(session, file_server.url('/big.bin'), tmp_path),
+                second.fetch(session, file_server.url('/big.bin'), tmp_path),
+            )
+
+        assert [result.status for result in results] == [DOWNLOADED, NOT_MODIFIED]
+        assert second.stats()["lock_waits"] == 1
+        assert (tmp_path / 'big.bin').read_bytes() == b'x' * 100_000
+        assert not list(tmp_path.glob('.*.part')) and not list(tmp_path.glob('.*.lock'))
+
+    @pytest.mark.asyncio
+    async def test_drain_waits_for_abandoned_transfers(self, downloader, file_server, tmp_path):
+        """Test that a transfer outliving its request is completed by drain()"""
+        file_server.add('/big.bin', b'x' * 100_000)
+
+        async with aiohttp.ClientSession() as session:
+            request = asyncio.create_task(downloader.fetch(session, file_server.url('/big.bin'), tmp_path))
+            await asyncio.sleep(0)
+            request.cancel()
+            cancelled = await downloader.drain(timeout=5.0)
+
+        assert cancelled == 0
+        assert (tmp_path / 'big.bin').read_bytes() == b'x' * 100_000
+        assert downloader.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_download_leaves_no_partial_file(self, downloader, file_server, tmp_path):
+        """Test that HTTP errors propagate to every waiter and write nothing"""
+        async with aiohttp.ClientSession() as session:
+            with pytest.raises(aiohttp.ClientResponseError):
+                await downloader.fetch(session, file_server.url('/missing.pdf'), tmp_path)
+
+        assert list(tmp_path.glob('missing.pdf*')) == []
+        assert downloader.index.get(file_server.url('/missing.pdf')) is None
+
+
+class TestFilenames:
+    """Test cases for origin-supplied filenames"""
+
+    URL = "http://origin/files/report"
+
+    @pytest.mark.parametrize("name", ["../../etc/passwd", "/tmp/passwd", "a\\..\\passwd", "nested/dir/passwd"])
+    def test_directories_are_dropped(self, name):
+        """Test that path components cannot place a file outside the downloads directory"""
+        assert safe_filename(name, self.URL) == "passwd"
+
+    @pytest.mark.parametrize("name", ["", ".", "..", "../..", ".index.db", ".hidden", "x.part", "report.tmp"])
+    def test_reserved_names_are_replaced(self, name):
+        """Test that empty, hidden, partial and temporary names fall back to a name derived from the URL"""
+        fallback = safe_filename(name, self.URL)
+
+        assert fallback.startswith("download-")
+        assert fallback == safe_filename("", self.URL)
+        assert fallback != safe_filename("", self.URL + "?v=2")
+
+    @pytest.mark.asyncio
+    async def test_hostile_content_disposition_stays_in_directory(self, downloader, file_server, tmp_path):
+        """Test that an origin cannot overwrite the index or write outside the directory"""
+        dest = tmp_path / "downloads"
+        dest.mkdir()
+        file_server.add('/a', b'one', headers={'Content-Disposition': 'attachment; filename="../escaped.txt"'})
+        file_server.add('/b', b'two', headers={'Content-Disposition': 'attachment; filename=".index.db"'})
+
+        async with aiohttp.ClientSession() as session:
+            first = await downloader.fetch(session, file_server.url('/a'), dest)
+            second = await downloader.fetch(session, file_server.url('/b'), dest)
+
+        assert first.path == dest / "escaped.txt"
+        assert not (tmp_path / "escaped.txt").exists()
+        assert second.path.parent == dest
+        assert second.path.name.startswith("download-")
+        assert not (dest / ".index.db").exists()
+
+
+class TestResumableDownloads:
+    """Test cases for resuming interrupted downloads"""
+
+    @pytest.mark.asyncio
+    async def test_interrupted_download_resumes_from_part_file(self, file_server, tmp_path):
+        """Test that a later request continues an interrupted transfer with a Range request"""
+        body = bytes(range(256)) * 20
+        file_server.add('/large.bin', body, headers=RANGED, drop_after=1500)
+        downloader = make_downloader(tmp_path, segments=1, retries=0)
+
+        async with aiohttp.ClientSession() as session:
+            with pytest.raises(aiohttp.ClientPayloadError):
+                await downloader.fetch(session, file_server.url('/large.bin'), tmp_path)
+            assert len(list(tmp_path.glob('.*.part'))) == 1
+
+            result = await downloader.fetch(session, file_server.url('/large.bin'), tmp_path)
+
+        assert file_server.requests[-1][2]['Range'] == 'bytes=1500-'
+        assert file_server.requests[-1][2]['If-Range'] == '"r1"'
+        assert result.resumed_from == 1500
+        assert result.path.read_bytes() == body
+        assert result.sha256 == hashlib.sha256(body).hexdigest()
+        assert not list(tmp_path.glob('.*.part'))
+
+    @pytest.mark.asyncio
+    async def test_interruption_is_retried_within_request(self, file_server, tmp_path):
+        """Test that a dropped connection is resumed automatically"""
+        body = b'y' * 5000
+        file_server.add('/retry.bin', body, headers=RANGED, drop_after=1000)
+        downloader = make_downloader(tmp_path, segments=1, retries=1)
+
+        async with aiohttp.ClientSession() as session:
+            result = await downloader.fetch(session, file_server.url('/retry.bin'), tmp_path)
+
+        assert result.resumed_from == 1000
+        assert result.path.read_bytes() == body
+
+    @pytest.mark.asyncio
+    async def test_changed_origin_restarts_from_zero(self, file_server, tmp_path):
+        """Test that If-Range makes a changed file download from the start"""
+        file_server.add('/doc.bin', b'a' * 3000, headers=RANGED, drop_after=1000)
+        downloader = make_downloader(tmp_path, segments=1, retries=0)
+
+        async with aiohttp.ClientSession() as session:
+            with pytest.raises(aiohttp.ClientPayloadError):
+                await downloader.fetch(session, file_server.url('/doc.bin'), tmp_path)
+            file_server.add('/doc.bin', b'b' * 2000, headers={**RANGED, 'ETag': '"r2"'})
+            result = await downloader.fetch(session, file_server.url('/doc.bin'), tmp_path)
+
+        assert result.resumed_from == 0
+        assert result.path.read_bytes() == b'b' * 2000
+
+
+class TestSegmentedDownloads:
+    """Test cases for parallel ranged downloads"""
+
+    def test_split_ranges_covers_every_byte(self):
+        """Test that byte ranges are contiguous and inclusive"""
+        assert split_ranges(10, 3) == [(0, 3), (4, 6), (7, 9)]
+        assert split_ranges(2, 4) == [(0, 0), (1, 1)]
+
+    @pytest.mark.asyncio
+    async def test_large_file_is_fetched_in_segments(self, file_server, tmp_path):
+        """Test that servers advertising Accept-Ranges get concurrent range requests"""
+        body = hashlib.sha256(b'seed').digest() * 1000
+        file_server.add('/artifact.tar', body, headers=RANGED)
+        downloader = make_downloader(tmp_path, segments=4, segment_min_bytes=4000)
+
+        async with aiohttp.ClientSession() as session:
+            result = await downloader.fetch(session, file_server.url('/artifact.tar'), tmp_path)
+
+        assert result.segments == 4
+        assert result.path.read_bytes() == body
+        assert result.sha256 == hashlib.sha256(body).hexdigest()
+        ranges = sorted(headers['Range'] for _, _, headers in file_server.requests if 'Range' in headers)
+        assert len(ranges) == 4
+        assert downloader.stats()["segmented"] == 1
+
+    @pytest.mark.asyncio
+    async def test_small_or_unranged_files_use_one_stream(self, file_server, tmp_path):
+        """Test that origins without Accept-Ranges are downloaded in a single request"""
+        file_server.add('/plain.bin', b'z' * 20000, headers={'ETag': '"p"'})
+        downloader = make_downloader(tmp_path, segments=4, segment_min_bytes=4000)
+
+        async with aiohttp.ClientSession() as session:
+            result = await downloader.fetch(session, file_server.url('/plain.bin'), tmp_path)
+
+        assert result.segments == 1
+        assert len(file_server.requests) == 1
+
+    @pytest.mark.asyncio
+    async def test_digest_mismatch_is_rejected(self, file_server, tmp_path):
+        """Test that the assembled file is verified against the origin's digest"""
+        wrong = base64.b64encode(hashlib.sha256(b'other').digest()).decode()
+        file_server.add('/signed.bin', b'q' * 20000, headers={**RANGED, 'Digest': f'sha-256={wrong}'})
+        downloader = make_downloader(tmp_path, segments=4, segment_min_bytes=4000)
+
+        async with aiohttp.ClientSession() as session:
+            with pytest.raises(DownloadError):
+                await downloader.fetch(session, file_server.url('/signed.bin'), tmp_path)
+
+        assert list(tmp_path.glob('signed.bin*')) == []
+        assert list(tmp_path.glob('.*.part')) == []
@@ -0,0 +1,158 @@
+"""Tests for the PDF text extraction stage."""
+
+import asyncio
+import io
+import time
+
+import pytest
+
+from src.extraction import ExtractionPool, _terminate, extract_pages, sampled_order, split_pages
+from src.pdf_backends import BackendSelector
+
+
+def stuck_batch(source, pages, chain):
+    """Stand-in for a worker stuck on a pathological PDF"""
+    time.sleep(60)
+
+class TestSplitPages:
+    """Test cases for split_pages"""
+
+    def test_covers_every_page_once(self):
+        """Test that slices are contiguous and cover the whole document"""
+        ranges = split_pages(10, 3)
+        assert [list(r) for r in ranges] == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+
+    def test_more_parts_than_pages(self):
+        """Test that no empty slices are produced for short documents"""
+        assert [list(r) for r in split_pages(2, 4)] == [[0], [1]]
+
+
+class TestBudgetedExtraction:
+    """Test cases for lazy, budget-bounded extraction"""
+
+    def test_sampled_order_interleaves_start_middle_end(self):
+        """Test that sampled order visits start, middle and end pages first"""
+        order = sampled_order(10)
+        assert order[:3] == [0, 5, 9]
+        assert sorted(order) == list(range(10))
+
+    @pytest.mark.asyncio
+    async def test_budget_stops_reading_pages(self, pdf_factory):
+        """Test that budget mode stops extracting once the budget is filled"""
+        pool = ExtractionPool(workers=0)
+        data = pdf_factory([f"{i}" * 50 for i in range(10)])
+
+        result = await pool.extract_text(io.BytesIO(data), "budget", 120)
+
+        assert result.pages_read == 3
+        assert result.page_count == 10
+        assert len(result.text) == 120
+        assert result.text.startswith("0" * 50)
+
+    @pytest.mark.asyncio
+    async def test_sampled_mode_covers_whole_document(self, pdf_factory):
+        """Test that sampled mode includes text from the middle and end"""
+        pool = ExtractionPool(workers=0)
+        data = pdf_factory([f"page{i}" for i in range(9)])
+
+        result = await pool.extract_text(io.BytesIO(data), "sampled", 18)
+
+        assert result.pages_read == 3
+        assert result.text.split("\n") == ["page0", "page4", "page8"]
+
+
+class TestExtractionPool:
+    """Test cases for ExtractionPool"""
+
+    def test_extract_pages_from_bytes(self, pdf_factory):
+        """Test the worker function on raw PDF bytes"""
+        data = pdf_factory(["first", "second", "third"])
+        assert extract_pages(data, [2, 0]) == ["third", "first"]
+
+    def test_extract_pages_from_mapped_file(self, pdf_factory, tmp_path):
+        """Test the worker function on a PDF path, which it memory-maps"""
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(pdf_factory(["first", "second", "third"]))
+        assert extract_pages(str(path), [1]) == ["second"]
+
+    @pytest.mark.asyncio
+    async def test_process_pool_receives_path_not_bytes(self, pdf_factory, tmp_path):
+        """Test that local files are handed to pool workers by path"""
+        pages = [f"page {i}" for i in range(4)]
+        path = tmp_path / "doc.pdf"
+        path.write_bytes(pdf_factory(pages))
+        pool = ExtractionPool(workers=2, min_pages=2)
+        # The stream only supplies the page count; page text must come from the path
+        stream = io.BytesIO(pdf_factory(["stream copy"] * 4))
+        try:
+            result = await pool.extract_text(stream, path=path)
+        finally:
+            pool.shutdown()
+
+        assert result.text == "\n".join(pages)
+
+    @pytest.mark.asyncio
+    async def test_small_document_uses_thread(self, pdf_factory):
+        """Test that documents below the page threshold skip the process pool"""
+        pool = ExtractionPool(workers=2, min_pages=10)
+        result = await pool.extract_text(io.BytesIO(pdf_factory(["a", "b"])))
+
+        assert result.text == "a\nb"
+        assert result.page_count == 2
+        assert pool._executor is None
+
+    @pytest.mark.asyncio
+    async def test_large_document_uses_process_pool(self, pdf_factory):
+        """Test that pages are split across worker processes and kept in order"""
+        pages = [f"page {i}" for i in range(7)]
+        pool = ExtractionPool(workers=2, min_pages=2)
+        try:
+            result = await pool.extract_text(io.BytesIO(pdf_factory(pages)))
+        finally:
+            pool.shutdown()
+
+        assert result.text == "\n".join(pages)
+        assert result.page_count == 7
+
+    @pytest.mark.asyncio
+    async def test_timeout(self, monkeypatch):
+        """Test that slow extraction is abandoned after the job timeout"""
+        class SlowPage:
+            def extract_text(self):
+                time.sleep(0.5)
+                return "slow"
+
+        class SlowReader:
+            def __init__(self, stream):
+                self.pages = [SlowPage()]
+
+        monkeypatch.setattr("src.pdf_backends.PdfReader", SlowReader)
+        pool = ExtractionPool(workers=0, timeout=0.05, backends=BackendSelector("pypdf2", fallback=()))
+
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.extract_text(io.BytesIO(b"%PDF-1.4"))
+
+    @pytest.mark.asyncio
+    async def test_timeout_recycles_process_pool(self, pdf_factory, monkeypatch):
+        """Test that a pool job running out of time gets new jobs fresh workers and its worker killed"""
+        retired = []
+
+        def terminate(processes):
+            retired.extend(processes)
+            _terminate(processes)
+
+        monkeypatch.setattr("src.extraction.extract_page_batch", stuck_batch)
+        monkeypatch.setattr("src.extraction._terminate", terminate)
+        pool = ExtractionPool(workers=1, min_pages=1, timeout=1.0, backends=BackendSelector("pypdf2", fallback=()))
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await pool.extract_text(io.BytesIO(pdf_factory(["stuck"])))
+            assert pool._executor is None
+
+            await asyncio.sleep(1.5)
+        finally:
+            pool.shutdown()
+
+        assert len(retired) == 1
+        retired[0].join(timeout=5)
+        assert not retired[0].is_alive()
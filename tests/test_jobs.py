@@ -0,0 +1,222 @@
+"""Tests for the persistent background job queue."""
+
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.jobs import FAILED, QUEUED, SUCCEEDED, JobQueue, JobStore, QueueFullError
+
+
+async def wait_for_status(queue, job_id, statuses, timeout=5.0):
+    """Poll a job until it reaches one of the given statuses."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        assert asyncio.get_running_loop().time() < deadline, f"job stuck in {job['status']}"
+        await asyncio.sleep(0.01)
+
+
+class TestJobQueue:
+    """Test cases for JobQueue"""
+
+    @pytest.mark.asyncio
+    async def test_job_result_and_payload_cleanup(self, tmp_path):
+        """Test that a job runs with its payload and the payload is removed afterwards"""
+        seen = {}
+
+        async def handler(job):
+            with open(job["payload_path"], "rb") as f:
+                seen["payload"] = f.read()
+            return {"summary": f"done {job['params']['name']}"}
+
+        queue = JobQueue(JobStore(tmp_path / "jobs.db"), tmp_path / "payloads", handler, workers=1)
+        await queue.start()
+        try:
+            job_id = await queue.submit({"name": "a"}, payload=io.BytesIO(b"%PDF"))
+            job = await wait_for_status(queue, job_id, {SUCCEEDED, FAILED})
+        finally:
+            await queue.stop()
+
+        assert job["status"] == SUCCEEDED
+        assert job["result"] == {"summary": "done a"}
+        assert seen["payload"] == b"%PDF"
+        assert not list((tmp_path / "payloads").iterdir())
+
+    @pytest.mark.asyncio
+    async def test_failed_job_records_error(self, tmp_path):
+        """Test that handler exceptions mark the job as failed"""
+        async def handler(job):
+            raise ValueError("bad document")
+
+        queue = JobQueue(JobStore(tmp_path / "jobs.db"), tmp_path, handler, workers=1)
+        await queue.start()
+        try:
+            job_id = await queue.submit({})
+            job = await wait_for_status(queue, job_id, {SUCCEEDED, FAILED})
+        finally:
+            await queue.stop()
+
+        assert job["status"] == FAILED
+        assert job["error"] == "bad document"
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_full(self, tmp_path):
+        """Test backpressure once max_pending jobs are unfinished"""
+        release = asyncio.Event()
+
+        async def handler(job):
+            await release.wait()
+            return {}
+
+        queue = JobQueue(JobStore(tmp_path / "jobs.db"), tmp_path, handler, workers=1, max_pending=2)
+        await queue.start()
+        try:
+            await queue.submit({})
+            await queue.submit({})
+            with pytest.raises(QueueFullError):
+                await queue.submit({})
+        finally:
+            release.set()
+            await queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_interrupted_jobs_resume_after_restart(self, tmp_path):
+        """Test that jobs running at shutdown are requeued and finished on restart"""
+        store = JobStore(tmp_path / "jobs.db")
+        started = asyncio.Event()
+
+        async def hang(job):
+            started.set()
+            await asyncio.Event().wait()
+
+        queue = JobQueue(store, tmp_path, hang, workers=1)
+        await queue.start()
+        job_id = await queue.submit({})
+        await started.wait()
+        await queue.stop()
+
+        async def finish(job):
+            return {"resumed": True}
+
+        restarted = JobQueue(store, tmp_path, finish, workers=1)
+        await restarted.start()
+        try:
+            job = await wait_for_status(restarted, job_id, {SUCCEEDED})
+        finally:
+            await restarted.stop()
+
+        assert job["result"] == {"resumed": True}
+
+    @pytest.mark.asyncio
+    async def test_stop_lets_running_jobs_finish(self, tmp_path):
+        """Test that stopping with a grace period waits for running jobs but claims no new ones"""
+        started = asyncio.Event()
+
+        async def slow(job):
+            started.set()
+            await asyncio.sleep(0.1)
+            return {"done": True}
+
+        queue = JobQueue(JobStore(tmp_path / "jobs.db"), tmp_path, slow, workers=1)
+        await queue.start()
+        first = await queue.submit({})
+        second = await queue.submit({})
+        await started.wait()
+        await queue.stop(grace=5.0)
+
+        assert (await queue.get(first))["status"] == SUCCEEDED
+        assert (await queue.get(second))["status"] == QUEUED
+
+
+class RacingConnection:
+    """Connection proxy letting another store claim a job just before this one's conditional UPDATE"""
+
+    def __init__(self, db, rival):
+        self.db = db
+        self.rival = rival
+
+    def execute(self, sql, params=()):
+        if sql.startswith("UPDATE jobs SET status = ?, started_at = ?") and self.rival is not None:
+            rival, self.rival = self.rival, None
+            rival.claim_next()
+        return self.db.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+class TestJobStore:
+    """Test cases for JobStore"""
+
+    def test_claim_moves_on_when_another_process_wins(self, tmp_path):
+        """Test that losing the race for a job claims the next one instead of deadlocking"""
+        store = JobStore(tmp_path / "jobs.db")
+        rival = JobStore(tmp_path / "jobs.db")
+        store.insert("j1", {}, None)
+        store.insert("j2", {}, None)
+        store._db = RacingConnection(store._db, rival)
+
+        claimed = []
+        # A daemon thread, so a deadlocked claim fails the test instead of hanging it
+        thread = threading.Thread(target=lambda: claimed.append(store.claim_next()), daemon=True)
+        thread.start()
+        thread.join(timeout=5)
+
+        assert not thread.is_alive()
+        assert claimed[0]["id"] == "j2"
+        assert rival.get("j1")["status"] == "running"
+        assert store.get("j1")["status"] == "running"
+
+    def test_insert_limit_holds_across_processes(self, tmp_path):
+        """Test that concurrent submissions through separate connections never exceed the limit"""
+        stores = [JobStore(tmp_path / "jobs.db") for _ in range(2)]
+
+        def submit(i):
+            try:
+                stores[i % 2].insert(f"job{i}", {}, None, max_unfinished=5)
+                return True
+            except QueueFullError:
+                return False
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            accepted = list(pool.map(submit, range(20)))
+
+        assert sum(accepted) == 5
+        assert stores[0].count_unfinished() == 5
+
+    def test_finished_jobs_are_purged_by_age_and_count(self, tmp_path, monkeypatch):
+        """Test that old finished jobs and those beyond the retention count are deleted, unfinished ones never"""
+        store = JobStore(tmp_path / "jobs.db")
+        for i in range(4):
+            store.insert(f"job{i}", {}, None)
+        for i in range(3):
+            store.finish(f"job{i}", {})
+
+        assert store.purge_finished(max_age=3600, max_count=0) == 0
+        assert store.purge_finished(max_age=0, max_count=2) == 1
+        assert store.get("job0") is None
+
+        now = time.time()
+        monkeypatch.setattr("src.jobs.time.time", lambda: now + 7200)
+        assert store.purge_finished(max_age=3600, max_count=0) == 2
+        assert store.get("job3")["status"] == QUEUED
+
+    def test_jobs_of_a_dead_worker_are_requeued(self, tmp_path, monkeypatch):
+        """Test that only the running jobs of the given process are returned to the queue"""
+        store = JobStore(tmp_path / "jobs.db")
+        store.insert("mine", {}, None)
+        store.insert("theirs", {}, None)
+        store.claim_next()
+        monkeypatch.setattr("src.jobs.os.getpid", lambda: 4242)
+        store.claim_next()
+
+        assert store.requeue_owned_by(4242) == 1
+        assert store.get("theirs")["status"] == QUEUED
+        assert store.get("mine")["status"] == "running"
+
@@ -0,0 +1,125 @@
+"""Tests for the shared Gemini client and its concurrency limiter."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.llm import ConcurrencyLimiter, GeminiClient, LLMBusyError
+
+
+class TestConcurrencyLimiter:
+    """Test cases for ConcurrencyLimiter"""
+
+    @pytest.mark.asyncio
+    async def test_queues_bursts_up_to_limit(self):
+        """Test that calls beyond the concurrency limit wait instead of failing"""
+        limiter = ConcurrencyLimiter(max_concurrent=2, max_queue=10, queue_timeout=5)
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with limiter.slot():
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call() for _ in range(6)))
+
+        assert peak == 2
+        assert limiter.stats()["rejected"] == 0
+
+    @pytest.mark.asyncio
+    async def test_rejects_when_queue_full(self):
+        """Test that calls are rejected once the wait queue is full"""
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(LLMBusyError):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+        assert limiter.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rejects_after_queue_timeout(self):
+        """Test that a queued call gives up after the queue timeout"""
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=5, queue_timeout=0.01)
+
+        async with limiter.slot():
+            with pytest.raises(LLMBusyError):
+                async with limiter.slot():
+                    pass
+
+
+class TestGeminiClient:
+    """Test cases for GeminiClient"""
+
+    @pytest.mark.asyncio
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    async def test_model_built_once(self, mock_configure, mock_model_class):
+        """Test that the SDK is configured once and the async API is used"""
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=MagicMock(text="ok"))
+        llm = GeminiClient("gemini-pro", "key", ConcurrencyLimiter())
+
+        assert await llm.generate_text("a") == "ok"
+        assert await llm.generate_text("b") == "ok"
+
+        mock_configure.assert_called_once_with(api_key="key")
+        mock_model_class.assert_called_once_with("gemini-pro")
+        assert mock_model_class.return_value.generate_content_async.await_count == 2
+
+    @pytest.mark.asyncio
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    async def test_closing_stream_releases_slot(self, mock_configure, mock_model_class):
+        """Test that abandoning a stream cancels it and frees the concurrency slot"""
+        async def endless():
+            while True:
+                yield MagicMock(text="token")
+                await asyncio.sleep(0)
+
+        class Response:
+            def __aiter__(self):
+                return endless()
+
+        mock_model_class.return_value.generate_content_async = AsyncMock(return_value=Response())
+        limiter = ConcurrencyLimiter(max_concurrent=1)
+        llm = GeminiClient("gemini-pro", "key", limiter)
+
+        stream = llm.stream_text("prompt")
+        assert await stream.__anext__() == "token"
+        assert limiter.in_flight == 1
+
+        await stream.aclose()
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    @patch('src.llm.genai.GenerativeModel')
+    @patch('src.llm.genai.configure')
+    async def test_records_token_usage(self, mock_configure, mock_model_class):
+        """Test that prompt and completion token counts are accumulated"""
+        usage = MagicMock(prompt_token_count=120, candidates_token_count=30)
+        mock_model_class.return_value.generate_content_async = AsyncMock(
+            return_value=MagicMock(text="ok", usage_metadata=usage)
+        )
+        llm = GeminiClient("gemini-pro", "key", ConcurrencyLimiter())
+
+        await llm.generate_text("a")
+        await llm.generate_text("b")
+
+        stats = llm.stats()
+        assert stats["calls"] == 2
+        assert stats["prompt_tokens"] == 240
+        assert stats["completion_tokens"] == 60
+        assert stats["in_flight"] == 0
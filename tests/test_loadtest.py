@@ -0,0 +1,79 @@
+"""Tests for the offline load-test harness."""
+
+import aiohttp
+import pytest
+
+from loadtest.__main__ import check_thresholds, parse_rates
+from loadtest.origin import OriginServer
+from loadtest.traffic import EndpointStats, Scenario, build_scenarios, percentile, run_open_loop
+
+
+class TestStatistics:
+    """Test cases for latency statistics"""
+
+    def test_nearest_rank_percentile(self):
+        """Test that percentiles pick an observed value by nearest rank"""
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 50) == 50.0
+        assert percentile(values, 99) == 99.0
+        assert percentile([0.2], 95) == 0.2
+        assert percentile([], 50) == 0.0
+
+    def test_summary_counts_errors(self):
+        """Test that failed requests count towards the error rate but not throughput"""
+        stats = EndpointStats()
+        stats.record(0.1, "200", True)
+        stats.record(0.3, "503", False)
+
+        summary = stats.summary(duration=2.0)
+
+        assert summary["error_rate"] == 0.5
+        assert summary["throughput"] == 0.5
+        assert summary["p99_ms"] == pytest.approx(300.0)
+        assert summary["statuses"] == {"200": 1, "503": 1}
+
+    def test_thresholds(self):
+        """Test that breaching endpoints are reported"""
+        report = {"endpoints": {
+            "livez": {"error_rate": 0.0, "p99_ms": 5.0},
+            "summarize": {"error_rate": 0.1, "p99_ms": 900.0},
+        }}
+        assert check_thresholds(report, 0.01, 1000.0) == ["summarize: error rate 10.00% > 1.00%"]
+        assert check_thresholds(report, None, None) == []
+
+
+class TestTraffic:
+    """Test cases for the open-loop runner"""
+
+    def test_rates_and_scenarios(self):
+        """Test rate parsing and that zero-rate or unknown scenarios are handled"""
+        rates = parse_rates(["summarize=0", "download=1.5"])
+        origin = OriginServer(files=2)
+
+        names = [scenario.name for scenario in build_scenarios("http://api", rates, origin, [b"%PDF"])]
+
+        assert names == ["livez", "download"]
+        with pytest.raises(ValueError):
+            build_scenarios("http://api", {"upload": 1.0}, origin, [])
+
+    @pytest.mark.asyncio
+    async def test_requests_follow_the_schedule(self):
+        """Test that requests are issued at the configured rate and recorded"""
+        origin = OriginServer(files=3, size=1024)
+        origin.start()
+
+        async def fetch(session: aiohttp.ClientSession, rng) -> int:
+            async with session.get(origin.url(rng.randrange(4))) as response:
+                await response.read()
+                return response.status
+
+        try:
+            results = await run_open_loop([Scenario("origin", 40.0, fetch)], duration=0.5, arrival="constant")
+        finally:
+            origin.stop()
+
+        stats = results["origin"]
+        assert len(stats.latencies) == 20
+        # File 3 does not exist, so some requests fail with 404
+        assert stats.errors == stats.statuses.get("404", 0)
+        assert set(stats.statuses) <= {"200", "404"}
@@ -0,0 +1,59 @@
+"""Tests for the Prometheus instrumentation helpers."""
+
+import os
+from unittest.mock import patch
+
+from prometheus_client import REGISTRY, Counter, values
+
+from src.metrics import register_stats, render
+from src.server import Supervisor
+
+
+class TestRegisterStats:
+    """Test cases for register_stats"""
+
+    def test_exposes_stats_as_counters_and_gauges(self):
+        """Test that numeric stats become counters or gauges and other values are skipped"""
+        register_stats("genai_test_component", lambda: {"hits": 3, "size": 7, "enabled": "yes"}, counters=("hits",))
+
+        assert REGISTRY.get_sample_value("genai_test_component_hits_total") == 3
+        assert REGISTRY.get_sample_value("genai_test_component_size") == 7
+        assert REGISTRY.get_sample_value("genai_test_component_enabled") is None
+
+    def test_reregistering_replaces_collector(self):
+        """Test that registering the same namespace twice replaces the first collector"""
+        register_stats("genai_test_replaced", lambda: {"value": 1})
+        register_stats("genai_test_replaced", lambda: {"value": 2})
+
+        assert REGISTRY.get_sample_value("genai_test_replaced_value") == 2
+
+
+class TestMultiprocessMetrics:
+    """Test cases for metrics shared by the workers of the prefork server"""
+
+    def test_render_merges_workers_and_labels_components(self, tmp_path, monkeypatch):
+        """Test that /metrics reads every worker's samples and tells component stats apart by pid"""
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        monkeypatch.setattr(values, "ValueClass", values.MultiProcessValue(lambda: 4242))
+        Counter("genai_test_worker_requests", "Requests of another worker", registry=None).inc(2)
+        register_stats("genai_test_worker", lambda: {"hits": 1}, counters=("hits",))
+
+        text = render().decode()
+
+        assert "genai_test_worker_requests_total 2.0" in text
+        assert f'genai_test_worker_hits_total{{pid="{os.getpid()}"}} 1.0' in text
+
+    def test_reaped_workers_are_marked_dead(self, tmp_path, monkeypatch):
+        """Test that the supervisor drops the live gauges of a worker it reaps"""
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+        monkeypatch.setattr("src.server.settings.jobs_db", tmp_path / "jobs.db")
+        (tmp_path / "gauge_livesum_4242.db").write_bytes(b"")
+        supervisor = Supervisor(config=None, sock=None, workers=1, grace_period=0)
+        supervisor.children = {4242: 0}
+        supervisor.stopping = True
+
+        with patch("src.server.os.waitpid", side_effect=[(4242, 0), ChildProcessError()]):
+            supervisor._reap()
+
+        assert not (tmp_path / "gauge_livesum_4242.db").exists()
+
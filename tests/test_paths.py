@@ -0,0 +1,58 @@
+"""Tests for client-supplied path validation."""
+
+import pytest
+from fastapi import HTTPException
+
+from src.paths import resolve_stored_file
+
+
+@pytest.fixture
+def root(tmp_path):
+    """Downloads directory with one stored file"""
+    root = tmp_path / "downloads"
+    root.mkdir()
+    (root / "report.pdf").write_bytes(b"%PDF")
+    return root
+
+
+class TestResolveStoredFile:
+    """Test cases for resolve_stored_file"""
+
+    def test_relative_and_absolute_paths(self, root):
+        """Test that names relative to the root and absolute paths inside it resolve"""
+        assert resolve_stored_file(root, "report.pdf") == (root / "report.pdf").resolve()
+        assert resolve_stored_file(root, str(root / "report.pdf")) == (root / "report.pdf").resolve()
+
+    def test_path_as_returned_by_download(self, root, monkeypatch):
+        """Test that paths relative to the working directory, as /download returns them, resolve"""
+        monkeypatch.chdir(root.parent)
+        assert resolve_stored_file(root, "downloads/report.pdf") == (root / "report.pdf").resolve()
+
+    @pytest.mark.parametrize("file_path", ["../secret.txt", "/etc/passwd", "sub/../../secret.txt", "a\0b", ""])
+    def test_rejects_paths_outside_root(self, root, file_path):
+        """Test that traversal, absolute and malformed paths are rejected"""
+        (root.parent / "secret.txt").write_text("secret")
+        with pytest.raises(HTTPException) as excinfo:
+            resolve_stored_file(root, file_path)
+        assert excinfo.value.status_code == 400
+
+    def test_rejects_symlink_escaping_root(self, root):
+        """Test that a symlink inside the root pointing outside it is rejected"""
+        (root.parent / "secret.txt").write_text("secret")
+        (root / "link.pdf").symlink_to(root.parent / "secret.txt")
+        with pytest.raises(HTTPException) as excinfo:
+            resolve_stored_file(root, "link.pdf")
+        assert excinfo.value.status_code == 400
+
+    def test_rejects_hidden_files(self, root):
+        """Test that bookkeeping files such as the download index are not exposed"""
+        (root / ".index.db").write_bytes(b"sqlite")
+        with pytest.raises(HTTPException) as excinfo:
+            resolve_stored_file(root, ".index.db")
+        assert excinfo.value.status_code == 400
+
+    def test_missing_file(self, root):
+        """Test that a well-formed path to a missing file is a 404"""
+        with pytest.raises(HTTPException) as excinfo:
+            resolve_stored_file(root, "absent.pdf")
+        assert excinfo.value.status_code == 404
@@ -0,0 +1,121 @@
+"""Tests for the pluggable PDF extraction backends."""
+
+import io
+
+import pytest
+
+from src.extraction import ExtractionPool
+from src.pdf_backends import BACKENDS, BackendSelector, BackendUsage, PdfDocument, PyPDF2Backend, available_backends
+
+
+class FlakyBackend(PyPDF2Backend):
+    """PyPDF2 failing to open documents, or on one page"""
+
+    name = "flaky"
+
+    def __init__(self, fail_open=False, fail_page=None):
+        self.fail_open = fail_open
+        self.fail_page = fail_page
+
+    def available(self) -> bool:
+        return True
+
+    def open(self, source):
+        if self.fail_open:
+            raise ValueError("cannot parse")
+        return super().open(source)
+
+    def page_text(self, document, index: int) -> str:
+        if index == self.fail_page:
+            raise ValueError("bad page")
+        return super().page_text(document, index)
+
+
+class TestPdfDocument:
+    """Test cases for reading a document through a backend chain"""
+
+    @pytest.mark.parametrize("backend", available_backends())
+    def test_installed_backends_extract_pages(self, backend, pdf_factory):
+        """Test that every installed backend reads the same page texts"""
+        document = PdfDocument(pdf_factory(["alpha", "beta"]), [backend])
+
+        assert document.page_count == 2
+        assert [document.page_text(i).strip() for i in range(2)] == ["alpha", "beta"]
+        assert document.usage[backend].pages == 2
+
+    def test_falls_back_when_open_fails(self, pdf_factory, monkeypatch):
+        """Test that the next backend parses a document the first one rejects"""
+        monkeypatch.setitem(BACKENDS, "flaky", FlakyBackend(fail_open=True))
+
+        document = PdfDocument(pdf_factory(["alpha"]), ["flaky", "pypdf2"])
+
+        assert document.backend == "pypdf2"
+        assert document.page_text(0) == "alpha"
+        assert document.usage["flaky"].failures == 1
+
+    def test_falls_back_on_a_failing_page(self, pdf_factory, monkeypatch):
+        """Test that a page error switches the rest of the document to the next backend"""
+        monkeypatch.setitem(BACKENDS, "flaky", FlakyBackend(fail_page=1))
+
+        document = PdfDocument(pdf_factory(["a", "b", "c"]), ["flaky", "pypdf2"])
+
+        assert [document.page_text(i) for i in range(3)] == ["a", "b", "c"]
+        assert document.usage["flaky"].pages == 1
+        assert document.usage["pypdf2"].pages == 2
+
+    def test_first_error_is_raised_when_every_backend_fails(self, monkeypatch):
+        """Test that the primary backend's error is reported when no backend can read the file"""
+        monkeypatch.setitem(BACKENDS, "flaky", FlakyBackend(fail_open=True))
+
+        with pytest.raises(ValueError, match="cannot parse"):
+            PdfDocument(b"not a pdf", ["flaky", "pypdf2"])
+
+
+class TestBackendSelector:
+    """Test cases for BackendSelector"""
+
+    def test_auto_prefers_the_fastest_measured_backend(self, monkeypatch):
+        """Test that measured throughput overrides the static preference order"""
+        selector = BackendSelector(fallback=())
+        monkeypatch.setattr(selector, "available", ["pdfium", "pypdf2"])
+        monkeypatch.setattr(selector, "usage", {"pdfium": BackendUsage(), "pypdf2": BackendUsage()})
+
+        assert selector.chain() == ["pdfium"]
+        selector.usage["pypdf2"].pages, selector.usage["pypdf2"].seconds = 100, 1.0
+        assert selector.chain() == ["pypdf2"]
+        selector.usage["pdfium"].pages, selector.usage["pdfium"].seconds = 1000, 1.0
+        assert selector.chain() == ["pdfium"]
+        assert selector.chain("pypdf2") == ["pypdf2"]
+
+    def test_rejects_unknown_or_missing_backends(self, monkeypatch):
+        """Test that configuration and requests naming unusable backends fail"""
+        selector = BackendSelector()
+        monkeypatch.setattr(selector, "available", ["pypdf2"])
+
+        with pytest.raises(ValueError, match="Unknown"):
+            selector.check("acrobat")
+        with pytest.raises(ValueError, match="not installed"):
+            selector.check("pdfium")
+
+    def test_benchmark_measures_every_installed_backend(self, pdf_factory):
+        """Test that the startup benchmark records throughput for each installed backend"""
+        selector = BackendSelector()
+
+        results = selector.benchmark(pdf_factory([f"page {i}" for i in range(5)]))
+
+        assert set(results) == set(available_backends())
+        assert all(speed > 0 for speed in results.values())
+        assert selector.stats()["pypdf2_pages"] == 5
+
+    @pytest.mark.asyncio
+    async def test_pool_workers_report_their_throughput(self, pdf_factory):
+        """Test that pages extracted in worker processes count towards the backend's throughput"""
+        selector = BackendSelector("pypdf2", fallback=())
+        pool = ExtractionPool(workers=2, min_pages=2, backends=selector)
+        try:
+            result = await pool.extract_text(io.BytesIO(pdf_factory([f"p{i}" for i in range(6)])))
+        finally:
+            pool.shutdown()
+
+        assert result.backend == "pypdf2"
+        assert selector.stats()["pypdf2_pages"] == 6
@@ -0,0 +1,121 @@
+"""Tests for token-budgeted prompt construction."""
+
+import threading
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.prompt import (
+    PromptBuilder,
+    TokenCounter,
+    estimate_tokens,
+    normalize_whitespace,
+    strip_repeated_lines,
+    truncate_to_tokens,
+)
+
+
+class TestTokenEstimate:
+    """Test cases for the local token estimator"""
+
+    def test_english_words_are_about_one_token(self):
+        """Test that short English words and punctuation count one token each"""
+        assert estimate_tokens("The quick brown fox jumps over the lazy dog.") == 10
+
+    def test_dense_scripts_count_more_tokens_per_character(self):
+        """Test that CJK text is not under-counted by a characters-per-token ratio"""
+        english = "a" * 40
+        japanese = "日本語" * 13 + "語"
+        assert len(english) == len(japanese)
+        assert estimate_tokens(japanese) > 4 * estimate_tokens(english)
+
+    def test_truncate_to_tokens(self):
+        """Test that truncation keeps a prefix within the budget on a token boundary"""
+        text = "one two three four five"
+        assert truncate_to_tokens(text, 3) == "one two three"
+        assert truncate_to_tokens(text, 10) == text
+
+
+class TestCleaning:
+    """Test cases for whitespace normalization and header/footer removal"""
+
+    def test_normalize_whitespace(self):
+        """Test that space runs and blank-line runs collapse"""
+        assert normalize_whitespace("  a \t b  \n\n\n\nc   \n") == "a b\n\nc"
+
+    def test_repeated_headers_and_footers_are_removed(self):
+        """Test that running titles and page numbers are dropped from every page"""
+        bodies = ["Revenue grew.", "Costs fell.", "Outlook is stable."]
+        pages = [f"ACME Annual Report\n{body}\nPage {i} of 3" for i, body in enumerate(bodies, 1)]
+        assert strip_repeated_lines(pages) == bodies
+
+    def test_short_documents_and_single_line_pages_are_kept(self):
+        """Test that too few pages, or pages made only of repeating lines, are untouched"""
+        assert strip_repeated_lines(["Header\nA", "Header\nB"]) == ["Header\nA", "Header\nB"]
+        assert strip_repeated_lines(["same"] * 4) == ["same"] * 4
+
+
+class TestTokenCounter:
+    """Test cases for TokenCounter"""
+
+    def test_estimates_are_cached_per_text(self):
+        """Test that counting the same text twice hits the cache"""
+        counter = TokenCounter(cache_size=1)
+        counter.estimate("alpha beta")
+        counter.estimate("alpha beta")
+        counter.estimate("gamma")
+        counter.estimate("alpha beta")
+
+        assert counter.stats() == {"entries": 1, "hits": 1, "misses": 3, "model_calls": 0}
+
+    @pytest.mark.asyncio
+    async def test_model_counts_are_cached(self):
+        """Test that the model is asked once per distinct text"""
+        count = AsyncMock(return_value=7)
+        counter = TokenCounter(count=count)
+
+        assert await counter.count("text") == 7
+        assert await counter.count("text") == 7
+        count.assert_awaited_once_with("text")
+
+
+class TestPromptBuilder:
+    """Test cases for PromptBuilder"""
+
+    @pytest.mark.asyncio
+    async def test_pages_fill_the_token_budget(self):
+        """Test that whole pages are added until the budget, then the next page is cut"""
+        builder = PromptBuilder(TokenCounter(), max_tokens=25)
+        pages = [" ".join([word] * 5) for word in ("alpha", "bravo", "cargo", "delta", "echo")]
+
+        prompt = await builder.build("Summarize:\n", pages)
+
+        # 3 instruction tokens, then 6 per page including its separator
+        assert prompt.truncated
+        assert prompt.pages_used == 4
+        assert prompt.tokens == 25
+        assert prompt.text == "Summarize:\n" + "\n".join(pages[:3]) + "\n" + "delta delta delta delta"
+
+    @pytest.mark.asyncio
+    async def test_model_count_shortens_underestimated_prompts(self):
+        """Test that an exact count above the budget shrinks the prompt"""
+        counter = TokenCounter(count=AsyncMock(side_effect=lambda text: len(text)))
+        builder = PromptBuilder(counter, max_tokens=50)
+
+        prompt = await builder.build("S:", ["word " * 40])
+
+        assert prompt.tokens <= 50
+        assert prompt.truncated
+
+    @pytest.mark.asyncio
+    async def test_pages_are_cleaned_off_the_event_loop(self, monkeypatch):
+        """Test that cleaning and measuring pages runs in a worker thread, not on the event loop"""
+        builder = PromptBuilder(TokenCounter(), max_tokens=100)
+        threads = []
+        clean = builder.clean
+        monkeypatch.setattr(builder, "clean", lambda pages: threads.append(threading.get_ident()) or clean(pages))
+
+        prompt = await builder.build("S:", ["alpha beta"])
+
+        assert prompt.text == "S:alpha beta"
+        assert threads and threads[0] != threading.get_ident()
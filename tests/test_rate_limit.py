@@ -0,0 +1,126 @@
+"""Tests for per-client rate limiting and admission control."""
+
+import math
+
+import pytest
+
+from src.rate_limit import EndpointLimit, MemoryBuckets, RateLimiter, SQLiteBuckets
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable clock for both bucket backends"""
+    now = [1000.0]
+    monkeypatch.setattr("src.rate_limit.time.monotonic", lambda: now[0])
+    monkeypatch.setattr("src.rate_limit.time.time", lambda: now[0])
+    return now
+
+
+class TestBuckets:
+    """Test cases for the token bucket backends"""
+
+    @pytest.mark.parametrize("backend", ["memory", "sqlite"])
+    def test_burst_then_steady_rate(self, backend, clock, tmp_path):
+        """Test that a client gets its burst at once, then one request per refill interval"""
+        buckets = MemoryBuckets() if backend == "memory" else SQLiteBuckets(tmp_path / "limits.db")
+
+        assert [buckets.take("a", 0.5, 3, 1) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert buckets.take("a", 0.5, 3, 1) == pytest.approx(2.0)
+        assert buckets.take("b", 0.5, 3, 1) == 0.0
+
+        clock[0] += 2.0
+        assert buckets.take("a", 0.5, 3, 1) == 0.0
+        assert buckets.take("a", 0.5, 3, 1) > 0
+
+    def test_sqlite_buckets_are_shared(self, clock, tmp_path):
+        """Test that two processes' connections to one file draw from the same bucket"""
+        first = SQLiteBuckets(tmp_path / "limits.db")
+        second = SQLiteBuckets(tmp_path / "limits.db")
+
+        assert first.take("a", 1.0, 2, 1) == 0.0
+        assert second.take("a", 1.0, 2, 1) == 0.0
+        assert first.take("a", 1.0, 2, 1) == pytest.approx(1.0)
+
+    def test_full_buckets_are_pruned(self, clock, tmp_path):
+        """Test that buckets which have refilled completely are forgotten"""
+        buckets = SQLiteBuckets(tmp_path / "limits.db", prune_every=2)
+        buckets.take("a", 1.0, 5, 1)
+        clock[0] += 10
+        buckets.take("b", 1.0, 5, 1)
+
+        assert len(buckets) == 1
+
+    def test_memory_buckets_are_bounded(self, clock):
+        """Test that the least recently used bucket is evicted beyond max_keys"""
+        buckets = MemoryBuckets(max_keys=2)
+        for key in "abc":
+            buckets.take(key, 1.0, 1, 1)
+
+        assert len(buckets) == 2
+        assert buckets.take("a", 1.0, 1, 1) == 0.0
+
+
+class TestRateLimiter:
+    """Test cases for RateLimiter"""
+
+    def make_limiter(self, client_id="ip", api_keys=(), **limit) -> RateLimiter:
+        return RateLimiter(
+            MemoryBuckets(), {"summarize": EndpointLimit(**limit)}, routes={}, client_id=client_id, api_keys=api_keys
+        )
+
+    def test_client_key_prefers_hashed_api_key(self):
+        """Test that in api_key mode clients are identified by API key, hashed, or else by address"""
+        limiter = self.make_limiter(client_id="api_key", per_minute=60, burst=1)
+        with_key = {"headers": [(b"x-api-key", b"secret")], "client": ("10.0.0.1", 1234)}
+        without_key = {"headers": [], "client": ("10.0.0.1", 1234)}
+
+        assert limiter.client_key(with_key).startswith("key:")
+        assert "secret" not in limiter.client_key(with_key)
+        assert limiter.client_key(without_key) == "ip:10.0.0.1"
+        limiter.client_id = "ip"
+        assert limiter.client_key(with_key) == "ip:10.0.0.1"
+
+    @pytest.mark.asyncio
+    async def test_rotating_api_key_does_not_reset_limit(self, clock):
+        """Test that by default a client cannot get a fresh bucket by changing its X-API-Key"""
+        limiter = RateLimiter(MemoryBuckets(), {"summarize": EndpointLimit(per_minute=60, burst=2)}, routes={})
+
+        waits = []
+        for attempt in range(4):
+            scope = {"headers": [(b"x-api-key", f"key-{attempt}".encode())], "client": ("10.0.0.1", 1234)}
+            waits.append(await limiter.acquire("summarize", limiter.client_key(scope)))
+
+        assert waits[:2] == [0.0, 0.0]
+        assert all(wait > 0 for wait in waits[2:])
+
+    def test_unknown_api_keys_are_identified_by_address(self):
+        """Test that with an allow-list only known keys get their own bucket"""
+        limiter = self.make_limiter(client_id="api_key", api_keys=["good"], per_minute=60, burst=1)
+        known = {"headers": [(b"x-api-key", b"good")], "client": ("10.0.0.1", 1234)}
+        unknown = {"headers": [(b"x-api-key", b"made-up")], "client": ("10.0.0.1", 1234)}
+
+        assert limiter.client_key(known).startswith("key:")
+        assert limiter.client_key(unknown) == "ip:10.0.0.1"
+
+    @pytest.mark.asyncio
+    async def test_batch_larger_than_burst_is_rejected(self, clock):
+        """Test that a batch costing more than the burst is refused without taking tokens"""
+        limiter = self.make_limiter(per_minute=60, burst=3)
+
+        assert await limiter.acquire("summarize", "ip:a") == 0.0
+        assert await limiter.acquire("summarize", "ip:a", cost=9, already_taken=1) == math.inf
+        assert await limiter.acquire("summarize", "ip:a", cost=2, already_taken=1) == 0.0
+        assert await limiter.acquire("summarize", "ip:a") == pytest.approx(1.0)
+        assert limiter.stats()["summarize_limited"] == 2
+
+    def test_admission(self):
+        """Test that admission fails at the in-flight cap or while a downstream queue is full"""
+        saturated = [False]
+        limiter = self.make_limiter(per_minute=0, burst=0, max_in_flight=2, overloaded=lambda: saturated[0])
+
+        assert limiter.admit("summarize")
+        limiter.in_flight["summarize"] = 2
+        assert not limiter.admit("summarize")
+        limiter.in_flight["summarize"] = 0
+        saturated[0] = True
+        assert not limiter.admit("summarize")
@@ -0,0 +1,132 @@
+"""Tests for lazy imports and the production server entry point."""
+
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from loadtest.__main__ import free_port
+from src.lazy import LazyCallable, LazyModule
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def probe_module(tmp_path, monkeypatch):
+    """Name of an importable module that has not been imported yet"""
+    (tmp_path / "lazy_probe.py").write_text("def greet(name):\n    return f'hello {name}'\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_probe", raising=False)
+    return "lazy_probe"
+
+
+class TestLazyModule:
+    """Test cases for deferred imports"""
+
+    def test_imports_on_first_use_only(self, probe_module):
+        """Test that the module is imported by the first call, not by creating the proxy"""
+        module = LazyModule(probe_module)
+        greet = LazyCallable(module, "greet")
+
+        assert not module.loaded
+        assert probe_module not in sys.modules
+        assert greet("you") == "hello you"
+        assert module.loaded
+        assert module.load() is sys.modules[probe_module]
+
+    def test_patched_attributes_shadow_the_module(self, probe_module):
+        """Test that mock.patch works on the proxy and is undone afterwards"""
+        module = LazyModule(probe_module)
+
+        with patch.object(module, "greet", lambda name: "patched"):
+            assert LazyCallable(module, "greet")("you") == "patched"
+
+        assert module.greet("you") == "hello you"
+
+
+class TestSupervisor:
+    """Test cases for the worker supervisor"""
+
+    def test_reaped_worker_jobs_are_requeued(self, tmp_path, monkeypatch):
+        """Test that a crashed worker's running jobs go back to the queue instead of staying running"""
+        from src.jobs import QUEUED, JobStore
+        from src.server import Supervisor
+
+        monkeypatch.setattr("src.server.settings.jobs_db", tmp_path / "jobs.db")
+        store = JobStore(tmp_path / "jobs.db")
+        store.insert("j1", {}, None)
+        monkeypatch.setattr("src.jobs.os.getpid", lambda: 4242)
+        store.claim_next()
+        supervisor = Supervisor(config=None, sock=None, workers=1, grace_period=0)
+        supervisor.children = {4242: 0}
+        supervisor.stopping = True
+
+        with patch("src.server.os.waitpid", side_effect=[(4242, 0), ChildProcessError()]):
+            supervisor._reap()
+
+        assert store.get("j1")["status"] == QUEUED
+
+
+@pytest.mark.slow
+class TestServer:
+    """Test cases for the prefork server"""
+
+    def test_workers_serve_and_stop_on_sigterm(self, tmp_path):
+        """Test that the master starts its workers and exits cleanly after SIGTERM"""
+        port = free_port()
+        env = {
+            **os.environ,
+            "PYTHONPATH": str(REPO_ROOT),
+            "WEB_CONCURRENCY": "2",
+            "SERVER_HOST": "127.0.0.1",
+            "SERVER_PORT": str(port),
+            "SHUTDOWN_GRACE_PERIOD": "5",
+            "DOWNLOAD_DIR": str(tmp_path / "downloads"),
+            "JOBS_DIR": str(tmp_path / "jobs"),
+            "JOBS_DB": str(tmp_path / "jobs" / "jobs.db"),
+            "TEXT_STORE_DB": "",
+        }
+        env.pop("DOWNLOAD_INDEX_DB", None)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "src.server"], cwd=tmp_path, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/livez", timeout=1) as response:
+                        assert response.status == 200
+                        break
+                except OSError:
+                    assert server.poll() is None, server.stderr.read()
+                    assert time.monotonic() < deadline, "server did not start"
+                    time.sleep(0.2)
+
+            # Scrapes merge every worker's request counters, whichever worker answers
+            for _ in range(4):
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/livez", timeout=5):
+                    pass
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                metrics = response.read().decode()
+
+            server.send_signal(signal.SIGTERM)
+            _, log = server.communicate(timeout=30)
+        finally:
+            if server.poll() is None:
+                server.kill()
+
+        assert server.returncode == 0
+        assert log.count("Started worker") == 2
+        assert log.count("Application shutdown complete") == 2
+        livez = re.search(r'genai_http_requests_total\{method="GET",route="/livez",status="200"\} (\S+)', metrics)
+        # Every probe counted, including those answered by the worker that did not serve the scrape
+        assert float(livez.group(1)) >= 5
+        assert 'pid="' in metrics
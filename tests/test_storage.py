@@ -0,0 +1,163 @@
+"""Tests for the downloads directory quota, eviction and cleanup."""
+
+import os
+import time
+
+import aiohttp
+import pytest
+
+from src.download_index import DownloadIndex
+from src.downloader import Downloader
+from src.storage import DownloadStorage, StorageFullError
+
+
+def make_file(root, name, size, age=0.0):
+    path = root / name
+    path.write_bytes(b"x" * size)
+    if age:
+        then = time.time() - age
+        os.utime(path, (then, then))
+    return path
+
+
+class TestDownloadStorage:
+    """Test cases for DownloadStorage"""
+
+    def test_startup_scan_builds_ledger(self, tmp_path):
+        """Test that completed files are counted and hidden and partial files are not"""
+        make_file(tmp_path, "a.pdf", 100)
+        make_file(tmp_path, ".index.db", 50)
+        make_file(tmp_path, ".0123.part", 30)
+        storage = DownloadStorage(tmp_path)
+
+        storage.sweep()
+
+        stats = storage.stats()
+        assert stats["files"] == 1
+        assert stats["used_bytes"] == 100
+        assert stats["partial_bytes"] == 30
+
+    def test_reservation_evicts_least_recently_used(self, tmp_path):
+        """Test that making room deletes the file used longest ago, not the oldest download"""
+        evicted = []
+        make_file(tmp_path, "old.pdf", 100, age=300)
+        make_file(tmp_path, "older.pdf", 100, age=600)
+        storage = DownloadStorage(tmp_path, max_bytes=250, on_evict=evicted.append)
+        storage.sweep()
+        storage.touch(tmp_path / "older.pdf")
+
+        reservation = storage.reserve(100)
+
+        assert evicted == [tmp_path.resolve() / "old.pdf"]
+        assert not (tmp_path / "old.pdf").exists()
+        assert (tmp_path / "older.pdf").exists()
+        assert storage.stats()["reserved_bytes"] == 100
+        reservation.release()
+        reservation.release()
+        assert storage.stats()["reserved_bytes"] == 0
+
+    def test_oversized_reservation_is_rejected_without_evicting(self, tmp_path):
+        """Test that a download larger than the quota fails and keeps every file"""
+        make_file(tmp_path, "keep.pdf", 100)
+        storage = DownloadStorage(tmp_path, max_bytes=500)
+
+        with pytest.raises(StorageFullError):
+            storage.reserve(600)
+
+        assert (tmp_path / "keep.pdf").exists()
+        assert storage.stats()["files"] == 1
+        assert storage.stats()["evictions"] == 0
+        assert storage.stats()["rejected"] == 1
+
+    def test_quota_is_shared_between_processes(self, tmp_path):
+        """Test that two workers' managers of one directory enforce a single quota"""
+        make_file(tmp_path, "a.pdf", 100)
+        first = DownloadStorage(tmp_path, max_bytes=500)
+        second = DownloadStorage(tmp_path, max_bytes=500)
+
+        first.reserve(300)
+        with pytest.raises(StorageFullError):
+            second.reserve(300)
+
+        assert (tmp_path / "a.pdf").exists()
+        assert second.stats()["files"] == 1
+        assert second.stats()["reserved_bytes"] == 300
+
+    def test_reservations_of_dead_workers_expire(self, tmp_path, monkeypatch):
+        """Test that space reserved by a process that stopped sweeping is given back"""
+        worker = DownloadStorage(tmp_path, max_bytes=500, sweep_interval=60)
+        worker.reserve(400)
+        survivor = DownloadStorage(tmp_path, max_bytes=500, sweep_interval=60)
+
+        now = time.time()
+        monkeypatch.setattr("src.storage.time.time", lambda: now + 600)
+        survivor.sweep()
+
+        assert survivor.stats()["reserved_bytes"] == 0
+        survivor.reserve(400)
+
+    def test_part_file_of_a_reservation_is_not_counted_twice(self, tmp_path):
+        """Test that the bytes a transfer has written count once, against its reservation"""
+        part = tmp_path / ".0123.part"
+        storage = DownloadStorage(tmp_path, max_bytes=500)
+        first = storage.reserve(300, part=part)
+        make_file(tmp_path, part.name, 200)
+
+        storage.sweep()
+
+        stats = storage.stats()
+        assert stats["reserved_bytes"] == 300
+        assert stats["partial_bytes"] == 0
+        storage.reserve(200)
+        first.release()
+        assert storage.stats()["partial_bytes"] == 200
+
+    def test_resumed_part_file_moves_into_its_reservation(self, tmp_path):
+        """Test that resuming a swept partial file reserves the whole file, not the remainder on top of it"""
+        make_file(tmp_path, "a.pdf", 100)
+        part = make_file(tmp_path, ".0123.part", 300)
+        storage = DownloadStorage(tmp_path, max_bytes=500)
+        storage.sweep()
+
+        storage.reserve(400, part=part)
+
+        assert (tmp_path / "a.pdf").exists()
+        stats = storage.stats()
+        assert stats["partial_bytes"] == 0
+        assert stats["reserved_bytes"] == 400
+
+    def test_sweep_removes_orphans_and_expired_files(self, tmp_path):
+        """Test that abandoned partial files and files unused for max_age are deleted"""
+        make_file(tmp_path, ".abandoned.part", 10, age=7200)
+        make_file(tmp_path, ".active.part", 10)
+        make_file(tmp_path, "stale.pdf", 10, age=7200)
+        make_file(tmp_path, "fresh.pdf", 10)
+        storage = DownloadStorage(tmp_path, max_age=3600, orphan_age=3600)
+
+        storage.sweep()
+
+        remaining = sorted(p.name for p in tmp_path.iterdir() if not p.name.startswith(".storage.db"))
+        assert remaining == [".active.part", "fresh.pdf"]
+        stats = storage.stats()
+        assert stats["orphans_removed"] == 1
+        assert stats["expired"] == 1
+        assert stats["used_bytes"] == 10
+
+    @pytest.mark.asyncio
+    async def test_downloader_reserves_and_records(self, file_server, tmp_path):
+        """Test that a transfer is refused up front when its Content-Length cannot fit"""
+        file_server.add('/small.bin', b'x' * 100)
+        file_server.add('/large.bin', b'x' * 1000)
+        storage = DownloadStorage(tmp_path, max_bytes=500)
+        downloader = Downloader(DownloadIndex(tmp_path / ".index.db"), chunk_size=1024, storage=storage)
+
+        async with aiohttp.ClientSession() as session:
+            await downloader.fetch(session, file_server.url('/small.bin'), tmp_path)
+            with pytest.raises(StorageFullError):
+                await downloader.fetch(session, file_server.url('/large.bin'), tmp_path)
+
+        stats = storage.stats()
+        assert stats["used_bytes"] == 100
+        assert stats["reserved_bytes"] == 0
+        assert not (tmp_path / "large.bin").exists()
+        assert not list(tmp_path.glob("*.part"))
@@ -0,0 +1,89 @@
+"""Tests for map-reduce summarization."""
+
+import asyncio
+
+import pytest
+
+from src.prompt import estimate_tokens
+from src.summarizer import MAP_PROMPT, REDUCE_PROMPT, chunk_text, map_reduce_summarize
+
+
+class FakeLLM:
+    """Stand-in for GeminiClient recording calls and concurrency."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_text(self, prompt):
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        return f"summary{len(self.prompts)}"
+
+
+class TestChunkText:
+    """Test cases for chunk_text"""
+
+    def test_chunks_respect_budget(self):
+        """Test that no chunk exceeds the token budget and no text is lost"""
+        text = "\n".join(f"line {i} " + "word " * 20 for i in range(50))
+        chunks = chunk_text(text, max_tokens=50)
+
+        assert len(chunks) > 1
+        assert all(estimate_tokens(chunk) <= 50 for chunk in chunks)
+        assert "".join(chunks).replace("\n", "") == text.replace("\n", "")
+
+    def test_dense_scripts_get_shorter_chunks(self):
+        """Test that CJK text, about a token per character, is chunked by tokens rather than characters"""
+        text = "\n".join("漢字仮名交じり文" * 25 for _ in range(4))
+        chunks = chunk_text(text, max_tokens=100)
+
+        assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+        assert all(len(chunk) <= 100 for chunk in chunks)
+        assert "".join(chunks).replace("\n", "") == text.replace("\n", "")
+
+    def test_oversized_words_are_split(self):
+        """Test that a single word longer than a chunk is cut"""
+        chunks = chunk_text("x" * 50, max_tokens=5)
+
+        assert len(chunks) > 1
+        assert all(estimate_tokens(chunk) <= 5 for chunk in chunks)
+        assert "".join(chunks) == "x" * 50
+
+    def test_empty_text(self):
+        """Test that empty text yields no chunks"""
+        assert chunk_text("\n\n", max_tokens=10) == []
+
+
+class TestMapReduceSummarize:
+    """Test cases for map_reduce_summarize"""
+
+    @pytest.mark.asyncio
+    async def test_map_calls_run_concurrently_within_limit(self):
+        """Test that map calls overlap but never exceed the concurrency limit"""
+        llm = FakeLLM(latency=0.05)
+        text = "\n".join("y" * 40 for _ in range(8))
+
+        result = await map_reduce_summarize(llm, text, chunk_tokens=10, concurrency=3)
+
+        assert result.chunks == 8
+        assert llm.max_in_flight == 3
+        assert sum(p.startswith(MAP_PROMPT) for p in llm.prompts) == 8
+        assert any(p.startswith(REDUCE_PROMPT) for p in llm.prompts)
+        assert set(result.timings) == {"chunk", "map", "reduce"}
+
+    @pytest.mark.asyncio
+    async def test_single_chunk_skips_reduce(self):
+        """Test that short documents are summarized with one call"""
+        llm = FakeLLM()
+
+        result = await map_reduce_summarize(llm, "short text", chunk_tokens=100, concurrency=2)
+
+        assert result.summary == "summary1"
+        assert result.reduce_rounds == 0
+        assert len(llm.prompts) == 1
@@ -0,0 +1,66 @@
+"""Tests for the content-addressed summary cache."""
+
+import time
+
+import pytest
+
+from src.summary_cache import SummaryCache
+
+
+class TestSummaryCache:
+    """Test cases for SummaryCache"""
+
+    def test_key_depends_on_parameters(self):
+        """Test that the same document with different parameters gets distinct keys"""
+        key_a = SummaryCache.make_key("abc", model="gemini-pro", prompt="p1")
+        key_b = SummaryCache.make_key("abc", model="gemini-pro", prompt="p2")
+        assert key_a != key_b
+        assert key_a == SummaryCache.make_key("abc", prompt="p1", model="gemini-pro")
+
+    @pytest.mark.asyncio
+    async def test_memory_lru_eviction(self):
+        """Test that the in-memory tier evicts the least recently used entry"""
+        cache = SummaryCache(max_entries=2)
+        await cache.set("a", "A")
+        await cache.set("b", "B")
+        assert await cache.get("a") == "A"
+        await cache.set("c", "C")
+
+        assert await cache.get("b") is None
+        assert await cache.get("a") == "A"
+        assert await cache.get("c") == "C"
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self, monkeypatch):
+        """Test that entries older than the TTL are treated as misses"""
+        cache = SummaryCache(ttl=10)
+        await cache.set("a", "A")
+        now = time.time()
+        monkeypatch.setattr("src.summary_cache.time.time", lambda: now + 11)
+
+        assert await cache.get("a") is None
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_disk_tier_survives_restart(self, tmp_path):
+        """Test that the SQLite tier serves entries to a fresh cache instance"""
+        db_path = tmp_path / "cache.db"
+        cache = SummaryCache(db_path=db_path)
+        await cache.set("a", "A")
+        cache.close()
+
+        reopened = SummaryCache(db_path=db_path)
+        assert await reopened.get("a") == "A"
+        assert reopened.stats()["hits"] == 1
+        reopened.close()
+
+    @pytest.mark.asyncio
+    async def test_disk_tier_size_eviction(self, tmp_path):
+        """Test that the SQLite tier evicts old entries once over its byte cap"""
+        cache = SummaryCache(max_entries=1, db_path=tmp_path / "cache.db", max_db_bytes=10)
+        await cache.set("a", "x" * 6)
+        await cache.set("b", "y" * 6)
+        cache._memory.clear()
+        assert await cache.get("a") is None
+        assert await cache.get("b") == "y" * 6
+        cache.close()
@@ -0,0 +1,141 @@
+"""Tests for the extracted-text store and its use by the extraction stage."""
+
+import io
+import os
+
+import pytest
+
+from src.extraction import ExtractionPool
+from src.pdf_backends import BackendSelector
+from src.text_store import TextStore, parse_page_ranges
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Empty text store"""
+    store = TextStore(tmp_path / "text.db")
+    yield store
+    store.close()
+
+
+class TestParsePageRanges:
+    """Test cases for parse_page_ranges"""
+
+    def test_pages_and_ranges(self):
+        """Test that 1-based selections become sorted zero-based indices"""
+        assert parse_page_ranges("5, 1-3,2", 10) == [0, 1, 2, 4]
+        assert parse_page_ranges("8-", 10) == [7, 8, 9]
+
+    @pytest.mark.parametrize("spec", ["0", "3-1", "11", "a-b"])
+    def test_invalid_selection(self, spec):
+        """Test that malformed or out-of-range selections are rejected"""
+        with pytest.raises(ValueError):
+            parse_page_ranges(spec, 10)
+
+
+class TestTextStore:
+    """Test cases for TextStore"""
+
+    def test_pages_are_added_incrementally(self, store):
+        """Test that pages accumulate per document and only requested pages are returned"""
+        store.put_pages("abc", 4, {0: "first"})
+        store.put_pages("abc", 4, {2: "third", 0: "ignored duplicate"})
+
+        assert store.get_pages("abc", [0, 1, 2]) == {0: "first", 2: "third"}
+        document = store.document("abc")
+        assert document["page_count"] == 4
+        assert document["pages_stored"] == 2
+        assert store.stats()["page_hits"] == 2
+        assert store.stats()["page_misses"] == 1
+
+    def test_unknown_document(self, store):
+        """Test that unknown hashes have no metadata and no pages"""
+        assert store.document("missing") is None
+        assert store.get_pages("missing") == {}
+
+    def test_least_recently_used_documents_are_evicted(self, tmp_path):
+        """Test that the size cap evicts whole documents, oldest access first"""
+        # Incompressible text, so each document takes roughly 2000 bytes
+        text = os.urandom(1000).hex()
+        store = TextStore(tmp_path / "text.db", max_bytes=3000)
+        store.put_pages("old", 1, {0: text})
+        store.put_pages("recent", 1, {0: text[::-1]})
+        store.touch("old")
+        store.put_pages("new", 1, {0: text[1:]})
+
+        assert store.document("recent") is None
+        assert store.document("old") is not None
+        assert store.document("new") is not None
+        assert store.stats()["evictions"] == 1
+        store.close()
+
+    def test_store_persists_across_instances(self, tmp_path):
+        """Test that stored text survives reopening the database"""
+        TextStore(tmp_path / "text.db").put_pages("abc", 1, {0: "kept"})
+        assert TextStore(tmp_path / "text.db").get_pages("abc") == {0: "kept"}
+
+
+class TestStoredExtraction:
+    """Test cases for extraction backed by the text store"""
+
+    @pytest.mark.asyncio
+    async def test_stored_document_is_not_parsed_again(self, store, pdf_factory, monkeypatch):
+        """Test that a fully stored document is served without opening the PDF"""
+        data = pdf_factory(["alpha", "beta", "gamma"])
+        pool = ExtractionPool(workers=0, store=store)
+        first = await pool.extract_text(io.BytesIO(data), content_hash="doc")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("PDF parsed again")
+
+        monkeypatch.setattr("src.extraction.PdfDocument", fail)
+        second = await pool.extract_text(io.BytesIO(data), content_hash="doc")
+
+        assert first.pages_from_store == 0
+        assert second.text == first.text == "alpha\nbeta\ngamma"
+        assert second.pages_from_store == 3
+
+    @pytest.mark.asyncio
+    async def test_other_backend_bypasses_store(self, store, pdf_factory):
+        """Test that a request for another backend than the configured one extracts every page itself"""
+        data = pdf_factory(["alpha", "beta"])
+        store.put_pages("doc", 2, {0: "stored"})
+        pool = ExtractionPool(workers=0, store=store, backends=BackendSelector("auto", fallback=()))
+
+        requested = await pool.extract_text(io.BytesIO(data), content_hash="doc", backend="pypdf2")
+        configured = await pool.extract_text(io.BytesIO(data), content_hash="doc")
+
+        assert requested.text == "alpha\nbeta"
+        assert requested.pages_from_store == 0
+        assert configured.text == "stored\nbeta"
+        assert store.get_pages("doc") == {0: "stored", 1: "beta"}
+
+    @pytest.mark.asyncio
+    async def test_only_missing_pages_are_extracted(self, store, pdf_factory):
+        """Test that a budget read is completed by a later full read of the remaining pages"""
+        data = pdf_factory([f"{i}" * 50 for i in range(6)])
+        pool = ExtractionPool(workers=0, store=store)
+
+        budget = await pool.extract_text(io.BytesIO(data), "budget", 120, content_hash="doc")
+        assert store.document("doc")["pages_stored"] == budget.pages_read == 3
+
+        full = await pool.extract_text(io.BytesIO(data), content_hash="doc")
+
+        assert full.pages_from_store == 3
+        assert full.text == "\n".join(f"{i}" * 50 for i in range(6))
+        assert store.document("doc")["pages_stored"] == 6
+
+    @pytest.mark.asyncio
+    async def test_missing_pages_use_process_pool(self, store, pdf_factory):
+        """Test that many missing pages are extracted in worker processes and stored"""
+        pages = [f"page {i}" for i in range(6)]
+        store.put_pages("doc", 6, {0: "page 0"})
+        pool = ExtractionPool(workers=2, min_pages=2, store=store)
+        try:
+            result = await pool.extract_text(io.BytesIO(pdf_factory(pages)), content_hash="doc")
+        finally:
+            pool.shutdown()
+
+        assert result.text == "\n".join(pages)
+        assert result.pages_from_store == 1
+        assert store.get_pages("doc") == dict(enumerate(pages))